@@ -69,14 +69,14 @@ class CommentInline(admin.StackedInline):
         """
         Returns likes count under comment obj.
         """
-        return obj.profiles_likes.count()
+        return obj.likes_count
 
     @admin.display(description=_('Unlikes'))
     def get_amount_profile_unlikes(self, obj):
         """
         Returns dislikes count under comment obj.
         """
-        return obj.profiles_unlikes.count()
+        return obj.unlikes_count
 
 
 @admin.register(Profile)
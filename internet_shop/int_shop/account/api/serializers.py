@@ -6,10 +6,12 @@ from rest_framework import serializers
 from rest_framework.validators import ValidationError
 
 from account.models import Profile
-from goods.models import Favorite
+from common.sparse_fields import SparseFieldsSerializerMixin
+from goods.api.serializers import ImageDerivativeField, ImageDerivativesListSerializer
+from goods.models import Favorite, ImageDerivative
 
 
-class ProfileSerializer(serializers.ModelSerializer):
+class ProfileSerializer(SparseFieldsSerializerMixin, serializers.ModelSerializer):
     """
     Serializer with user's profile information
     """
@@ -21,11 +23,13 @@ class ProfileSerializer(serializers.ModelSerializer):
     last_name = serializers.CharField(source='user.last_name', max_length=150)
     password1 = serializers.CharField(source='user.password1', write_only=True)
     password2 = serializers.CharField(source='user.password2', write_only=True)
+    photo_thumbnail = ImageDerivativeField(source='photo', preset=ImageDerivative.Preset.THUMBNAIL)
 
     class Meta:
         model = Profile
         fields = '__all__'
         read_only_fields = ('email_confirm',)
+        list_serializer_class = ImageDerivativesListSerializer
 
     def create(self, validated_data):
         """
@@ -15,7 +15,9 @@ from rest_framework.schemas import AutoSchema
 from rest_framework.validators import ValidationError
 
 from account.models import Profile
+from account.utils import get_user_profile
 from common.moduls_init import redis
+from common.sparse_fields import SparseFieldsViewMixin, shape_queryset
 from goods.api.serializers import ProductSerializer
 from goods.models import Product
 from .permissions import ActionsWithOwnProfilePermission, IsNotAuthenticated
@@ -34,9 +36,10 @@ from .tasks import send_email_for_set_new_account_password
                   decorator=swagger_auto_schema(operation_summary='Get profile with {id}'))
 @method_decorator(name='create',
                   decorator=swagger_auto_schema(operation_summary='Create new profile instance'))
-class AccountViewSet(viewsets.ModelViewSet):
+class AccountViewSet(SparseFieldsViewMixin, viewsets.ModelViewSet):
     """
     Viewset that provides `retrieve`, `create`, `delete`, `list` and `update` user account.
+    Fields of GET responses can be chosen with `?fields=` and omitted ones added with `?expand=`.
 
     * get - obtain all profiles
     * post - create new profile
@@ -52,6 +55,12 @@ class AccountViewSet(viewsets.ModelViewSet):
                                           'gender', 'about', 'photo', 'phone_number',
                                           'coupons', 'created', 'email_confirm']
 
+    def get_queryset(self):
+        if self.request.method == 'GET':
+            fields = self.get_sparse_fields() if self.detail else self.get_list_fields()
+            return self.shape_queryset(Profile.objects.all(), fields)
+        return self.queryset.all()
+
     @swagger_auto_schema(method='get', operation_summary='Get own profile info')
     @action(methods=['GET'],
             detail=False,
@@ -63,7 +72,7 @@ class AccountViewSet(viewsets.ModelViewSet):
         """
         Get all info about current profile
         """
-        current_profile = Profile.objects.get(user=request.user)
+        current_profile = get_user_profile(request.user)
         serializer = self.get_serializer(instance=current_profile)
         return Response(serializer.data, status=status.HTTP_200_OK)
 
@@ -79,9 +88,9 @@ class AccountViewSet(viewsets.ModelViewSet):
         Obtain profile's favorite list
         """
         current_profile = get_object_or_404(Profile, user_id=request.user.pk)
-        products = current_profile.profile_favorite.product.prefetch_related('comments')
-        serializer = ProductSerializer(instance=[product for product in products], many=True)
-        serializer.child.remove_fields(['properties'])
+        fields = self.get_sparse_fields(ProductSerializer, ['properties'])
+        products = shape_queryset(current_profile.profile_favorite.product.all(), ProductSerializer(fields=fields))
+        serializer = ProductSerializer(instance=[product for product in products], many=True, fields=fields)
         return Response(serializer.data, status.HTTP_200_OK)
 
     @swagger_auto_schema(method='get', operation_summary='Get list of all watched products')
@@ -97,9 +106,10 @@ class AccountViewSet(viewsets.ModelViewSet):
         """
         current_profile = get_object_or_404(Profile, user_id=request.user.pk)
         products_ids = (int(pk) for pk in redis.smembers(f'profile_id:{current_profile.pk}'))
-        products = Product.available_objects.prefetch_related('comments').filter(id__in=products_ids)
-        serializer = ProductSerializer(instance=[product for product in products], many=True)
-        serializer.child.remove_fields(['properties'])
+        fields = self.get_sparse_fields(ProductSerializer, ['properties'])
+        products = shape_queryset(Product.available_objects.filter(id__in=products_ids),
+                                  ProductSerializer(fields=fields))
+        serializer = ProductSerializer(instance=[product for product in products], many=True, fields=fields)
         return Response(serializer.data, status.HTTP_200_OK)
 
     @swagger_auto_schema(method='post',
@@ -116,7 +126,7 @@ class AccountViewSet(viewsets.ModelViewSet):
         """
         Add or remove product with `product_id` into/from own favorites list
         """
-        current_profile = Profile.objects.get(user=request.user)
+        current_profile = get_user_profile(request.user)
         product = get_object_or_404(Product, pk=product_pk)
         if act == 'add':
             current_profile.profile_favorite.product.add(product)
@@ -136,7 +146,7 @@ class AccountViewSet(viewsets.ModelViewSet):
         """
         Delete own profile with build-in user from the system
         """
-        current_profile = Profile.objects.get(user=request.user)
+        current_profile = get_user_profile(request.user)
         current_profile.delete()
         return Response({'success': 'Your profile was successfully removed from the system'},
                         status=status.HTTP_204_NO_CONTENT)
@@ -145,7 +155,9 @@ class AccountViewSet(viewsets.ModelViewSet):
         """
         User can update only own profile
         """
-        profile_to_update = Profile.objects.get(pk=kwargs['pk'])
+        profile_to_update = get_user_profile(request.user)
+        if str(profile_to_update.pk) != str(kwargs['pk']):  # staff updates profile of another user
+            profile_to_update = Profile.objects.get(pk=kwargs['pk'])
         self.check_object_permissions(request, profile_to_update)
 
         if kwargs.get('partial'):  # if PATCH method used
@@ -167,14 +179,13 @@ class AccountViewSet(viewsets.ModelViewSet):
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
     def list(self, request, *args, **kwargs):
-        page = self.paginate_queryset(self.queryset)
+        queryset = self.get_queryset()
+        page = self.paginate_queryset(queryset)
         if page:
             serializer = self.get_serializer(instance=page, many=True)
-            serializer.child.remove_fields(self.remove_fields_list_for_get_request)  # remove fields from response
             return self.get_paginated_response(serializer.data)
 
-        serializer = self.get_serializer(instance=self.queryset, many=True)
-        serializer.child.remove_fields(self.remove_fields_list_for_get_request)
+        serializer = self.get_serializer(instance=queryset, many=True)
         return Response(serializer.data, status=status.HTTP_200_OK)
 
 
@@ -289,6 +300,6 @@ class PhotoUploadView(views.APIView):
     @action(detail=False, methods=['put'])
     def put(self, request, photo_name: str, version='v1'):
         photo_obj = request.data['photo']
-        profile = Profile.objects.get(user=request.user)
+        profile = get_user_profile(request.user)
         profile.photo.save(photo_name, photo_obj)  # save photo to DB
         return Response({'detail': 'Photo has been uploaded successfully'}, status=status.HTTP_200_OK)
@@ -0,0 +1,17 @@
+from django.utils.functional import SimpleLazyObject
+
+from account.utils import get_user_profile
+
+
+class ProfileMiddleware:
+    """
+    Attaches profile of the current user (or guest profile for anonymous visitor) to the request as `profile`.
+    Profile is resolved lazily, i.e. only when the view uses it, and at most once per request
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        request.profile = SimpleLazyObject(lambda: get_user_profile(request.user))
+        return self.get_response(request)
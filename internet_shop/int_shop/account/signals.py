@@ -1,29 +1,46 @@
 import os
-import shutil
 
-import boto3
-from django.conf import settings
-from django.db.models.signals import post_delete
+from django.db.models.signals import post_delete, post_save
 from django.dispatch import receiver
 
 from account.models import Profile
-from common.storage_backends import MediaStorage
+from account.utils import invalidate_profile_cache
+from common.media_cleanup import queue_media_cleanup
+from goods.image_derivatives import delete_image_derivatives, schedule_image_derivatives
+
+
+@receiver(signal=[post_save, post_delete], sender=Profile)
+def invalidate_profile(sender, instance: Profile, *args, **kwargs):
+    """
+    Delete cached profile, when the profile has been changed or deleted
+    """
+    invalidate_profile_cache(instance)
+
+
+@receiver(signal=post_save, sender=Profile)
+def generate_photo_derivatives(sender, instance: Profile, *args, **kwargs):
+    """
+    Render resized copies of the uploaded profile photo in background
+    """
+    schedule_image_derivatives(instance.photo)
+
+
+@receiver(signal=post_delete, sender=Profile)
+def delete_photo_derivatives(sender, instance: Profile, *args, **kwargs):
+    """
+    Delete resized copies of the photo of the deleted profile
+    """
+    if instance.photo:
+        delete_image_derivatives(instance.photo.name)
 
 
 @receiver(signal=post_delete, sender=Profile)
 def delete_profile_with_relative_user(sender, instance: Profile, *args, **kwargs):
     """
-    Delete profile's photo from AWS Bucket, directory with photo from media root
-    and delete built-in instance User, which linked with  custom profile instance
-    """
-    if isinstance(instance.photo.storage, MediaStorage):
-        aws_image_key = f'media/{instance.photo.name}'
-        aws_s3_bucket = MediaStorage().bucket_name
-        client = boto3.client('s3')
-        client.delete_object(Bucket=aws_s3_bucket, Key=aws_image_key)
-    else:
-        # delete directory with profile's photo from file system, if user has added own photo during registration
-        # delete built-in User instance, linked with custom profile
-        if instance.photo.name:
-            shutil.rmtree(os.path.join(settings.MEDIA_ROOT, 'users', f'user_{instance.user.get_full_name()}'))
+    Queue profile's photo and directory with photo for deletion from the media storage
+    after transaction has been committed, and delete built-in instance User, which linked with custom profile instance
+    """
+    # directory with profile's photo exists, if user has added own photo during registration
+    directories = [os.path.join('users', f'user_{instance.user.get_full_name()}')] if instance.photo.name else []
+    queue_media_cleanup(names=[instance.photo.name], directories=directories, storage=instance.photo.storage)
     instance.user.delete()
@@ -2,7 +2,8 @@ from datetime import datetime
 from io import BytesIO
 
 import requests
-from django.contrib.auth.models import User
+from django.contrib.auth.models import AnonymousUser, User
+from django.core.cache import cache
 from django.shortcuts import reverse
 from django.test import RequestFactory, Client
 from django.test import TestCase
@@ -13,6 +14,9 @@ from social_django.strategy import DjangoStrategy
 
 from account.models import Profile
 from account.utils import get_image_from_url, create_profile_from_social, create_user
+from account.utils import (
+    GUEST_PROFILE_VERSION_KEY, GUEST_USERNAME, get_profile_cache_key, get_request_profile, get_user_profile,
+)
 from goods.models import Favorite
 
 
@@ -122,3 +126,38 @@ class TestAccountUtilities(TestCase):
                     self.assertEqual(value, details[field].replace('.', '_'))
                 else:
                     self.assertEqual(value, details[field])
+
+    def test_get_user_profile(self):
+        """
+        Checking that profile of the authenticated user is cached until it has been saved,
+        guest profile is memoized for anonymous user, and profile is resolved once per request
+        """
+        guest_profile = Profile.objects.create(user=User.objects.create_user(username=GUEST_USERNAME))
+        user = User.objects.create_user(username='cacheduser')
+        profile = Profile.objects.create(user=user)
+
+        self.assertEqual(get_user_profile(user), profile)
+        with self.assertNumQueries(0):
+            self.assertEqual(get_user_profile(user), profile)
+
+        profile.about = 'About me'
+        profile.save()  # cached profile is invalidated
+        self.assertEqual(get_user_profile(user).about, 'About me')
+
+        self.assertEqual(get_user_profile(AnonymousUser()), guest_profile)
+        with self.assertNumQueries(0):
+            self.assertEqual(get_user_profile(AnonymousUser()), guest_profile)
+
+        # guest profile is obtained again, when it has been changed in this or another process
+        guest_profile.about = 'Guest'
+        guest_profile.save()
+        self.assertEqual(get_user_profile(AnonymousUser()).about, 'Guest')
+        Profile.objects.filter(pk=guest_profile.pk).update(about='Changed guest')
+        cache.delete(GUEST_PROFILE_VERSION_KEY)  # as invalidation in another process
+        self.assertEqual(get_user_profile(AnonymousUser()).about, 'Changed guest')
+
+        request = RequestFactory().get('/')
+        request.user = user
+        self.assertEqual(get_request_profile(request), profile)
+        self.assertIs(get_request_profile(request), request.profile)
+        cache.delete(get_profile_cache_key(user.pk))
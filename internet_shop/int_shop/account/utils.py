@@ -1,12 +1,21 @@
 from io import BytesIO
 from typing import BinaryIO, Union
+from uuid import uuid4
+
+from django.contrib.auth import get_user_model
 from django.core import files
+from django.core.cache import cache
 import requests
 
 from account.models import Profile
 from goods.models import Favorite
 
 USER_FIELDS = ["username", "email", "first_name", "last_name"]
+GUEST_USERNAME = 'guest_user'  # username of the profile, which is used for anonymous visitors
+PROFILE_CACHE_TIMEOUT = 60 * 60 * 24
+GUEST_PROFILE_VERSION_KEY = 'guest_profile_version'  # version of the guest profile, which is shared by processes
+
+_guest_profile = (None, None)  # version and guest profile, which are memoized per process
 
 
 def get_image_from_url(url: str) -> BinaryIO:
@@ -65,3 +74,63 @@ def create_user(strategy, details, backend, user=None, *args, **kwargs) -> Union
         return
 
     return {"is_new": True, "user": strategy.create_user(**fields)}
+
+
+def get_profile_cache_key(user_id: int) -> str:
+    """
+    Returns cache key of the profile of the user with `user_id`
+    """
+    return f'profile_user_id:{user_id}'
+
+
+def get_guest_profile() -> Profile:
+    """
+    Returns profile for anonymous visitors, which is obtained from DB once per process
+    until its version in the cache has been changed
+    """
+    global _guest_profile
+    version = cache.get_or_set(GUEST_PROFILE_VERSION_KEY, lambda: uuid4().hex, None)
+    if _guest_profile[0] != version:
+        _guest_profile = (version, Profile.objects.select_related('user').get(user__username=GUEST_USERNAME))
+    return _guest_profile[1]
+
+
+def get_user_profile(user) -> Profile:
+    """
+    Returns profile of the authenticated `user` from the cache or guest profile for anonymous user
+    """
+    if not user.is_authenticated:
+        return get_guest_profile()
+
+    key = get_profile_cache_key(user.pk)
+    profile = cache.get(key)
+    if profile is None:
+        profile = Profile.objects.get(user=user)
+        cache.set(key, profile, PROFILE_CACHE_TIMEOUT)
+    profile.user = user  # user is not kept in the cache, since it is already loaded for the request
+    return profile
+
+
+def get_username_profile(username: str) -> Profile:
+    """
+    Returns profile of the user with `username` from the cache
+    """
+    return get_user_profile(get_user_model().objects.get(username=username))
+
+
+def get_request_profile(request) -> Profile:
+    """
+    Returns profile of the user of the `request`, which is resolved once per request
+    (by `ProfileMiddleware` or by the first call, if the request has not passed through the middleware)
+    """
+    if not hasattr(request, 'profile'):
+        request.profile = get_user_profile(request.user)
+    return request.profile
+
+
+def invalidate_profile_cache(profile: Profile) -> None:
+    """
+    Deletes cached `profile` and version of the guest profile,
+    so that guest profile memoized by all processes is obtained again, if it has been changed or recreated
+    """
+    cache.delete_many([get_profile_cache_key(profile.user_id), GUEST_PROFILE_VERSION_KEY])
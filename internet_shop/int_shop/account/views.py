@@ -24,6 +24,8 @@ from account.models import Profile
 from common.moduls_init import redis
 from common.utils import create_captcha_image
 from coupons.models import Coupon
+from goods.comment_rating import get_profile_rated_comments
+from goods.image_derivatives import get_image_derivatives
 from goods.models import Product, Favorite
 from orders.models import Order
 from .forms import (
@@ -35,7 +37,7 @@ from .forms import (
 )
 from .tasks import activate_account
 from .tokens import activation_account_token
-from .utils import get_image_from_url, create_profile_from_social
+from .utils import get_image_from_url, create_profile_from_social, get_user_profile, get_username_profile
 
 
 class LoginUserView(LoginView):
@@ -144,7 +146,7 @@ def activate_user_account(request, uidb64, token):
     if user is not None and activation_account_token.check_token(user, token):
         user.is_active = True
         user.save(update_fields=['is_active'])
-        profile = Profile.objects.get(user=user)
+        profile = get_user_profile(user)
         profile.email_confirm = True
         profile.save(update_fields=['email_confirm'])
         messages.success(request, _('Thank you for your email confirmation. Now you can login your account'))
@@ -178,10 +180,9 @@ class DetailUserView(DetailView):
         coupons = Coupon.objects.select_related('category').filter(id__in=orders_id_with_coupons).order_by('pk')
         # assignment orders for each profile coupon and return updated coupons queryset
         context['coupons'] = self._set_orders_for_coupon(context['orders'], coupons)
-        context['comments'] = self.object.profile_comments.prefetch_related('product',
-                                                                            'profiles_likes',
-                                                                            'profiles_unlikes'
-                                                                            ).order_by('-updated', '-created')
+        context['comments'] = self.object.profile_comments.select_related('product').order_by('-updated', '-created')
+        # comments, which the profile has liked or disliked, numbers of likes and dislikes are stored in the comments
+        context['rated_comments'] = get_profile_rated_comments(self.object.pk, context['comments'])
         if location == 'present_cards':
             context['present_cards'] = self.object.profile_cards.select_related('category', 'order')
         elif location == 'watched':
@@ -189,13 +190,18 @@ class DetailUserView(DetailView):
             products_ids = (int(pk) for pk in redis.smembers(f'profile_id:{self.object.pk}'))
             context['watched'] = Product.available_objects.filter(pk__in=products_ids)
 
+        # copies of the images of all displayed products are obtained at once
+        if location in ('favorites', 'watched'):
+            products = context['favorites'] if location == 'favorites' else context['watched']
+            context['image_derivatives'] = get_image_derivatives(product.image.name for product in products)
+
         return context
 
     def get_object(self, queryset=None):
         """
         Return profile object by passed name in URL.
         """
-        return Profile.objects.get(user__username=self.kwargs.get('customer'))
+        return get_username_profile(self.kwargs.get('customer'))
 
     def _set_orders_for_coupon(self, orders: QuerySet, coupons: QuerySet) -> QuerySet:
         """
@@ -32,20 +32,20 @@ def cart_items(request, version: str = 'v1') -> Response:
 
     serializer = serializers.CartSerializer(instance=list(cart), many=True)
     total_products = cart.get_amount_items_in()
-    total_cost_with_discounts = cart.get_total_price_with_discounts()
-    total_discount = cart.get_total_discount()
+    totals = cart.get_totals()
     content = {
         'items': serializer.data,
         'total_items': total_products,
-        'total_cost_with_discounts': total_cost_with_discounts,
-        'total_discount': total_discount,
+        'total_cost_with_discounts': totals.total_price_with_discounts,
+        'total_discount': totals.total_discount,
     }
 
     # allow to see what coupon or present card was applied if any
     if not isinstance(request.user, AnonymousUser):
+        coupon, present_card = cart.coupon, cart.present_card
         content.update({
-            'coupon': cart.coupon.pk if cart.coupon else None,
-            'present_card': cart.present_card.pk if cart.present_card else None
+            'coupon': coupon.pk if coupon else None,
+            'present_card': present_card.pk if present_card else None
         })
 
     return Response(content, status.HTTP_200_OK)
@@ -1,19 +1,23 @@
-from copy import deepcopy
 from decimal import Decimal
-from typing import Generator, Union
+from typing import Iterator, Union, List
 
 from django.conf import settings
-from django.db.models import Case, When, Value
 
 from coupons.models import Coupon
 from goods.models import Product
 from present_cards.models import PresentCard
 from .forms import CartQuantityForm
+from .pricing import PriceTotals, apply_discount, calculate_totals, get_cart_pricing
 
 
 class Cart:
     """
-    Cart with products
+    Cart with products.
+    Summary of the cart (quantity of goods and total price) is kept in session
+    and is updated, when the cart changes, so that it costs nothing to display it on each page.
+    Cart items are hydrated with products from DB only when the cart is iterated.
+    Coupon and present card are obtained through pricing engine of the request, so that
+    they are loaded once per request regardless of the number of cart instances
     """
 
     @property
@@ -21,32 +25,56 @@ class Cart:
         """
         Returns coupon object or None
         """
-        if self.coupon_id:
-            coupon = Coupon.objects.get(id=self.coupon_id)
-        else:
-            return None
-        return coupon
+        return self.pricing.get_coupon(self.coupon_id)
 
     @property
     def present_card(self) -> Union[PresentCard, None]:
         """
         Returns present card object or None
         """
-        if self.present_card_id:
-            present_card = PresentCard.objects.get(id=self.present_card_id)
-        else:
-            return None
-        return present_card
+        return self.pricing.get_present_card(self.present_card_id)
 
     def __init__(self, request):
         self.session = request.session
+        self.pricing = get_cart_pricing(request)
         cart = self.session.get(settings.CART_SESSION_ID)
         if not cart:
             cart = self.session[settings.CART_SESSION_ID] = {}
-        self.cart = cart
+        self._cart = cart
+        self._items = None  # hydrated cart items
+        self._totals = None
         self.coupon_id = self.session.get('coupon_id')
         self.present_card_id = self.session.get('present_card_id')
 
+        self.summary = self.session.get(settings.CART_SUMMARY_SESSION_ID)
+        if self.summary is None or (not cart and self.summary['count']):
+            self._update_summary()
+
+    @property
+    def cart(self) -> dict:
+        return self._cart
+
+    @cart.setter
+    def cart(self, value: dict):
+        """
+        Replace cart items (e.g. by items, which are kept in Redis) and recompute the summary
+        """
+        self._cart = value
+        self._items = None
+        self._update_summary()
+
+    def _update_summary(self) -> None:
+        """
+        Recompute quantity of goods and total price of the cart, which are kept in session
+        """
+        self._totals = None
+        self.summary = self.session[settings.CART_SUMMARY_SESSION_ID] = {
+            'count': sum(item['quantity'] for item in self._cart.values()),
+            'total_price': str(calculate_totals((item['price'], item['quantity'])
+                                                for item in self._cart.values()).total_price),
+        }
+        self.session.modified = True
+
     def add(self, product: Product, quantity: int = 1):
         """
         Method adds product to the cart
@@ -58,32 +86,44 @@ class Cart:
         elif self.cart[product_id]['quantity'] != quantity:
             self.cart[product_id]['quantity'] = quantity
 
-        self.session.modified = True
+        self._items = None
+        self._update_summary()
 
     def __len__(self) -> int:
         """
         Returns the total number of goods quantity, taking into account it quantity
         """
-        return sum(item['quantity'] for item in self.cart.values())
+        return self.summary['count']
 
-    def __iter__(self) -> Generator[dict, None, None]:
+    def __iter__(self) -> Iterator[dict]:
         """
-        Getting of all products from the cart
+        Getting of all products from the cart.
+        Items are hydrated with products once per cart instance
         """
-        products_ids = [pk for pk in self.cart]
-        products_ids_ordered = Case(*[When(pk=pk, then=Value(position)) for position, pk in enumerate(products_ids)])
-        # getting goods in order their id in products_ids
-        products = Product.available_objects.filter(id__in=products_ids).order_by(products_ids_ordered)
-        cart = deepcopy(self.cart)
-
-        for pk, prod in zip(products_ids, products):
-            cart[pk]['quantity_form'] = CartQuantityForm(initial={'quantity': cart[pk]['quantity']})
-            cart[pk]['product'] = prod
-            cart[pk]['price'] = Decimal(cart[pk]['price'])
-            cart[pk]['total_price'] = Decimal(cart[pk]['price'] * cart[pk]['quantity'])
+        if self._items is None:
+            self._items = self._get_items()
+        return iter(self._items)
 
-        for item in cart:
-            yield cart[item]
+    def _get_items(self) -> List[dict]:
+        """
+        Returns cart items with products, their prices and forms for changing products quantity,
+        items are in order of adding products to the cart
+        """
+        products = Product.available_objects.in_bulk([int(pk) for pk in self.cart])
+        items = []
+        for pk, item in self.cart.items():
+            product = products.get(int(pk))
+            if product is None:  # product is not available anymore
+                continue
+            price = Decimal(item['price'])
+            items.append({
+                'price': price,
+                'quantity': item['quantity'],
+                'quantity_form': CartQuantityForm(initial={'quantity': item['quantity']}),
+                'product': product,
+                'total_price': price * item['quantity'],
+            })
+        return items
 
     def remove(self, product_id: int):
         """
@@ -92,13 +132,16 @@ class Cart:
         if str(product_id) in self.cart:
             del self.cart[str(product_id)]
 
-            self.session.modified = True
+            self._items = None
+            self._update_summary()
 
     def clear(self):
         """
         Clearing the cart with deleting coupon and present card from session
         """
         del self.session[settings.CART_SESSION_ID]
+        if settings.CART_SUMMARY_SESSION_ID in self.session:
+            del self.session[settings.CART_SUMMARY_SESSION_ID]
         if 'coupon_id' in self.session:
             del self.session['coupon_id']
         if 'present_card_id' in self.session:
@@ -109,7 +152,7 @@ class Cart:
         """
         Getting total cost of all products taking into account it quantity
         """
-        return sum(Decimal(item['price']) * item['quantity'] for item in self.cart.values())
+        return Decimal(self.summary['total_price'])
 
     def get_amount_items_in(self) -> int:
         """
@@ -117,25 +160,30 @@ class Cart:
         """
         return len(self.cart)
 
+    def get_totals(self) -> PriceTotals:
+        """
+        Returns total price, total price with discounts and total discount of the cart,
+        which are computed once until the cart or applied coupon (present card) changes.
+        Discounts are not kept in session, since coupon or present card may be changed or deleted meanwhile
+        """
+        applied = (self.coupon_id, self.present_card_id)
+        if self._totals is None or self._totals[0] != applied:
+            coupon, present_card = self.coupon, self.present_card
+            totals = apply_discount(self.get_total_price(),
+                                    coupon.discount if coupon else None,
+                                    present_card.amount if present_card else None)
+            self._totals = (applied, totals)
+        return self._totals[1]
+
     def get_total_price_with_discounts(self) -> Decimal:
         """
         Calculating total order sum taking into account coupon discount
         or deduction of the fixed amount of present card
         """
-        price_without_discount = self.get_total_price()
-        coupon, present_card = self.coupon, self.present_card
-
-        if coupon:
-            result_amount = price_without_discount - (price_without_discount * coupon.discount / 100)
-        elif present_card:
-            result_amount = price_without_discount - present_card.amount
-        else:
-            result_amount = price_without_discount
-
-        return Decimal(result_amount).quantize(Decimal('0.01'))
+        return self.get_totals().total_price_with_discounts
 
     def get_total_discount(self) -> Decimal:
         """
         Returns discount amount taking into account coupon or present card
         """
-        return self.get_total_price() - self.get_total_price_with_discounts()
+        return self.get_totals().total_discount
@@ -0,0 +1,87 @@
+from decimal import Decimal, ROUND_HALF_UP
+from typing import Iterable, NamedTuple, Tuple, Union
+
+from coupons.models import Coupon
+from present_cards.models import PresentCard
+
+CENT = Decimal('0.01')
+
+
+class PriceTotals(NamedTuple):
+    """
+    Totals of the cart or the order
+    """
+    total_price: Decimal
+    total_price_with_discounts: Decimal
+    total_discount: Decimal
+
+
+def apply_discount(total_price: Decimal,
+                   coupon_discount: Union[int, None] = None,
+                   present_card_amount: Union[int, None] = None) -> PriceTotals:
+    """
+    Returns totals for `total_price` of goods taking into account either coupon discount in percents
+    or deduction of the fixed amount of present card
+    """
+    total_price = Decimal(total_price)
+    if coupon_discount is not None:
+        price_with_discounts = total_price - (total_price * Decimal(coupon_discount) / 100)
+    elif present_card_amount is not None:
+        price_with_discounts = total_price - Decimal(present_card_amount)
+    else:
+        price_with_discounts = total_price
+
+    price_with_discounts = price_with_discounts.quantize(CENT)
+    return PriceTotals(total_price, price_with_discounts, total_price - price_with_discounts)
+
+
+def calculate_totals(lines: Iterable[Tuple[Union[Decimal, str], int]],
+                     coupon_discount: Union[int, None] = None,
+                     present_card_amount: Union[int, None] = None) -> PriceTotals:
+    """
+    Returns totals of the goods `lines` -> (price, quantity), which are summed in one pass
+    """
+    total_price = sum((Decimal(price) * quantity for price, quantity in lines), Decimal('0'))
+    return apply_discount(total_price, coupon_discount, present_card_amount)
+
+
+def to_cents(amount: Decimal) -> int:
+    """
+    Returns `amount` in cents, e.g. for payment system
+    """
+    return int((Decimal(amount) * 100).quantize(Decimal('1'), rounding=ROUND_HALF_UP))
+
+
+class CartPricing:
+    """
+    Pricing engine of the request.
+    Coupons and present cards, which are applied to the cart, are obtained from DB once per request
+    """
+
+    def __init__(self):
+        self._coupons = {}
+        self._present_cards = {}
+
+    def get_coupon(self, coupon_id: Union[int, str, None]) -> Union[Coupon, None]:
+        if not coupon_id:
+            return None
+        if coupon_id not in self._coupons:
+            self._coupons[coupon_id] = Coupon.objects.filter(pk=coupon_id).first()
+        return self._coupons[coupon_id]
+
+    def get_present_card(self, present_card_id: Union[int, str, None]) -> Union[PresentCard, None]:
+        if not present_card_id:
+            return None
+        if present_card_id not in self._present_cards:
+            self._present_cards[present_card_id] = PresentCard.objects.filter(pk=present_card_id).first()
+        return self._present_cards[present_card_id]
+
+
+def get_cart_pricing(request) -> CartPricing:
+    """
+    Returns pricing engine, which is shared by all carts of the `request`
+    """
+    request = getattr(request, '_request', request)  # the same engine for DRF request and Django request
+    if not hasattr(request, 'cart_pricing'):
+        request.cart_pricing = CartPricing()
+    return request.cart_pricing
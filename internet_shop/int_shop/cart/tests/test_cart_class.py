@@ -273,6 +273,61 @@ class TestCartClass(TestCase):
         result_amount_discount = cart.get_total_discount()
         self.assertEqual(result_amount_discount, expected_amount_discount)
 
+    def test_cart_summary_without_queries(self):
+        """
+        Checking that cart summary is obtained from session without DB queries,
+        and cart items are hydrated only once
+        """
+        request = self.factory.get(reverse('cart:cart_detail'))  # make request for cart detail page
+        self.session.update({'coupon_id': self.coupon.pk})
+        self.session.save()
+        request.session = self.session
+
+        cart = Cart(request)
+        cart.add(self.product1, 2)
+        cart.add(self.product2, 1)
+        cart.get_total_price_with_discounts()  # coupon is obtained from DB once per request
+
+        cart = Cart(request)
+        with self.assertNumQueries(0):
+            self.assertEqual(len(cart), 3)
+            self.assertEqual(cart.get_total_price(), self.product1.price * 2 + self.product2.price)
+            cart.get_total_price_with_discounts()
+
+        with self.assertNumQueries(1):
+            self.assertEqual([item['product'] for item in cart], [self.product1, self.product2])
+            self.assertEqual(len(list(cart)), 2)
+
+        # discount isn't kept in session, changed coupon is applied on the next request
+        Coupon.objects.filter(pk=self.coupon.pk).update(discount=50)
+        request = self.factory.get(reverse('cart:cart_detail'))
+        request.session = self.session
+        total_price = self.product1.price * 2 + self.product2.price
+        self.assertEqual(Cart(request).get_total_price_with_discounts(), (total_price / 2).quantize(Decimal('0.01')))
+
+    def test_cart_pricing_once_per_request(self):
+        """
+        Checking that coupon is loaded once per request by pricing engine,
+        which is shared by all carts of the request, and totals are computed with Decimal
+        """
+        request = self.factory.get(reverse('cart:cart_detail'))
+        self.session.update({'coupon_id': self.coupon.pk})
+        self.session.save()
+        request.session = self.session
+
+        cart = Cart(request)
+        cart.add(self.product1, 2)
+        with self.assertNumQueries(1):
+            self.assertEqual(cart.coupon, self.coupon)
+            self.assertEqual(Cart(request).coupon, self.coupon)
+            totals = Cart(request).get_totals()
+
+        total_price = self.product1.price * 2
+        total_price_with_discounts = (total_price - total_price * self.coupon.discount / 100).quantize(Decimal('0.01'))
+        self.assertEqual(totals.total_price, total_price)
+        self.assertEqual(totals.total_price_with_discounts, total_price_with_discounts)
+        self.assertEqual(totals.total_discount, total_price - total_price_with_discounts)
+
     @classmethod
     def tearDownClass(cls):
         super().tearDownClass()
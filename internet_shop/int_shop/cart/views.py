@@ -5,10 +5,9 @@ from django.views.decorators.http import require_POST
 from cart.forms import CartQuantityForm
 from common.decorators import ajax_required
 from coupons.forms import CouponApplyForm
-from coupons.models import Coupon
+from goods.image_derivatives import get_image_derivatives
 from goods.models import Product
 from present_cards.forms import PresentCardApplyForm
-from present_cards.models import PresentCard
 from .cart import Cart
 
 
@@ -28,34 +27,32 @@ def cart_add(request) -> JsonResponse:
     if form.is_valid():
         cart.add(product, quantity=int(quantity))
 
+    totals = cart.get_totals()
     return JsonResponse({'success': True,
                          'cart_len': len(cart),
                          'added_prod_cost': cart.cart[product_id]['quantity'] * (product.promotional_price or
                                                                                  product.price),
-                         'total_price': cart.get_total_price(),
-                         'total_price_discounts': cart.get_total_price_with_discounts(),
-                         'total_discount': cart.get_total_discount()})
+                         'total_price': totals.total_price,
+                         'total_price_discounts': totals.total_price_with_discounts,
+                         'total_discount': totals.total_discount})
 
 
 def cart_detail(request) -> JsonResponse:
     """
     Displaying cart with goods if any.
     """
-    coupon_code = None
-    present_card_code = None
-    # if coupon was applied - show its code in form
-    if request.session.get('coupon_id'):
-        coupon_code = Coupon.objects.get(id=request.session.get('coupon_id'))
-
-    # if present card was applied - show its code in form
-    if request.session.get('present_card_id'):
-        present_card_code = PresentCard.objects.get(id=request.session.get('present_card_id'))
-    # filling form applied coupon code or present card code, if they were applied
-    coupon_form = CouponApplyForm(initial={'code': coupon_code.code if coupon_code else ''})
-    present_card_form = PresentCardApplyForm(initial={'code': present_card_code.code if present_card_code else ''})
-    return render(request, 'cart/detail.html', {'cart': Cart(request),
+    cart = Cart(request)
+    # if coupon or present card was applied - show its code in form,
+    # they are loaded once by pricing engine and reused, when the cart totals are rendered
+    coupon, present_card = cart.coupon, cart.present_card
+    coupon_form = CouponApplyForm(initial={'code': coupon.code if coupon else ''})
+    present_card_form = PresentCardApplyForm(initial={'code': present_card.code if present_card else ''})
+    # copies of the images of all products in the cart are obtained at once
+    image_derivatives = get_image_derivatives(item['product'].image.name for item in cart)
+    return render(request, 'cart/detail.html', {'cart': cart,
                                                 'coupon_form': coupon_form,
-                                                'present_card_form': present_card_form})
+                                                'present_card_form': present_card_form,
+                                                'image_derivatives': image_derivatives})
 
 
 @ajax_required
@@ -69,9 +66,10 @@ def cart_remove(request) -> JsonResponse:
     cart.remove(product_id)
     if not cart:  # if there are no products in the cart - delete applied coupon or present card
         cart.clear()
+    totals = cart.get_totals()
     return JsonResponse({'success': True,
                          'cart_len': len(cart),
-                         'total_price': cart.get_total_price(),
-                         'total_price_discounts': cart.get_total_price_with_discounts(),
-                         'total_discount': cart.get_total_discount(),
+                         'total_price': totals.total_price,
+                         'total_price_discounts': totals.total_price_with_discounts,
+                         'total_discount': totals.total_discount,
                          'language': request.LANGUAGE_CODE})
@@ -6,6 +6,8 @@ from django.http.request import HttpRequest
 from django.http.response import JsonResponse
 from django.shortcuts import reverse
 from django.urls import resolve
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date, quote_etag
 
 from goods.models import Product
 
@@ -54,3 +56,35 @@ def auth_profile_required(func):
         return JsonResponse({'success': False, 'login_page_url': reverse_url}, status=401)
 
     return wrap
+
+
+def conditional_get(get_validators):
+    """
+    Decorator for views (and viewset methods with `method_decorator`), which returns 304 response
+    for GET and HEAD requests, if `If-None-Match` or `If-Modified-Since` headers match validators
+    from `get_validators(request, *args, **kwargs)` -> (ETag, Last-Modified datetime), before the view is called.
+    Validators are added to the response, clients and caches have to revalidate it before each use
+    """
+
+    def decorator(func):
+        @wraps(func)
+        def wrap(request, *args, **kwargs):
+            if request.method not in ('GET', 'HEAD'):
+                return func(request, *args, **kwargs)
+
+            etag, last_modified = get_validators(request, *args, **kwargs)
+            etag, last_modified = quote_etag(etag), int(last_modified.timestamp())
+            response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+            if response is None:
+                response = func(request, *args, **kwargs)
+                if response.status_code != 200:  # validators describe only successful responses
+                    return response
+
+            response.headers.setdefault('ETag', etag)
+            response.headers.setdefault('Last-Modified', http_date(last_modified))
+            patch_cache_control(response, no_cache=True)
+            return response
+
+        return wrap
+
+    return decorator
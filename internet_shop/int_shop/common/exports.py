@@ -0,0 +1,116 @@
+import csv
+import json
+import os
+from time import perf_counter
+from typing import Callable, Iterable, Iterator, TextIO
+
+from django.core.management.base import BaseCommand
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import StreamingHttpResponse
+
+EXPORT_FORMATS = ('csv', 'jsonl')
+EXPORT_CONTENT_TYPES = {'csv': 'text/csv; charset=utf-8', 'jsonl': 'application/x-ndjson; charset=utf-8'}
+EXPORT_CHUNK_SIZE = 2000  # number of rows, which are fetched from the server-side cursor at once
+EXPORT_BUFFER_SIZE = 64 * 1024  # number of characters, which are sent to the client or the file at once
+
+
+class _Echo:
+    """
+    Pseudo-buffer for csv writer, which returns written line instead of storing it
+    """
+
+    def write(self, value: str) -> str:
+        return value
+
+
+def _iter_lines(records: Iterable[dict], file_format: str, columns: Iterable[str],
+                flatten: Callable[[dict], Iterable[dict]]) -> Iterator[str]:
+    if file_format == 'jsonl':
+        for record in records:
+            yield json.dumps(record, cls=DjangoJSONEncoder, ensure_ascii=False) + '\n'
+        return
+
+    writer = csv.DictWriter(_Echo(), fieldnames=columns, extrasaction='ignore')
+    yield writer.writeheader()
+    for record in records:
+        for row in flatten(record):
+            yield writer.writerow(row)
+
+
+def iter_export(records: Iterable[dict], file_format: str, columns: Iterable[str],
+                flatten: Callable[[dict], Iterable[dict]]) -> Iterator[str]:
+    """
+    Yields `records` in CSV or JSONL `file_format` by chunks of `EXPORT_BUFFER_SIZE` characters.
+    JSONL line is the whole record, CSV rows with `columns` are made from the record by `flatten`.
+    Only one chunk of the records and of the output is kept in memory
+    """
+    buffer, size = [], 0
+    for line in _iter_lines(records, file_format, columns, flatten):
+        buffer.append(line)
+        size += len(line)
+        if size >= EXPORT_BUFFER_SIZE:
+            yield ''.join(buffer)
+            buffer, size = [], 0
+    if buffer:
+        yield ''.join(buffer)
+
+
+def export_response(records: Iterable[dict], file_format: str, columns: Iterable[str],
+                    flatten: Callable[[dict], Iterable[dict]], filename: str) -> StreamingHttpResponse:
+    """
+    Returns response, which streams `records` as the attached file with `filename` and extension of `file_format`
+    """
+    response = StreamingHttpResponse((chunk.encode('utf-8')
+                                      for chunk in iter_export(records, file_format, columns, flatten)),
+                                     content_type=EXPORT_CONTENT_TYPES[file_format])
+    response['Content-Disposition'] = f'attachment; filename="{filename}.{file_format}"'
+    response['Cache-Control'] = 'no-store'
+    return response
+
+
+def write_export(file: TextIO, records: Iterable[dict], file_format: str, columns: Iterable[str],
+                 flatten: Callable[[dict], Iterable[dict]]) -> None:
+    """
+    Writes `records` to the `file` in CSV or JSONL `file_format`
+    """
+    for chunk in iter_export(records, file_format, columns, flatten):
+        file.write(chunk)
+
+
+class ExportCommand(BaseCommand):
+    """
+    Base command, which writes records from `get_records` to the file or stdout in CSV or JSONL format
+    """
+    columns = ()  # columns of CSV file
+    name = 'records'
+
+    @staticmethod
+    def flatten(record: dict) -> Iterable[dict]:
+        """
+        Returns CSV rows of the `record`
+        """
+        return [record]
+
+    def get_records(self, options: dict) -> Iterable[dict]:
+        raise NotImplementedError('subclasses of ExportCommand must provide a get_records() method')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--output', help='Path to the file, by default records are written to stdout')
+        parser.add_argument('--format', choices=EXPORT_FORMATS,
+                            help='Format of the file, by default by extension of the output file or CSV')
+
+    def handle(self, *args, **options):
+        output = options['output']
+        file_format = options['format'] or ('jsonl' if output and os.path.splitext(output)[1] in ('.jsonl', '.json')
+                                            else 'csv')
+        records = self.get_records(options)
+        if not output:
+            for chunk in iter_export(records, file_format, self.columns, self.flatten):
+                self.stdout.write(chunk, ending='')
+            return
+
+        start = perf_counter()
+        with open(output, 'w', encoding='utf-8', newline='') as file:
+            write_export(file, records, file_format, self.columns, self.flatten)
+        self.stdout.write(self.style.SUCCESS(f'{self.name.capitalize()} have been exported to {output} '
+                                             f'in {perf_counter() - start:.2f}s'))
@@ -0,0 +1,118 @@
+import os
+import shutil
+from functools import lru_cache, partial
+from typing import Iterable, Tuple
+
+import boto3
+from django.conf import settings
+from django.core.files.storage import Storage, default_storage
+from django.db import transaction
+from storages.backends.s3boto3 import S3Boto3Storage
+
+from common.moduls_init import redis
+
+# Redis sets with media, which has to be deleted by worker:
+# objects of S3 buckets ("<bucket>/<key>") and local files or directories (absolute paths)
+MEDIA_CLEANUP_OBJECTS_KEY = 'media_cleanup:objects'
+MEDIA_CLEANUP_PATHS_KEY = 'media_cleanup:paths'
+# all sets with queued media, including the ones with media, which is being deleted by worker right now
+MEDIA_CLEANUP_KEYS = (MEDIA_CLEANUP_OBJECTS_KEY, MEDIA_CLEANUP_PATHS_KEY,
+                      f'{MEDIA_CLEANUP_OBJECTS_KEY}:processing', f'{MEDIA_CLEANUP_PATHS_KEY}:processing')
+MEDIA_CLEANUP_SCHEDULED_KEY = 'media_cleanup:scheduled'
+MEDIA_CLEANUP_COUNTDOWN = 5  # seconds, during which deleted media is gathered into one batch
+MEDIA_CLEANUP_RETRY_COUNTDOWN = 60 * 5  # seconds, after which media, which has not been deleted, is deleted again
+S3_DELETE_BATCH_SIZE = 1000  # maximal number of keys in one multi-object delete request of S3
+
+
+@lru_cache(maxsize=None)
+def get_s3_client():
+    """
+    Returns S3 client, which is created once per process and is reused by all tasks of the worker.
+    Endpoint can be changed to local S3 compatible storage with `AWS_S3_ENDPOINT_URL` setting
+    """
+    return boto3.client('s3', endpoint_url=getattr(settings, 'AWS_S3_ENDPOINT_URL', None))
+
+
+def queue_media_cleanup(names: Iterable[str] = (),
+                        directories: Iterable[str] = (),
+                        storage: Storage = default_storage) -> None:
+    """
+    Queues files with storage `names` of the `storage` and local `directories` (relative to media root)
+    for deletion by worker after transaction has been committed, so that deleted instances
+    don't wait for storage requests, and files of the instances deleted at once are deleted in batches
+    """
+    objects, paths = [], [os.path.join(settings.MEDIA_ROOT, directory) for directory in directories]
+    for name in filter(None, names):
+        if isinstance(storage, S3Boto3Storage):
+            objects.append(f'{storage.bucket_name}/{storage.location}/{name}' if storage.location else
+                           f'{storage.bucket_name}/{name}')
+        else:
+            paths.append(storage.path(name))
+
+    if objects or paths:
+        transaction.on_commit(partial(_push_media_cleanup, objects, paths))
+
+
+def _push_media_cleanup(objects: list, paths: list) -> None:
+    with redis.pipeline() as pipe:
+        if objects:
+            pipe.sadd(MEDIA_CLEANUP_OBJECTS_KEY, *objects)
+        if paths:
+            pipe.sadd(MEDIA_CLEANUP_PATHS_KEY, *paths)
+        pipe.execute()
+    schedule_media_cleanup()
+
+
+def schedule_media_cleanup(countdown: int = MEDIA_CLEANUP_COUNTDOWN) -> None:
+    """
+    Schedules deletion of the queued media by worker after `countdown`, unless it has been scheduled already,
+    so that one task is scheduled for all media, which is deleted during countdown
+    """
+    from common.tasks import cleanup_media  # tasks module imports this one
+
+    if redis.set(MEDIA_CLEANUP_SCHEDULED_KEY, 1, nx=True, ex=countdown * 12):
+        cleanup_media.apply_async(countdown=countdown)
+
+
+def delete_s3_objects(objects: Iterable[str]) -> Tuple[int, list]:
+    """
+    Deletes S3 `objects` ("<bucket>/<key>") with multi-object delete requests.
+    Returns number of deleted objects and list of objects, which have not been deleted
+    """
+    buckets = {}
+    for obj in objects:
+        bucket, key = obj.split('/', 1)
+        buckets.setdefault(bucket, []).append(key)
+
+    client = get_s3_client()
+    deleted, failed = 0, []
+    for bucket, keys in buckets.items():
+        for i in range(0, len(keys), S3_DELETE_BATCH_SIZE):
+            batch = keys[i:i + S3_DELETE_BATCH_SIZE]
+            response = client.delete_objects(Bucket=bucket,
+                                             Delete={'Objects': [{'Key': key} for key in batch], 'Quiet': True})
+            errors = [f'{bucket}/{error["Key"]}' for error in response.get('Errors', [])]
+            deleted += len(batch) - len(errors)
+            failed.extend(errors)
+    return deleted, failed
+
+
+def delete_local_paths(paths: Iterable[str]) -> int:
+    """
+    Deletes local files or directories with `paths`, which are inside media root.
+    Returns number of deleted paths
+    """
+    media_root = os.path.realpath(settings.MEDIA_ROOT)
+    deleted = 0
+    for path in paths:
+        path = os.path.realpath(path)
+        if os.path.commonpath([media_root, path]) != media_root or path == media_root:
+            continue
+        if os.path.isdir(path):
+            shutil.rmtree(path, ignore_errors=True)
+        elif os.path.exists(path):
+            os.remove(path)
+        else:
+            continue
+        deleted += 1
+    return deleted
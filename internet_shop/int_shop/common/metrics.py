@@ -0,0 +1,44 @@
+from django.http import HttpResponse
+from prometheus_client import CollectorRegistry, CONTENT_TYPE_LATEST, generate_latest
+from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily
+
+from common.moduls_init import redis
+from common.utils import CAPTCHA_POOL_STATS_KEY, CAPTCHA_PRESETS, get_captcha_pool_key
+
+
+class CaptchaPoolCollector:
+    """
+    Collects depth of the captcha pools and numbers of captchas, which have been popped from the pools (hits)
+    or have been rendered synchronously because of empty pool (misses), from Redis,
+    so that metrics are the same for all processes of the site
+    """
+
+    def collect(self):
+        with redis.pipeline() as pipe:
+            for preset in CAPTCHA_PRESETS:
+                pipe.llen(get_captcha_pool_key(*preset))
+            pipe.hmget(CAPTCHA_POOL_STATS_KEY, 'hits', 'misses')
+            *depths, (hits, misses) = pipe.execute()
+        hits, misses = int(hits or 0), int(misses or 0)
+
+        depth = GaugeMetricFamily('captcha_pool_depth', 'Number of pre-rendered captchas in the pool',
+                                  labels=['size'])
+        for (width, height, font_size), value in zip(CAPTCHA_PRESETS, depths):
+            depth.add_metric([f'{width}x{height}x{font_size}'], value)
+        yield depth
+        yield CounterMetricFamily('captcha_pool_hits', 'Number of captchas popped from the pools', value=hits)
+        yield CounterMetricFamily('captcha_pool_misses', 'Number of captchas rendered because of empty pool',
+                                  value=misses)
+        yield GaugeMetricFamily('captcha_pool_miss_ratio', 'Share of captchas rendered because of empty pool',
+                                value=misses / (hits + misses) if hits + misses else 0)
+
+
+registry = CollectorRegistry()
+registry.register(CaptchaPoolCollector())
+
+
+def metrics(request) -> HttpResponse:
+    """
+    Returns metrics of the site in Prometheus format
+    """
+    return HttpResponse(generate_latest(registry), content_type=CONTENT_TYPE_LATEST)
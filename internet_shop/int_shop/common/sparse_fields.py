@@ -0,0 +1,113 @@
+from typing import Iterable, List, Optional
+
+from django.core.exceptions import FieldDoesNotExist
+from django.db.models import QuerySet
+from rest_framework.exceptions import ValidationError
+
+
+class SparseFieldsSerializerMixin:
+    """
+    Mixin for serializers, which keeps only fields with names from `fields` argument (all fields, if it is None)
+    """
+    fields_prefetch = {}  # relations, which are used by the fields without model source (e.g. method fields)
+
+    def __init__(self, *args, fields: Optional[Iterable[str]] = None, **kwargs):
+        super().__init__(*args, **kwargs)
+        if fields is not None:
+            for field_name in set(self.fields) - set(fields):
+                self.fields.pop(field_name)
+
+
+def shape_queryset(queryset: QuerySet, serializer: SparseFieldsSerializerMixin) -> QuerySet:
+    """
+    Returns `queryset`, which loads only columns and relations, used by the fields of the `serializer`.
+    Relations of the fields without model source are taken from `fields_prefetch` of the serializer.
+    Columns are not restricted, if some field uses the whole instance or its property
+    """
+    model = queryset.model
+    columns, select, prefetch = {model._meta.pk.name}, set(), set()
+    restrict_columns = True
+    for field_name, field in serializer.fields.items():
+        if field.write_only:
+            continue
+        if field_name in serializer.fields_prefetch:
+            prefetch.update(serializer.fields_prefetch[field_name])
+            continue
+
+        path = field.source.split('.')
+        try:
+            model_field = model._meta.get_field(path[0])
+        except FieldDoesNotExist:  # whole instance or its property
+            restrict_columns = False
+            continue
+
+        if model_field.many_to_many or model_field.one_to_many:
+            prefetch.add(path[0])
+        elif model_field.concrete and len(path) == 1:
+            columns.add(path[0])
+        elif model_field.concrete and model_field.is_relation and len(path) == 2:  # field of the related instance
+            select.add(path[0])
+            columns.update((path[0], '__'.join(path)))
+        else:
+            restrict_columns = False
+
+    if select:
+        queryset = queryset.select_related(*select)
+    if prefetch:
+        queryset = queryset.prefetch_related(*sorted(prefetch))
+    return queryset.only(*columns) if restrict_columns else queryset
+
+
+class SparseFieldsViewMixin:
+    """
+    Mixin for model viewsets, which allows to choose fields of GET responses with `?fields=` query parameter
+    (comma-separated names) and to add fields, which are omitted in lists, with `?expand=`.
+    Chosen fields define which columns are loaded, which relations are prefetched and which serializer fields exist
+    """
+    fields_query_param = 'fields'
+    expand_query_param = 'expand'
+    remove_fields_list_for_get_request = []  # fields, which are omitted in lists, unless they are expanded
+
+    def _get_query_param_fields(self, param: str) -> List[str]:
+        value = self.request.query_params.get(param, '') if self.request else ''
+        return [field_name.strip() for field_name in value.split(',') if field_name.strip()]
+
+    def get_sparse_fields(self, serializer_class=None, omitted_fields: Iterable[str] = ()) -> Optional[List[str]]:
+        """
+        Returns names of the fields of the `serializer_class`, which are requested with query parameters,
+        or which are not `omitted_fields` by default. Returns None, if all fields are used
+        """
+        serializer_class = serializer_class or self.get_serializer_class()
+        all_fields = list(serializer_class().fields)
+        fields = self._get_query_param_fields(self.fields_query_param)
+        expand = self._get_query_param_fields(self.expand_query_param)
+
+        unknown = set(fields + expand) - set(all_fields)
+        if unknown:
+            raise ValidationError({self.fields_query_param: f'Unknown fields: {", ".join(sorted(unknown))}'})
+
+        if not fields:
+            if not omitted_fields:
+                return None
+            fields = [field_name for field_name in all_fields if field_name not in omitted_fields]
+        return fields + [field_name for field_name in expand if field_name not in fields]
+
+    def get_list_fields(self, serializer_class=None) -> Optional[List[str]]:
+        """
+        Returns names of the fields of the list response
+        """
+        return self.get_sparse_fields(serializer_class, self.remove_fields_list_for_get_request)
+
+    def get_serializer(self, *args, **kwargs):
+        if getattr(self, 'swagger_fake_view', False):  # schema is generated with all fields
+            return super().get_serializer(*args, **kwargs)
+        if self.request and self.request.method == 'GET' and 'fields' not in kwargs:
+            kwargs['fields'] = self.get_list_fields() if kwargs.get('many') else self.get_sparse_fields()
+        return super().get_serializer(*args, **kwargs)
+
+    def shape_queryset(self, queryset: QuerySet, fields: Optional[Iterable[str]], serializer_class=None) -> QuerySet:
+        """
+        Returns `queryset`, which loads only columns and relations, used by the serializer `fields`
+        """
+        serializer_class = serializer_class or self.get_serializer_class()
+        return shape_queryset(queryset, serializer_class(fields=fields))
@@ -0,0 +1,81 @@
+from celery import shared_task
+
+from common.media_cleanup import (
+    MEDIA_CLEANUP_COUNTDOWN,
+    MEDIA_CLEANUP_KEYS,
+    MEDIA_CLEANUP_OBJECTS_KEY,
+    MEDIA_CLEANUP_PATHS_KEY,
+    MEDIA_CLEANUP_RETRY_COUNTDOWN,
+    MEDIA_CLEANUP_SCHEDULED_KEY,
+    delete_local_paths,
+    delete_s3_objects,
+    schedule_media_cleanup,
+)
+from common.moduls_init import redis
+from common.utils import fill_captcha_pools
+
+
+@shared_task
+def refill_captcha_pools() -> str:
+    """
+    Task renders captchas to the pools in background, so that views pop pre-rendered captchas
+    instead of rendering them on each request
+    """
+    lock = redis.lock('captcha_pool:lock', timeout=300)
+    if not lock.acquire(blocking=False):
+        return 'Captcha pools are being refilled by another worker'
+
+    try:
+        rendered = fill_captcha_pools()
+    finally:
+        lock.release()
+
+    return f'{rendered} captchas have been rendered to the pools'
+
+
+@shared_task
+def cleanup_media() -> str:
+    """
+    Task deletes media of the deleted instances, which has been queued since its previous run,
+    with batched requests to S3 (client is reused by the worker) and from the local file system.
+    Media, which has not been deleted, is deleted by the next task, which is scheduled, while any media is queued
+    """
+    lock = redis.lock('media_cleanup:lock', timeout=300)
+    if not lock.acquire(blocking=False):
+        # media, which has been queued meanwhile, is deleted by the running task or by the retry
+        cleanup_media.apply_async(countdown=MEDIA_CLEANUP_RETRY_COUNTDOWN)
+        return 'Media is being deleted by another worker, deletion will be retried'
+
+    retry = True  # deletion is retried later, if it has failed
+    try:
+        queued = {}
+        for key in (MEDIA_CLEANUP_OBJECTS_KEY, MEDIA_CLEANUP_PATHS_KEY):
+            processing_key = f'{key}:processing'
+            # media, which has not been processed last time, is processed together with the newly queued one
+            with redis.pipeline() as pipe:
+                pipe.sunionstore(processing_key, [processing_key, key])
+                pipe.delete(key)
+                pipe.smembers(processing_key)
+                *_, members = pipe.execute()
+            queued[key] = [member.decode() for member in members]
+
+        deleted_objects, failed_objects = delete_s3_objects(queued[MEDIA_CLEANUP_OBJECTS_KEY])
+        deleted_paths = delete_local_paths(queued[MEDIA_CLEANUP_PATHS_KEY])
+        with redis.pipeline() as pipe:
+            if failed_objects:  # objects are queued again before the processed ones are forgotten
+                pipe.sadd(MEDIA_CLEANUP_OBJECTS_KEY, *failed_objects)
+            pipe.delete(f'{MEDIA_CLEANUP_OBJECTS_KEY}:processing', f'{MEDIA_CLEANUP_PATHS_KEY}:processing')
+            pipe.execute()
+        retry = bool(failed_objects)
+    finally:
+        lock.release()
+        # media, which is queued from now on, schedules the next task itself,
+        # media, which has been queued during the run or has not been deleted, is deleted by the next task
+        redis.delete(MEDIA_CLEANUP_SCHEDULED_KEY)
+        if redis.exists(*MEDIA_CLEANUP_KEYS):
+            schedule_media_cleanup(MEDIA_CLEANUP_RETRY_COUNTDOWN if retry else MEDIA_CLEANUP_COUNTDOWN)
+
+    message = f'{deleted_objects} objects and {deleted_paths} local paths have been deleted'
+    if failed_objects:
+        message += f', objects have not been deleted and are queued again: {", ".join(failed_objects)}'
+    return message
@@ -2,7 +2,9 @@ import json
 from random import randint
 from unittest.mock import patch
 
+import boto3
 import redis as strict_redis
+from botocore.stub import Stubber
 from django.conf import settings
 from django.contrib.admin.sites import AdminSite
 from django.core.exceptions import ValidationError
@@ -15,9 +17,22 @@ from common.utils import (
     ValidDiscountsListFilter,
     create_random_text_for_captcha,
     create_captcha_image,
-    validate_captcha_text
+    validate_captcha_text,
+    fill_captcha_pools,
+    get_captcha_pool_key,
+    pop_captcha,
+    CAPTCHA_POOL_STATS_KEY,
+    CAPTCHA_PRESETS,
 )
 from common.utils import check_phone_number
+from common.media_cleanup import (
+    MEDIA_CLEANUP_KEYS,
+    MEDIA_CLEANUP_OBJECTS_KEY,
+    MEDIA_CLEANUP_RETRY_COUNTDOWN,
+    MEDIA_CLEANUP_SCHEDULED_KEY,
+    delete_s3_objects,
+)
+from common.tasks import cleanup_media
 from coupons.admin import CouponAdmin
 from coupons.models import Coupon, Category as Coupon_Category
 from present_cards.admin import PresentCardAdmin
@@ -210,5 +225,89 @@ class TestCommonUtils(TestCase):
         cleaned_data = {'captcha': '123HGK'}
         self.assertRaises(ValidationError, validate_captcha_text, **{'cleaned_data': cleaned_data})
 
+    @patch('common.utils.CAPTCHA_POOL_SIZE', 2)
+    def test_captcha_pool(self):
+        """
+        Checking popping pre-rendered captchas from the pool and rendering of captcha, when the pool is empty
+        """
+        pool_keys = [get_captcha_pool_key(*preset) for preset in CAPTCHA_PRESETS]
+        self.redis.delete(*pool_keys, CAPTCHA_POOL_STATS_KEY)
+        self.assertEqual(fill_captcha_pools(), 2 * len(CAPTCHA_PRESETS))
+        self.assertEqual(fill_captcha_pools(), 0)  # pools are full
+        self.assertTrue(all(0 < self.redis.ttl(key) for key in pool_keys))
+
+        width, height, font_size = CAPTCHA_PRESETS[0]
+        pool = [captcha.decode('utf-8').split(':', 1) for captcha in self.redis.lrange(pool_keys[0], 0, -1)]
+        self.assertEqual([pop_captcha(width, height, font_size) for _ in range(3)][:2], [tuple(c) for c in pool])
+        self.assertEqual(self.redis.llen(pool_keys[0]), 0)
+        self.assertEqual(self.redis.hmget(CAPTCHA_POOL_STATS_KEY, 'hits', 'misses'), [b'2', b'1'])
+
+        # there is no pool of this size, captcha is rendered without statistics
+        random_captcha_text, base64_captcha_image = pop_captcha(100, 50, 20)
+        self.assertEqual(len(random_captcha_text), 6)
+        self.assertIsInstance(base64_captcha_image, str)
+        self.assertEqual(self.redis.hmget(CAPTCHA_POOL_STATS_KEY, 'hits', 'misses'), [b'2', b'1'])
+        self.redis.delete(*pool_keys, CAPTCHA_POOL_STATS_KEY)
+
+    @patch('common.media_cleanup.S3_DELETE_BATCH_SIZE', 2)
+    def test_delete_s3_objects(self):
+        """
+        Checking deletion of S3 objects with batched multi-object delete requests and queueing again
+        of the objects, which have not been deleted. S3 is replaced with local stub of the client
+        """
+        client = boto3.client('s3', region_name='us-east-1', aws_access_key_id='test', aws_secret_access_key='test')
+        objects = ['bucket/media/a.jpg', 'bucket/media/b.jpg', 'bucket/media/c.jpg', 'other/media/d.jpg']
+        with Stubber(client) as stubber, patch('common.media_cleanup.get_s3_client', return_value=client):
+            for bucket, keys in (('bucket', ['media/a.jpg', 'media/b.jpg']), ('bucket', ['media/c.jpg']),
+                                 ('other', ['media/d.jpg'])):
+                errors = [{'Key': 'media/c.jpg', 'Code': 'AccessDenied'}] if keys == ['media/c.jpg'] else []
+                stubber.add_response('delete_objects', {'Errors': errors}, {
+                    'Bucket': bucket, 'Delete': {'Objects': [{'Key': key} for key in keys], 'Quiet': True},
+                })
+            self.assertEqual(delete_s3_objects(objects), (3, ['bucket/media/c.jpg']))
+            stubber.assert_no_pending_responses()
+
+        # objects, which have not been deleted, are queued again and the next task is scheduled
+        self.redis.sadd(MEDIA_CLEANUP_OBJECTS_KEY, 'bucket/media/a.jpg', 'bucket/media/c.jpg')
+        with patch('common.tasks.delete_s3_objects', return_value=(1, ['bucket/media/c.jpg'])), \
+                patch('common.tasks.cleanup_media.apply_async') as mocked_apply_async:
+            cleanup_media()
+        mocked_apply_async.assert_called_once_with(countdown=MEDIA_CLEANUP_RETRY_COUNTDOWN)
+        self.assertEqual(self.redis.smembers(MEDIA_CLEANUP_OBJECTS_KEY), {b'bucket/media/c.jpg'})
+        self.assertFalse(self.redis.exists(f'{MEDIA_CLEANUP_OBJECTS_KEY}:processing'))
+        self.redis.delete(MEDIA_CLEANUP_OBJECTS_KEY, MEDIA_CLEANUP_SCHEDULED_KEY)
+
+    def test_cleanup_media_is_rescheduled(self):
+        """
+        Checking that queued media is not stranded, when S3 fails or media is being deleted by another worker
+        """
+        self.redis.sadd(MEDIA_CLEANUP_OBJECTS_KEY, 'bucket/media/a.jpg')
+        with patch('common.tasks.delete_s3_objects', side_effect=ConnectionError), \
+                patch('common.tasks.cleanup_media.apply_async') as mocked_apply_async, \
+                self.assertRaises(ConnectionError):
+            cleanup_media()
+        mocked_apply_async.assert_called_once_with(countdown=MEDIA_CLEANUP_RETRY_COUNTDOWN)
+        self.assertEqual(self.redis.smembers(f'{MEDIA_CLEANUP_OBJECTS_KEY}:processing'), {b'bucket/media/a.jpg'})
+
+        # media, which has not been processed, is deleted together with the newly queued one
+        self.redis.sadd(MEDIA_CLEANUP_OBJECTS_KEY, 'bucket/media/b.jpg')
+        self.redis.delete(MEDIA_CLEANUP_SCHEDULED_KEY)
+        with patch('common.tasks.delete_s3_objects', return_value=(2, [])) as mocked_delete, \
+                patch('common.tasks.cleanup_media.apply_async') as mocked_apply_async:
+            cleanup_media()
+        self.assertEqual(sorted(mocked_delete.call_args.args[0]), ['bucket/media/a.jpg', 'bucket/media/b.jpg'])
+        mocked_apply_async.assert_not_called()
+        self.assertFalse(self.redis.exists(*MEDIA_CLEANUP_KEYS, MEDIA_CLEANUP_SCHEDULED_KEY))
+
+        # task, which has not acquired the lock, is retried
+        lock = self.redis.lock('media_cleanup:lock', timeout=10)
+        lock.acquire()
+        try:
+            with patch('common.tasks.cleanup_media.apply_async') as mocked_apply_async:
+                cleanup_media()
+            mocked_apply_async.assert_called_once_with(countdown=MEDIA_CLEANUP_RETRY_COUNTDOWN)
+        finally:
+            lock.release()
+
     def tearDown(self) -> None:
         self.redis.hdel(f'captcha:{self.random_text_captcha}', 'captcha_text')
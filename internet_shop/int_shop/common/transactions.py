@@ -0,0 +1,30 @@
+from functools import partial
+from typing import Callable, Hashable, Iterable, Optional
+
+from django.db import transaction
+
+
+def on_commit_batched(func: Callable[[list], None], items: Iterable[Hashable], using: Optional[str] = None) -> None:
+    """
+    Calls `func` once after the transaction has been committed with the list of unique `items`,
+    which have been passed with the same `func` during the transaction,
+    e.g. signals of all properties of the saved product lead to one rebuild of the category facets.
+    Outside of transaction `func` is called immediately
+    """
+    items = set(items) - {None}
+    if not items:
+        return
+
+    connection = transaction.get_connection(using)
+    if not hasattr(connection, 'on_commit_batches'):
+        connection.on_commit_batches = {}
+    connection.on_commit_batches.setdefault(func, set()).update(items)
+    # each call registers callback, the first executed one takes all items, so that items are not lost,
+    # when callbacks of the rolled back savepoint have been discarded
+    transaction.on_commit(partial(_run_batch, connection.on_commit_batches, func), using=using)
+
+
+def _run_batch(batches: dict, func: Callable[[list], None]) -> None:
+    items = batches.pop(func, None)
+    if items:
+        func(sorted(items))
@@ -1,10 +1,12 @@
 import base64
+from functools import lru_cache
 from random import choices, shuffle
 from string import ascii_uppercase, digits
-from typing import Union
+from typing import Tuple, Union
 
 import phonenumbers
 from captcha.image import ImageCaptcha
+from django.conf import settings
 from django.contrib import admin
 from django.core.exceptions import ValidationError
 from django.http.response import JsonResponse
@@ -14,6 +16,13 @@ from phonenumbers import carrier
 from common.moduls_init import redis
 
 NUMBER_OF_CAPTCHA_SYMBOLS = 6
+CAPTCHA_FONT = str(settings.BASE_DIR / 'static' / 'JetBrainsMono-Thin.ttf')
+CAPTCHA_TIMEOUT = 600  # seconds, during which captcha text is valid after captcha has been shown
+# sizes (width, height, font size) of the captchas on the site, which are pre-rendered to the pools
+CAPTCHA_PRESETS = ((200, 60, 35), (135, 60, 30))
+CAPTCHA_POOL_SIZE = 50  # number of pre-rendered captchas of each size
+CAPTCHA_POOL_TIMEOUT = 60 * 60  # seconds, pool is deleted, if it has not been refilled for this time
+CAPTCHA_POOL_STATS_KEY = 'captcha_pool:stats'  # Redis hash with numbers of hits and misses of the pools
 
 
 class ValidDiscountsListFilter(admin.SimpleListFilter):
@@ -64,6 +73,64 @@ def check_phone_number(phone_number: str) -> Union[str, bool]:
     return False
 
 
+def get_captcha_pool_key(width: int, height: int, font_size: int) -> str:
+    """
+    Returns key of Redis list with pre-rendered captchas of the size
+    """
+    return f'captcha_pool:{width}x{height}x{font_size}'
+
+
+@lru_cache
+def get_image_captcha(width: int, height: int, font_size: int) -> ImageCaptcha:
+    """
+    Returns captcha generator of the size, so that the font is read once per process for each size
+    """
+    return ImageCaptcha(width=width, height=height, fonts=[CAPTCHA_FONT], font_sizes=(font_size,))
+
+
+def render_captcha(width: int, height: int, font_size: int) -> Tuple[str, str]:
+    """
+    Returns random captcha text and image of this text in base64 format
+    """
+    random_captcha_text = create_random_text_for_captcha(NUMBER_OF_CAPTCHA_SYMBOLS)
+    data = get_image_captcha(width, height, font_size).generate(random_captcha_text)  # generate image of the text
+    data.seek(0)  # make sure we're at the beginning of the BytesIO object
+    return random_captcha_text, base64.b64encode(data.read()).decode('utf-8')
+
+
+def fill_captcha_pools() -> int:
+    """
+    Renders missing captchas to the pools of all sizes up to `CAPTCHA_POOL_SIZE`.
+    Returns number of rendered captchas
+    """
+    rendered = 0
+    for preset in CAPTCHA_PRESETS:
+        key = get_captcha_pool_key(*preset)
+        missing = CAPTCHA_POOL_SIZE - redis.llen(key)
+        if missing > 0:
+            redis.rpush(key, *(':'.join(render_captcha(*preset)) for _ in range(missing)))
+            rendered += missing
+        redis.expire(key, CAPTCHA_POOL_TIMEOUT)
+    return rendered
+
+
+def pop_captcha(width: int, height: int, font_size: int) -> Tuple[str, str]:
+    """
+    Returns captcha text and image of the size, which are popped from the pool atomically,
+    so that each pre-rendered captcha is shown only once.
+    Captcha is rendered synchronously, if the pool is empty, or there is no pool of the size
+    """
+    captcha = None
+    if (width, height, font_size) in CAPTCHA_PRESETS:
+        captcha = redis.lpop(get_captcha_pool_key(width, height, font_size))
+        redis.hincrby(CAPTCHA_POOL_STATS_KEY, 'misses' if captcha is None else 'hits', 1)
+
+    if captcha is None:
+        return render_captcha(width, height, font_size)
+    random_captcha_text, base64_captcha_image = captcha.decode('utf-8').split(':', 1)
+    return random_captcha_text, base64_captcha_image
+
+
 def create_captcha_image(request,
                          width: int = 200,
                          height: int = 60,
@@ -79,19 +146,11 @@ def create_captcha_image(request,
         height = int(request.POST.get('height'))
         font_size = int(request.POST.get('font_size'))
 
-    image = ImageCaptcha(width=width,
-                         height=height,
-                         fonts=['../int_shop/static/JetBrainsMono-Thin.ttf'],
-                         font_sizes=(font_size,))
-    random_captcha_text = create_random_text_for_captcha(NUMBER_OF_CAPTCHA_SYMBOLS)
-    data = image.generate(random_captcha_text)  # generate image of the given text
-    data.seek(0)  # make sure we're at the beginning of the BytesIO object
-    captcha_image = data.read()
-    base64_captcha_image = base64.b64encode(captcha_image).decode('utf-8')
+    random_captcha_text, base64_captcha_image = pop_captcha(width, height, font_size)
 
     # save captcha text to redis and set expire their key on 10 minutes
     redis.hset(f'captcha:{random_captcha_text}', 'captcha_text', random_captcha_text)
-    redis.expire(f'captcha:{random_captcha_text}', time=600, nx=True)
+    redis.expire(f'captcha:{random_captcha_text}', time=CAPTCHA_TIMEOUT, nx=True)
 
     result = JsonResponse({'success': True,
                            'captcha_image': base64_captcha_image}) \
@@ -6,7 +6,7 @@ from rest_framework import viewsets, permissions, status
 from rest_framework.decorators import action
 from rest_framework.response import Response
 
-from account.models import Profile
+from account.utils import get_user_profile
 from common.filters import ExtraSearchTerms
 from common.moduls_init import redis
 from .schemas import CouponActionsSchema
@@ -72,7 +72,7 @@ class CouponViewSet(viewsets.ModelViewSet):
             return Response({'detail': 'Coupon is already invalid'})
 
         session = request.session
-        profile = Profile.objects.get(user=request.user)
+        profile = get_user_profile(request.user)
         if 'cart' in session and session['cart'] or \
                 redis.hget('session_cart', f'user_id:{request.user.pk}') is not None:
             if act == 'apply':
@@ -3,7 +3,7 @@ from decimal import Decimal
 from django.http.response import JsonResponse
 from django.views.decorators.http import require_POST
 
-from account.models import Profile
+from account.utils import get_request_profile
 from common.decorators import ajax_required, auth_profile_required
 from coupons.forms import CouponApplyForm
 from .models import Coupon
@@ -20,7 +20,7 @@ def apply_coupon(request):
     if coupon_form.is_valid():
         code = coupon_form.cleaned_data.get('code')
         coupon = Coupon.objects.get(code=code)
-        Profile.objects.get(user=request.user).coupons.add(coupon)
+        get_request_profile(request).coupons.add(coupon)
         request.session['coupon_id'] = coupon.pk
 
         return JsonResponse({'success': True,
@@ -39,7 +39,7 @@ def cancel_coupon(request):
     Cancel applied coupon and delete it from session and profile
     """
     coupon = Coupon.objects.get(id=request.session['coupon_id'])
-    Profile.objects.get(user=request.user).coupons.remove(coupon)
+    get_request_profile(request).coupons.remove(coupon)
 
     del request.session['coupon_id']
     request.session.modified = True
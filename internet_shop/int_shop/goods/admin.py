@@ -11,7 +11,8 @@ from goods.models import (
     Comment,
     Property,
     Favorite,
-    PropertyCategory
+    PropertyCategory,
+    ProductPhoto,
 )
 
 
@@ -70,6 +71,16 @@ class PropertyInline(TranslatableInlineModelAdmin, admin.StackedInline):
     )
 
 
+class ProductPhotoInline(admin.TabularInline):
+    """
+    Detail photos under each product in detail product info.
+    """
+    model = ProductPhoto
+    extra = 0
+    fields = ('image', 'position', 'width', 'height', 'content_hash')
+    readonly_fields = ('width', 'height', 'content_hash')
+
+
 @admin.register(Product)
 class ProductSummernoteAdmin(SummernoteModelAdmin):
     """
@@ -77,13 +88,13 @@ class ProductSummernoteAdmin(SummernoteModelAdmin):
     """
     list_display = ['name', 'pk', 'manufacturer',
                     'price', 'promotional_price', 'created', 'updated',
-                    'available', 'promotional', 'rating']
-    readonly_fields = ['get_image_tag']
+                    'available', 'promotional', 'rating', 'views']
+    readonly_fields = ['get_image_tag', 'views']
     list_editable = ['price', 'available']
     list_filter = ['manufacturer', 'category', 'available']
     prepopulated_fields = {'slug': ('name',)}
     search_fields = ['name']
-    inlines = [CommentInline, PropertyInline]
+    inlines = [ProductPhotoInline, CommentInline, PropertyInline]
     save_on_top = True
     exclude = ('star',)
     summernote_fields = ('description',)
@@ -0,0 +1,49 @@
+from collections import OrderedDict
+
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+from goods.pagination import CURSOR_PARAM, KeysetPaginator, InvalidCursor
+
+
+class ProductPagination(PageNumberPagination):
+    """
+    Page number pagination, which is switched to keyset pagination, when request contains `cursor` parameter.
+    Keyset pages have no number and total count, estimated count is added on demand with `count` parameter
+    """
+    cursor_query_param = CURSOR_PARAM
+    count_query_param = 'count'
+    keyset_page = None
+
+    def paginate_queryset(self, queryset, request, view=None):
+        if self.cursor_query_param not in request.query_params:
+            self.keyset_page = None
+            return super().paginate_queryset(queryset, request, view)
+
+        self.request = request
+        paginator = KeysetPaginator(queryset, self.get_page_size(request))
+        try:
+            self.keyset_page = paginator.page(request.query_params.get(self.cursor_query_param))
+        except InvalidCursor:
+            raise NotFound('Invalid cursor')
+        return list(self.keyset_page)
+
+    def get_paginated_response(self, data):
+        if self.keyset_page is None:
+            return super().get_paginated_response(data)
+
+        response_data = OrderedDict([
+            ('next', self._get_cursor_link(self.keyset_page.next_cursor)),
+            ('previous', self._get_cursor_link(self.keyset_page.previous_cursor)),
+            ('results', data),
+        ])
+        if self.request.query_params.get(self.count_query_param):
+            response_data['estimated_count'] = self.keyset_page.paginator.count
+        return Response(response_data)
+
+    def _get_cursor_link(self, cursor):
+        if cursor is None:
+            return None
+        return replace_query_param(self.request.build_absolute_uri(), self.cursor_query_param, cursor)
@@ -1,6 +1,11 @@
 from decimal import Decimal
 from django_filters import rest_framework as filters
 from django.db.models import Q
+from django.utils.translation import get_language
+from rest_framework.filters import SearchFilter
+from rest_framework.settings import api_settings
+
+from goods.search import search_products
 
 
 class ProductFilter(filters.FilterSet):
@@ -54,3 +59,26 @@ class ProductFilter(filters.FilterSet):
     def properties_filter_name(self, queryset, name, value):
         self.pr_name = value
         return queryset.filter(properties__name__iexact=value)
+
+
+class ProductSearchFilter(SearchFilter):
+    """
+    Search products by full-text search documents and trigram similarity of the name.
+    If `id` is in `search_fields` of the view, numeric terms also match products with the same id exactly.
+    Found products are sorted by relevance, unless ordering was requested explicitly
+    """
+    max_id = 2 ** 63 - 1  # greater numbers can't be primary keys and are searched only as text
+
+    def filter_queryset(self, request, queryset, view):
+        terms = self.get_search_terms(request)
+        query = ' '.join(terms)
+        if not query:
+            return queryset
+
+        products_ids = []
+        if 'id' in (self.get_search_fields(view, request) or ()):
+            products_ids = [int(term) for term in terms if term.isdecimal() and int(term) <= self.max_id]
+        result = search_products(query, get_language(), queryset, products_ids)
+        if request.query_params.get(api_settings.ORDERING_PARAM):
+            return result.order_by(*queryset.query.order_by)
+        return result
@@ -1,8 +1,57 @@
+from django.db.models import Manager
 from parler_rest.fields import TranslatedFieldsField
 from parler_rest.serializers import TranslatableModelSerializer
 from rest_framework import serializers
 
-from goods.models import Product, Category, Property, Manufacturer
+from common.sparse_fields import SparseFieldsSerializerMixin
+from goods.image_derivatives import get_image_derivatives
+from goods.models import Product, Category, Property, Manufacturer, ImageDerivative
+from goods.product_bulk import save_products
+
+
+class ImageDerivativeField(serializers.Field):
+    """
+    Read-only field with URLs of the image copy for the `preset` in WebP and JPEG formats.
+    URL of the original image is used instead of JPEG copy, while copies have not been rendered yet
+    """
+
+    def __init__(self, preset: str, **kwargs):
+        self.preset = preset
+        kwargs['read_only'] = True
+        super().__init__(**kwargs)
+
+    def to_representation(self, image):
+        if not image:
+            return None
+        request = self.context.get('request')
+        build_url = request.build_absolute_uri if request else str
+        derivatives = self.context.get('image_derivatives') or {}
+        if image.name not in derivatives:  # single object or item, which has not been obtained by list serializer
+            derivatives = get_image_derivatives([image.name])
+        copies = derivatives[image.name].get(self.preset)
+        if not copies:
+            return {'webp': None, 'jpeg': build_url(image.url), 'width': None, 'height': None}
+
+        jpeg = copies[ImageDerivative.Format.JPEG]
+        return {'webp': build_url(copies[ImageDerivative.Format.WEBP]['url']),
+                'jpeg': build_url(jpeg['url']),
+                'width': jpeg['width'],
+                'height': jpeg['height']}
+
+
+class ImageDerivativesListSerializer(serializers.ListSerializer):
+    """
+    Serializer for lists of objects with `ImageDerivativeField` fields.
+    Copies of the images of all objects are obtained at once and passed to the fields through the context
+    """
+
+    def to_representation(self, data):
+        items = list(data.all() if isinstance(data, Manager) else data)
+        image_fields = [field for field in self.child.fields.values() if isinstance(field, ImageDerivativeField)]
+        if image_fields:
+            images = (field.get_attribute(item) for item in items for field in image_fields)
+            self.context['image_derivatives'] = get_image_derivatives(image.name for image in images if image)
+        return super().to_representation(items)
 
 
 class ProductPropertySerializer(TranslatableModelSerializer):
@@ -19,19 +68,32 @@ class ProductPropertySerializer(TranslatableModelSerializer):
         fields = ('translations', 'numeric_value', 'category_property', 'product_name', 'product')
 
 
-class ProductSerializer(serializers.ModelSerializer):
+class ProductSerializer(SparseFieldsSerializerMixin, serializers.ModelSerializer):
     """
     Serializer with product information about names of category, manufacturer which product belongs to,
     and comments, that belongs to the product.
     """
+    fields_prefetch = {'star_counts': ['star_counts'], 'properties': ['properties__translations']}
     category = serializers.PrimaryKeyRelatedField(read_only=False, queryset=Category.objects.all())
     manufacturer = serializers.PrimaryKeyRelatedField(read_only=False, queryset=Manufacturer.objects.all())
     comments = serializers.StringRelatedField(many=True, required=False)
     properties = ProductPropertySerializer(many=True, read_only=True)
+    star_counts = serializers.SerializerMethodField()
+    image_card = ImageDerivativeField(source='image', preset=ImageDerivative.Preset.CARD)
 
     class Meta:
         model = Product
         exclude = ('star', 'description')
+        read_only_fields = ('views', 'rating')
+        list_serializer_class = ImageDerivativesListSerializer
+
+    def get_star_counts(self, obj) -> dict:
+        """
+        Returns numbers of votes for each star of the product, which rating is derived from.
+        """
+        star_counts = dict.fromkeys(Product.Rating.values, 0)
+        star_counts.update((star_count.star, star_count.count) for star_count in obj.star_counts.all())
+        return star_counts
 
     def validate(self, attrs):
         """
@@ -59,6 +121,94 @@ class ProductSerializer(serializers.ModelSerializer):
             self.fields.pop(field_name)
 
 
+class ProductBulkListSerializer(serializers.ListSerializer):
+    """
+    Serializer for arrays of products. Categories, manufacturers and uniqueness of slugs of all products
+    are validated with one query per table, products are saved with bulk queries.
+    Products with `id` are updated (serializer instance is {id: product}), products without `id` are created
+    """
+
+    def validate(self, attrs: list) -> list:
+        instances = self.instance or {}
+        errors = {}
+
+        def add_error(index: int, field: str, message: str):
+            errors.setdefault(index, {}).setdefault(field, []).append(message)
+
+        categories_ids = set(Category.objects.filter(
+            pk__in={item['category_id'] for item in attrs if 'category_id' in item},
+        ).values_list('pk', flat=True))
+        manufacturers_ids = set(Manufacturer.objects.filter(
+            pk__in={item['manufacturer_id'] for item in attrs if item.get('manufacturer_id')},
+        ).values_list('pk', flat=True))
+        slugs = [item['slug'] for item in attrs if 'slug' in item]
+        taken_slugs = dict(Product.objects.filter(slug__in=slugs).values_list('slug', 'pk'))
+
+        for index, item in enumerate(attrs):
+            product = instances.get(item.get('id'))
+            if self.partial and 'id' not in item:
+                add_error(index, 'id', 'This field is required.')
+            elif 'id' in item and product is None:
+                add_error(index, 'id', f'Product with id {item["id"]} does not exist')
+            if 'category_id' in item and item['category_id'] not in categories_ids:
+                add_error(index, 'category', f'Invalid pk "{item["category_id"]}" - object does not exist.')
+            if item.get('manufacturer_id') and item['manufacturer_id'] not in manufacturers_ids:
+                add_error(index, 'manufacturer', f'Invalid pk "{item["manufacturer_id"]}" - object does not exist.')
+            if 'slug' in item and (slugs.count(item['slug']) > 1 or
+                                   taken_slugs.get(item['slug'], item.get('id')) != item.get('id')):
+                add_error(index, 'slug', 'product with this slug already exists.')
+
+            # promotional price of the updated product is compared with its stored price, if price is not passed
+            price = item.get('price', product.price if product else None)
+            promotional_price = item.get('promotional_price', product.promotional_price if product else None)
+            if price is not None and price < 0:
+                add_error(index, 'price', 'Price must be greater than zero')
+            if promotional_price and promotional_price < 0:
+                add_error(index, 'promotional_price', 'Price must be greater than zero')
+            elif promotional_price and price is not None and promotional_price > price:
+                add_error(index, 'promotional_price', 'Promotional price must not be greater than default price')
+
+        if errors:
+            raise serializers.ValidationError(errors)
+        return attrs
+
+    def create(self, validated_data: list) -> list:
+        return self.update({}, validated_data)
+
+    def update(self, instances: dict, validated_data: list) -> list:
+        created, updated, update_fields = [], [], set()
+        for item in validated_data:
+            product_id = item.pop('id', None)
+            if product_id is None:
+                created.append(Product(**item))
+            else:
+                product = instances[product_id]
+                for field, value in item.items():
+                    setattr(product, field, value)
+                update_fields.update(item)
+                updated.append(product)
+
+        save_products(created, updated, update_fields)
+        return created + updated
+
+
+class ProductBulkSerializer(serializers.ModelSerializer):
+    """
+    Serializer for products, which are created or updated in bulk.
+    Related objects and uniqueness are validated by list serializer for all products at once
+    """
+    id = serializers.IntegerField(required=False)
+    category = serializers.IntegerField(source='category_id')
+    manufacturer = serializers.IntegerField(source='manufacturer_id', allow_null=True, required=False)
+    slug = serializers.SlugField(max_length=100)
+
+    class Meta:
+        model = Product
+        fields = ('id', 'name', 'slug', 'category', 'manufacturer', 'price',
+                  'available', 'promotional', 'promotional_price')
+        list_serializer_class = ProductBulkListSerializer
+
+
 class ProductCategorySerializer(serializers.ModelSerializer):
     """
     Serializer for products categories
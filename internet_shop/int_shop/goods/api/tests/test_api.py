@@ -1,3 +1,4 @@
+import csv
 import json
 import os
 import shutil
@@ -121,6 +122,162 @@ class TestGoodsProductAPI(APITestCase):
             'DEFAULT_PAGINATION_CLASS') or hasattr(view, 'pagination_class') else response.data
         self.assertEqual(serializer.data, actual_result)
 
+    def test_get_products_conditional(self):
+        """
+        Check that products list and product are not sent again, while products of the category have not been changed.
+        """
+        url = reverse('goods_api:product-list', kwargs={'version': 'v1'})
+        detail_url = reverse('goods_api:product-detail', kwargs={'version': 'v1', 'pk': self.product1.pk})
+        response = self.client.get(url, {'category_slug': self.product2.category.slug})
+        etag, detail_etag = response['ETag'], self.client.get(detail_url)['ETag']
+        self.assertIn('no-cache', response['Cache-Control'])
+
+        with patch('goods.api.views.ProductViewSet.get_queryset') as get_queryset:
+            response = self.client.get(url, {'category_slug': self.product2.category.slug},
+                                       HTTP_IF_NONE_MATCH=etag)
+            self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+            response = self.client.get(detail_url, HTTP_IF_NONE_MATCH=detail_etag)
+            self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+            get_queryset.assert_not_called()
+
+        # product of another category has been changed
+        with patch('goods.signals.refresh_categories_price_stats.delay'), \
+                self.captureOnCommitCallbacks(execute=True):
+            self.product1.price = Decimal('100.00')
+            self.product1.save()
+        response = self.client.get(url, {'category_slug': self.product2.category.slug}, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        response = self.client.get(detail_url, HTTP_IF_NONE_MATCH=detail_etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['price'], '100.00')
+
+        with patch('goods.signals.refresh_categories_price_stats.delay'), \
+                self.captureOnCommitCallbacks(execute=True):
+            self.product3.available = False
+            self.product3.save()
+        response = self.client.get(url, {'category_slug': self.product2.category.slug}, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertEqual([product['id'] for product in response.data['results']], [self.product2.pk])
+
+    def test_get_products_sparse_fields(self):
+        """
+        Check choosing fields of the products list with `fields` and `expand` query parameters
+        """
+        url = reverse('goods_api:product-list', kwargs={'version': 'v1'})
+        response = self.client.get(f'{url}?fields=id,name,price')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        view = response.renderer_context['view']
+        actual_result = response.data['results'] if settings.REST_FRAMEWORK.get(
+            'DEFAULT_PAGINATION_CLASS') or hasattr(view, 'pagination_class') else response.data
+        self.assertEqual(actual_result, [{'id': product.pk, 'name': product.name, 'price': str(product.price)}
+                                         for product in sorted((self.product1, self.product2, self.product3),
+                                                               key=lambda product: product.name)])
+
+        response = self.client.get(f'{url}?expand=comments')
+        actual_result = response.data['results'] if settings.REST_FRAMEWORK.get(
+            'DEFAULT_PAGINATION_CLASS') or hasattr(view, 'pagination_class') else response.data
+        self.assertIn('comments', actual_result[0])
+        self.assertNotIn('properties', actual_result[0])
+
+        response = self.client.get(f'{url}?fields=id,unknown')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_search_products_with_cursor(self):
+        """
+        Check that product with the id from the search query goes first on the keyset pages of the search results
+        """
+        url = reverse('goods_api:product-list', kwargs={'version': 'v1'})
+        response = self.client.get(url, {'search': f'product {self.product3.pk}', 'cursor': ''})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        found_ids = [product['id'] for product in response.data['results']]
+        self.assertEqual(found_ids[0], self.product3.pk)
+
+        while response.data['next']:
+            response = self.client.get(response.data['next'])
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            found_ids.extend(product['id'] for product in response.data['results'])
+        self.assertEqual(sorted(found_ids), sorted([self.product1.pk, self.product2.pk, self.product3.pk]))
+
+    def test_bulk_products(self):
+        """
+        Check creating, updating and upserting several products at once.
+        """
+        url = reverse('goods_api:product-bulk', kwargs={'version': 'v1'})
+        products_data = [{'category': self.product1.category.pk, 'manufacturer': self.product1.manufacturer.pk,
+                          'name': f'Bulk_product_{i}', 'slug': f'bulk-product-{i}', 'price': '100.00'}
+                         for i in range(3)]
+        response = self.client.post(url, data=json.dumps(products_data), content_type='application/json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(Product.objects.filter(slug__startswith='bulk-product-').count(), 3)
+        self.assertTrue(all(os.path.isdir(os.path.join(settings.MEDIA_ROOT, f'products/product_{item["name"]}'))
+                            for item in products_data))
+
+        # slug of existing product - nothing must be created
+        response = self.client.post(url, data=json.dumps(products_data[:1]), content_type='application/json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('slug', response.data[0])
+
+        update_data = [{'id': self.product1.pk, 'price': '10.00', 'available': False},
+                       {'id': self.product2.pk, 'promotional_price': '1000.00'}]
+        response = self.client.patch(url, data=json.dumps(update_data), content_type='application/json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)  # promotional price exceeds price
+        self.assertEqual(list(response.data), [1])
+
+        update_data[1]['promotional_price'] = '600.00'
+        response = self.client.patch(url, data=json.dumps(update_data), content_type='application/json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.product1.refresh_from_db()
+        self.product2.refresh_from_db()
+        self.assertEqual(self.product1.price, Decimal('10.00'))
+        self.assertFalse(self.product1.available)
+        self.assertEqual(self.product2.promotional_price, Decimal('600.00'))
+
+        upsert_data = [{'slug': 'bulk-product-0', 'price': '150.00'}, {**products_data[0], 'slug': 'bulk-product-3'}]
+        response = self.client.put(reverse('goods_api:product-bulk-upsert', kwargs={'version': 'v1'}),
+                                   data=json.dumps(upsert_data), content_type='application/json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([item['slug'] for item in response.data], ['bulk-product-0', 'bulk-product-3'])
+        self.assertEqual(Product.objects.get(slug='bulk-product-0').price, Decimal('150.00'))
+        self.assertTrue(Product.objects.filter(slug='bulk-product-3').exists())
+
+        # user is not staff - it can't change products
+        self.user.is_staff = False
+        self.user.save()
+        response = self.client.patch(url, data=json.dumps(update_data), content_type='application/json')
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+        shutil.rmtree(os.path.join(settings.MEDIA_ROOT, f'products/product_{products_data[0]["name"]}'))
+        for item in products_data[1:]:
+            shutil.rmtree(os.path.join(settings.MEDIA_ROOT, f'products/product_{item["name"]}'))
+
+    def test_export_products(self):
+        """
+        Check streaming export of the products with their properties to JSONL and CSV.
+        """
+        url = reverse('goods_api:product-export', kwargs={'version': 'v1', 'file_format': 'csv'})
+        response = self.client.get(reverse('goods_api:product-export',
+                                           kwargs={'version': 'v1', 'file_format': 'jsonl'}))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response.streaming)
+        records = [json.loads(line) for line in b''.join(response.streaming_content).decode().splitlines()]
+        self.assertEqual([record['slug'] for record in records],
+                         [self.product1.slug, self.product2.slug, self.product3.slug])
+        self.assertEqual(records[0]['properties'][0]['property'], 'OS')
+        self.assertEqual(records[0]['properties'][0]['translations']['en']['text_value'], 'Android')
+
+        response = self.client.get(url, {'category_slug': self.product1.category.slug})
+        self.assertEqual(response['Content-Disposition'], 'attachment; filename="products.csv"')
+        rows = list(csv.DictReader(b''.join(response.streaming_content).decode().splitlines()))
+        self.assertEqual([(row['slug'], row['property']) for row in rows],
+                         [(self.product1.slug, 'OS'), (self.product1.slug, 'Color')])
+
+        # user is not staff
+        self.user.is_staff = False
+        self.user.save()
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
     def test_get_new_products_action(self):
         """
         Check action, which allows to get new products on the site.
@@ -160,25 +317,15 @@ class TestGoodsProductAPI(APITestCase):
         self.assertEqual(serializer.data, actual_result[0])
 
     @patch('goods.utils.redis')
-    @patch('goods.api.views.redis')
-    def test_get_popular_products_action(self, mock_redis1, mock_redis2):
+    def test_get_popular_products_action(self, mock_redis):
         """
         Check action, which allows to get popular products on the site.
         """
-        # data for "smembers" redis method
-        members = {
-            'products_ids': {f'{self.product1.pk}', f'{self.product2.pk}', f'{self.product3.pk}'},
-        }
-        # data for "hget" redis method
-        views = {
-            (f'product_id:{self.product1.pk}', 'views'): 10,
-            (f'product_id:{self.product2.pk}', 'views'): 5,
-            (f'product_id:{self.product3.pk}', 'views'): 15,
-        }
+        # products ids in the sorted set with views, sorted by descending of views
+        products_ids = [f'{self.product3.pk}'.encode(), f'{self.product1.pk}'.encode(), f'{self.product2.pk}'.encode()]
 
-        mock_redis1.smembers.side_effect = lambda key: members.get(key)
-        mock_redis1.hset.return_value = 0
-        mock_redis2.hget.side_effect = lambda hash_key, field: views.get((hash_key, field))
+        mock_redis.zcard.return_value = len(products_ids)
+        mock_redis.zrevrange.side_effect = lambda key, start, end: products_ids[start:None if end == -1 else end + 1]
 
         # that expected order means, that product3 has more views than others, and product2 has lower views than other
         serializer = ProductSerializer(instance=[self.product3, self.product1, self.product2], many=True)
@@ -210,7 +357,7 @@ class TestGoodsProductAPI(APITestCase):
 
         update_data = {
             'price': '1000.00',
-            'rating': '3.5',
+            'rating': '3.5',  # rating is derived from votes, it must not be updated
             'promotional_price': '900'
         }
 
@@ -223,7 +370,7 @@ class TestGoodsProductAPI(APITestCase):
         self.assertEqual(response.status_code, status.HTTP_200_OK)
         self.product1.refresh_from_db()
         self.assertEqual(self.product1.price, Decimal(update_data['price']))
-        self.assertEqual(self.product1.rating, Decimal(update_data['rating']))
+        self.assertEqual(self.product1.rating, Decimal('0.0'))
 
         # user is not staff - it can't update product
         self.user.is_staff = False
@@ -284,7 +431,7 @@ class TestGoodsProductAPI(APITestCase):
         self.assertEqual(Decimal(new_product_data['price']), self.product1.price)
         self.assertTrue(new_product_data['promotional'])
         self.assertEqual(Decimal(new_product_data['promotional_price']), self.product1.promotional_price)
-        self.assertEqual(Decimal(new_product_data['rating']), self.product1.rating)
+        self.assertEqual(Decimal('0.0'), self.product1.rating)
 
         # user is not staff - it can't update product
         self.user.is_staff = False
@@ -326,7 +473,7 @@ class TestGoodsProductAPI(APITestCase):
         self.assertEqual(new_product.price, Decimal(product_data['price']))
         self.assertFalse(new_product.promotional)
         self.assertEqual(new_product.promotional_price, Decimal(product_data['promotional_price'])),
-        self.assertEqual(new_product.rating, Decimal(product_data['rating']))
+        self.assertEqual(new_product.rating, Decimal('0.0'))
 
         # user is not staff - it can't create product
         self.user.is_staff = False
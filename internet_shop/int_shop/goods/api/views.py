@@ -1,20 +1,55 @@
+from django.db import transaction
 from django.db.models import Q
 from django.utils import timezone
 from django.utils.decorators import method_decorator
+from django.utils.translation import get_language
 from django_filters.rest_framework import DjangoFilterBackend
 from drf_yasg.openapi import Parameter
 from drf_yasg.utils import swagger_auto_schema
 from rest_framework import viewsets, filters, status
 from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
 from rest_framework.permissions import IsAdminUser
 from rest_framework.response import Response
 
-from common.moduls_init import redis
+from common.decorators import conditional_get
+from common.exports import EXPORT_FORMATS, export_response
+from common.sparse_fields import SparseFieldsViewMixin
+from goods.catalog_export import CATALOG_COLUMNS, flatten_catalog_record, get_catalog_queryset, iter_catalog_records
+from goods.catalog_generations import (
+    CATALOG_ALL,
+    get_catalog_validators,
+    get_category_generation_field,
+    get_product_generation_field,
+)
 from goods.models import Product, Category, Property, Manufacturer
+from goods.product_bulk import PRODUCTS_BULK_MAX_LENGTH
 from . import serializers
+from .pagination import ProductPagination
 from .persmissions import ObjectEditPermission
-from .product_filters import ProductFilter
-from ..utils import get_products_sorted_by_views
+from .product_filters import ProductFilter, ProductSearchFilter
+from ..utils import PopularProducts
+
+
+def get_products_list_validators(request, *args, **kwargs) -> tuple:
+    """
+    Returns validators of the products list from the generation of the category with `category_slug`
+    query parameter, or of the whole catalog
+    """
+    field = CATALOG_ALL
+    slug = request.query_params.get('category_slug')
+    if slug is not None:
+        category_id = Category.objects.filter(slug=slug).values_list('pk', flat=True).first()
+        if category_id is not None:
+            field = get_category_generation_field(category_id)
+    return get_catalog_validators(field, get_language())
+
+
+def get_product_validators(request, *args, **kwargs) -> tuple:
+    """
+    Returns validators of the product from its generation
+    """
+    return get_catalog_validators(get_product_generation_field(kwargs['pk']), get_language())
 
 
 @method_decorator(name='list', decorator=swagger_auto_schema(operation_summary='Get all products',
@@ -23,14 +58,19 @@ from ..utils import get_products_sorted_by_views
                                                                                           type='string',
                                                                                           required=False)]))
 @method_decorator(name='retrieve', decorator=swagger_auto_schema(operation_summary='Get product with {id}'))
+@method_decorator(name='retrieve', decorator=conditional_get(get_product_validators))
 @method_decorator(name='create', decorator=swagger_auto_schema(operation_summary='Create product'))
 @method_decorator(name='partial_update',
                   decorator=swagger_auto_schema(operation_summary='Update one or several product\'s field(s) with {id}'))
 @method_decorator(name='update', decorator=swagger_auto_schema(operation_summary='Full update product with {id}'))
 @method_decorator(name='destroy', decorator=swagger_auto_schema(operation_summary='Delete product with {id}'))
-class ProductViewSet(viewsets.ModelViewSet):
+class ProductViewSet(SparseFieldsViewMixin, viewsets.ModelViewSet):
     """
     Viewset that provides `retrieve`, `create`, `delete`, `list` and `update` product.
+    Fields of GET responses can be chosen with `?fields=id,name,price` and omitted ones added with `?expand=comments`,
+    only columns and relations of the chosen fields are loaded.
+    Lists and products are sent with ETag and Last-Modified from the catalog generations, matching conditional
+    requests get 304 response before the products are loaded.
 
     * get - obtain all products.
     * post - create new product.
@@ -41,33 +81,36 @@ class ProductViewSet(viewsets.ModelViewSet):
     """
     queryset = Product.available_objects.all()
     serializer_class = serializers.ProductSerializer
-    filter_backends = [DjangoFilterBackend, filters.OrderingFilter, filters.SearchFilter]
+    filter_backends = [DjangoFilterBackend, filters.OrderingFilter, ProductSearchFilter]
     filterset_class = ProductFilter
+    pagination_class = ProductPagination
     permission_classes = [ObjectEditPermission]
     ordering = ['name']
-    ordering_fields = ['price', 'promotional_price']
+    ordering_fields = ['price', 'promotional_price', 'views']
     search_fields = ['name', 'id']
     remove_fields_list_for_get_request = ['comments', 'slug', 'available',
                                           'created', 'updated', 'image', 'properties']
 
     def get_queryset(self):
-        queryset = Product.available_objects.prefetch_related('category', 'manufacturer', 'comments')
+        queryset = Product.available_objects.all()
         slug = self.request.query_params.get('category_slug')
         if slug is not None:
             queryset = queryset.filter(category__slug=slug)
 
+        if self.request.method == 'GET':
+            fields = self.get_sparse_fields() if self.detail else self.get_list_fields()
+            queryset = self.shape_queryset(queryset, fields)
         return queryset
 
+    @method_decorator(conditional_get(get_products_list_validators))
     def list(self, request, *args, **kwargs):
         queryset = self.filter_queryset(self.get_queryset())
         page = self.paginate_queryset(queryset)
-        if page:
+        if page is not None:
             serializer = self.get_serializer(instance=page, many=True)
-            serializer.child.remove_fields(self.remove_fields_list_for_get_request)  # remove fields from response
             return self.get_paginated_response(serializer.data)
 
         serializer = self.get_serializer(instance=queryset, many=True)
-        serializer.child.remove_fields(self.remove_fields_list_for_get_request)
         return Response(serializer.data, status=status.HTTP_200_OK)
 
     @swagger_auto_schema(operation_summary='Get only new products',
@@ -89,13 +132,12 @@ class ProductViewSet(viewsets.ModelViewSet):
         diff = now - timezone.timedelta(weeks=2)  # calculate the difference
         lookup = Q(created__gt=diff, category__name=category_name.title()) if category_name else Q(created__gt=diff)
 
-        products = Product.available_objects.filter(lookup)
+        products = self.shape_queryset(Product.available_objects.filter(lookup), self.get_list_fields())
 
         # if page contains results - returns only products on this page, otherwise returns all products
         page = self.paginate_queryset(products)
         if page is not None:
             serializer = self.get_serializer(page, many=True)
-            serializer.child.remove_fields(self.remove_fields_list_for_get_request)
             return self.get_paginated_response(serializer.data)
 
         serializer = self.get_serializer(products, many=True)
@@ -117,17 +159,15 @@ class ProductViewSet(viewsets.ModelViewSet):
         """
         category_name = request.query_params.get('category_name')
         lookup = Q(category__name=category_name.title(), promotional=True) if category_name else Q(promotional=True)
-        products = Product.available_objects.prefetch_related('comments').filter(lookup)
+        products = self.shape_queryset(Product.available_objects.filter(lookup), self.get_list_fields())
 
         # if page contains results - returns only products on this page, otherwise returns all products
         page = self.paginate_queryset(products)
         if page is not None:
             serializer = self.get_serializer(page, many=True)
-            serializer.child.remove_fields(self.remove_fields_list_for_get_request)
             return self.get_paginated_response(serializer.data)
 
         serializer = self.get_serializer(products, many=True)
-        serializer.child.remove_fields(self.remove_fields_list_for_get_request)
         return Response(serializer.data)
 
     @swagger_auto_schema(operation_summary='Get only popular products (means by their views)',
@@ -145,32 +185,132 @@ class ProductViewSet(viewsets.ModelViewSet):
         Get popular products in descending order either by a certain category or get all popular products.
         """
 
-        products_ids = [int(pk) for pk in redis.smembers('products_ids')]  # ids of all products
-        products_ids_sorted, products = get_products_sorted_by_views(products_ids)
-
         category_name = request.query_params.get('category_name')
 
         if category_name:  # products filter by category
-            product_list = [
-                products[pk] for pk in products_ids_sorted
-                if category_name.lower() == products[pk].category.name.lower()
-            ]
+            category = Category.objects.filter(name__iexact=category_name).first()
+            product_list = PopularProducts(category_id=category.pk) if category else []
         else:
-            product_list = [products[pk] for pk in products_ids_sorted]
-
-        redis.hset('popular_prods', 'ids', ','.join(str(prod.pk) for prod in product_list))
+            product_list = PopularProducts()
 
         # if page contains results - returns only products on this page, otherwise returns all products
         page = self.paginate_queryset(product_list)
         if page is not None:
             serializer = self.get_serializer(page, many=True)
-            serializer.child.remove_fields(self.remove_fields_list_for_get_request)
             return self.get_paginated_response(serializer.data)
 
         serializer = self.get_serializer(product_list, many=True)
-        serializer.child.remove_fields(self.remove_fields_list_for_get_request)
         return Response(serializer.data)
 
+    @swagger_auto_schema(method='post', operation_summary='Create several products at once',
+                         request_body=serializers.ProductBulkSerializer(many=True))
+    @swagger_auto_schema(method='patch', operation_summary='Update one or several fields of several products at once',
+                         request_body=serializers.ProductBulkSerializer(many=True))
+    @action(detail=False,
+            methods=['POST', 'PATCH'],
+            name='Bulk create or update products',
+            url_path='bulk',
+            permission_classes=[IsAdminUser])
+    def bulk(self, request, version: str = 'v1'):
+        """
+        Create products from the array (POST) or update passed fields of the products with `id` (PATCH)
+        with bulk queries in one transaction.
+        """
+        if request.method == 'POST':
+            serializer = serializers.ProductBulkSerializer(data=request.data, many=True,
+                                                           max_length=PRODUCTS_BULK_MAX_LENGTH)
+            serializer.is_valid(raise_exception=True)
+            serializer.save()
+            return Response(serializer.data, status=status.HTTP_201_CREATED)
+
+        serializer = serializers.ProductBulkSerializer(instance=self._get_bulk_instances(request.data, 'id'),
+                                                       data=request.data, many=True, partial=True,
+                                                       max_length=PRODUCTS_BULK_MAX_LENGTH)
+        serializer.is_valid(raise_exception=True)
+        serializer.save()
+        return Response(serializer.data, status=status.HTTP_200_OK)
+
+    @swagger_auto_schema(method='put', operation_summary='Create or update several products by their slugs at once',
+                         request_body=serializers.ProductBulkSerializer(many=True))
+    @action(detail=False,
+            methods=['PUT'],
+            name='Bulk upsert products',
+            url_path='bulk/upsert',
+            permission_classes=[IsAdminUser])
+    def bulk_upsert(self, request, version: str = 'v1'):
+        """
+        Update passed fields of the products with existing slugs and create products with new slugs
+        with bulk queries in one transaction.
+        """
+        products = self._get_bulk_instances(request.data, 'slug')
+        indexes = {True: [], False: []}  # indexes of updated and created products in the passed array
+        data = {True: [], False: []}
+        for index, item in enumerate(request.data):
+            exists = isinstance(item.get('slug'), str) and item['slug'] in products
+            indexes[exists].append(index)
+            item = {field: value for field, value in item.items() if field != 'id'}  # products are found by slugs
+            data[exists].append({**item, 'id': products[item['slug']].pk} if exists else item)
+
+        update_serializer = serializers.ProductBulkSerializer(instance={product.pk: product
+                                                                        for product in products.values()},
+                                                              data=data[True], many=True, partial=True)
+        create_serializer = serializers.ProductBulkSerializer(data=data[False], many=True)
+        errors = {}
+        for exists, serializer in ((True, update_serializer), (False, create_serializer)):
+            if not serializer.is_valid():
+                errors.update(self._map_bulk_errors(serializer.errors, indexes[exists]))
+        if errors:
+            return Response(errors, status=status.HTTP_400_BAD_REQUEST)
+
+        with transaction.atomic():
+            update_serializer.save()
+            create_serializer.save()
+        result = dict(zip(indexes[True] + indexes[False], update_serializer.data + create_serializer.data))
+        return Response([result[index] for index in sorted(result)], status=status.HTTP_200_OK)
+
+    @swagger_auto_schema(method='get', operation_summary='Export all products with their properties to CSV or JSONL',
+                         manual_parameters=[Parameter(name='category_slug', in_='query', type='string',
+                                                      required=False)],
+                         responses={200: 'CSV or JSONL file in the layout of the catalog import'})
+    @action(detail=False,
+            methods=['GET'],
+            name='Export products',
+            url_path=rf'export/(?P<file_format>{"|".join(EXPORT_FORMATS)})',
+            permission_classes=[IsAdminUser])
+    def export(self, request, file_format: str, version: str = 'v1'):
+        """
+        Stream all products (including unavailable) with their translated properties.
+        Products are read with server-side cursor by chunks, so memory doesn't depend on the size of the catalog.
+        """
+        queryset = get_catalog_queryset(request.query_params.get('category_slug'))
+        return export_response(iter_catalog_records(queryset), file_format, CATALOG_COLUMNS,
+                               flatten_catalog_record, 'products')
+
+    @staticmethod
+    def _get_bulk_instances(data, field: str) -> dict:
+        """
+        Returns products, whose `field` values are passed in array `data` -> {value: product}
+        """
+        if not isinstance(data, list) or len(data) > PRODUCTS_BULK_MAX_LENGTH or \
+                not all(isinstance(item, dict) for item in data):
+            raise ValidationError({'non_field_errors': [f'Expected a list of at most {PRODUCTS_BULK_MAX_LENGTH} '
+                                                        f'products.']})
+        values = {item[field] for item in data if isinstance(item.get(field), (str, int))}
+        if field == 'id':
+            values = {value for value in values if str(value).isdigit()}
+        return Product.objects.in_bulk(list(values), field_name=field)
+
+    @staticmethod
+    def _map_bulk_errors(errors, indexes: list) -> dict:
+        """
+        Returns `errors` of the part of the passed array with the indexes of the items in the whole array
+        """
+        if isinstance(errors, dict) and 'non_field_errors' not in errors:
+            return {indexes[int(index)]: error for index, error in errors.items()}
+        if isinstance(errors, list):  # errors of the fields of each item
+            return {indexes[index]: error for index, error in enumerate(errors) if error}
+        return errors
+
 
 @method_decorator(name='list', decorator=swagger_auto_schema(operation_summary='Get all categories'))
 @method_decorator(name='retrieve', decorator=swagger_auto_schema(operation_summary='Get category with {id}'))
@@ -8,8 +8,18 @@ class GoodsConfig(AppConfig):
 
     def ready(self):
         from . import signals
-        from goods.models import Property, Category
-        # cache invalidate while creating or deleting new property category or deleting product category
-        post_save.connect(receiver=signals.invalidate_properties_cache, sender=Property)
-        post_delete.connect(receiver=signals.invalidate_properties_cache, sender=Category)
-        post_delete.connect(receiver=signals.invalidate_properties_cache, sender=Property)
+        from goods.models import Property
+        # while creating, updating or deleting property or its translation:
+        # update facets index (facets of deleted product category are deleted by cascade),
+        # update search document of the product, since it contains names and values of product properties,
+        # invalidate cached product card and detail pages, change validators of the product and its category
+        property_translation = Property._parler_meta.root_model
+        for receiver in (signals.update_property_facets,
+                         signals.update_property_search_document,
+                         signals.invalidate_property_product_card_cache,
+                         signals.invalidate_property_product_page_cache,
+                         signals.bump_property_catalog_generations):
+            post_save.connect(receiver=receiver, sender=Property)
+            post_delete.connect(receiver=receiver, sender=Property)
+            post_save.connect(receiver=receiver, sender=property_translation)
+            post_delete.connect(receiver=receiver, sender=property_translation)
@@ -0,0 +1,85 @@
+from typing import Iterator, Optional
+
+from django.conf import settings
+from django.db.models import Prefetch, QuerySet
+
+from common.exports import EXPORT_CHUNK_SIZE
+from goods.catalog_import import PRODUCT_COLUMNS, PROPERTY_COLUMNS
+from goods.models import Product, Property
+
+# catalog is exported in the layout of the catalog import, so that export can be imported back
+CATALOG_COLUMNS = PRODUCT_COLUMNS + PROPERTY_COLUMNS
+
+
+def get_catalog_queryset(category_slug: Optional[str] = None) -> QuerySet:
+    """
+    Returns products with their category, manufacturer and translated properties, which are exported
+    """
+    queryset = Product.objects.select_related('category', 'manufacturer').only(
+        'slug', 'name', 'price', 'description', 'available', 'promotional', 'promotional_price',
+        'category__slug', 'manufacturer__slug', 'manufacturer__name',
+    ).prefetch_related(
+        Prefetch('properties', queryset=Property.objects.order_by('pk')),
+        'properties__translations',
+        'properties__category_property__translations',
+    ).order_by('pk')
+    if category_slug:
+        queryset = queryset.filter(category__slug=category_slug)
+    return queryset
+
+
+def _get_translations(instance) -> dict:
+    return {translation.language_code: translation for translation in instance.translations.all()}
+
+
+def iter_catalog_records(queryset: Optional[QuerySet] = None) -> Iterator[dict]:
+    """
+    Yields products of the `queryset` with their properties in the JSONL layout of the catalog import.
+    Products are fetched with server-side cursor by `EXPORT_CHUNK_SIZE` rows, properties and their translations
+    are prefetched for each chunk
+    """
+    queryset = get_catalog_queryset() if queryset is None else queryset
+    for product in queryset.iterator(chunk_size=EXPORT_CHUNK_SIZE):
+        properties = []
+        for prop in product.properties.all():
+            translations = _get_translations(prop)
+            category_translations = _get_translations(prop.category_property)
+            default = translations.get(settings.LANGUAGE_CODE)
+            default_category = category_translations.get(settings.LANGUAGE_CODE)
+            properties.append({
+                'property_category': default_category.name if default_category else None,
+                'property': default.name if default else None,
+                'numeric_value': prop.numeric_value,
+                'translations': {language: {
+                    'property_category_name': getattr(category_translations.get(language), 'name', None),
+                    'property_name': translation.name,
+                    'text_value': translation.text_value,
+                    'units': translation.units,
+                } for language, translation in translations.items()},
+            })
+
+        yield {
+            'slug': product.slug,
+            'name': product.name,
+            'category': product.category.slug,
+            'manufacturer': product.manufacturer.slug if product.manufacturer else None,
+            'manufacturer_name': product.manufacturer.name if product.manufacturer else None,
+            'price': product.price,
+            'description': product.description,
+            'available': product.available,
+            'promotional': product.promotional,
+            'promotional_price': product.promotional_price,
+            'properties': properties,
+        }
+
+
+def flatten_catalog_record(record: dict) -> Iterator[dict]:
+    """
+    Yields CSV rows of the product `record`: one row for each translation of each its property
+    (product columns are repeated), or one row with product columns, if product has no properties
+    """
+    if not record['properties']:
+        yield record
+    for prop in record['properties']:
+        for language, translation in prop['translations'].items():
+            yield {**record, **prop, **translation, 'product': record['slug'], 'language': language}
@@ -0,0 +1,113 @@
+from datetime import datetime, timezone
+from functools import partial
+from time import time
+from typing import Iterable, Optional, Tuple
+from uuid import uuid4
+
+from django.db import transaction
+
+from common.moduls_init import redis
+from goods.models import Product
+
+# Redis hash with generation counters of the whole catalog, of each category and of each product,
+# which are incremented, when products, their properties, comments, rating or views have been changed
+CATALOG_GENERATIONS_KEY = 'catalog_generations'
+CATALOG_MODIFIED_KEY = 'catalog_generations:modified'  # Redis hash with timestamps of the last increments
+# random prefix of the generations with the time, when it has been started, which is renewed,
+# when counters have been lost, so that old ETags never match
+CATALOG_EPOCH_KEY = 'catalog_generations:epoch'
+CATALOG_ALL = 'all'  # field of the generation of the whole catalog
+
+
+def get_category_generation_field(category_id: int) -> str:
+    return f'category:{category_id}'
+
+
+def get_product_generation_field(product_id: int) -> str:
+    return f'product:{product_id}'
+
+
+def bump_catalog_generations(products_ids: Iterable[int] = (), categories_ids: Iterable[int] = ()) -> None:
+    """
+    Increments generations of the whole catalog, of the categories with `categories_ids`
+    and of the products with `products_ids` after transaction has been committed,
+    so that new validators are never sent with the data, which has not been committed yet
+    """
+    fields = [CATALOG_ALL,
+              *(get_category_generation_field(category_id) for category_id in set(categories_ids) - {None}),
+              *(get_product_generation_field(product_id) for product_id in set(products_ids) - {None})]
+    transaction.on_commit(partial(_increment_generations, fields))
+
+
+def bump_products_generations(products_ids: Iterable[int]) -> None:
+    """
+    Increments generations of the products with `products_ids`, which have been updated bypassing signals
+    (e.g. with `QuerySet.update`), and of their categories
+    """
+    products_ids = list(products_ids)
+    if products_ids:
+        categories_ids = Product.objects.filter(pk__in=products_ids).values_list('category_id', flat=True)
+        bump_catalog_generations(products_ids, set(categories_ids))
+
+
+def delete_product_generation(product_id: int) -> None:
+    """
+    Deletes generation of the deleted product with `product_id` after transaction has been committed,
+    so that generations of the deleted products are not kept in Redis
+    """
+    field = get_product_generation_field(product_id)
+    transaction.on_commit(partial(_delete_generations, [field]))
+
+
+def reset_catalog_generations() -> None:
+    """
+    Makes validators of all catalog responses outdated, when products have been changed bypassing
+    `bump_catalog_generations`. Counters are started again with new epoch
+    """
+    redis.delete(CATALOG_EPOCH_KEY, CATALOG_GENERATIONS_KEY, CATALOG_MODIFIED_KEY)
+
+
+def _increment_generations(fields: list) -> None:
+    with redis.pipeline() as pipe:
+        for field in fields:
+            pipe.hincrby(CATALOG_GENERATIONS_KEY, field, 1)
+        pipe.hset(CATALOG_MODIFIED_KEY, mapping=dict.fromkeys(fields, time()))
+        pipe.execute()
+
+
+def _delete_generations(fields: list) -> None:
+    with redis.pipeline() as pipe:
+        pipe.hdel(CATALOG_GENERATIONS_KEY, *fields)
+        pipe.hdel(CATALOG_MODIFIED_KEY, *fields)
+        pipe.execute()
+
+
+def get_catalog_generation(field: str) -> Tuple[str, datetime]:
+    """
+    Returns generation of the catalog `field` -> ('epoch.field.counter', time of the last increment).
+    Generation and its time are obtained from Redis with one request and nothing is written for the `field`,
+    generation, which has not been incremented yet, is 0 and is treated as changed, when the epoch has been started
+    """
+    with redis.pipeline(transaction=False) as pipe:
+        pipe.get(CATALOG_EPOCH_KEY)
+        pipe.hget(CATALOG_GENERATIONS_KEY, field)
+        pipe.hget(CATALOG_MODIFIED_KEY, field)
+        epoch, counter, modified = pipe.execute()
+
+    if epoch is None:
+        # epoch is stored with the time, when it has been started -> 'prefix:timestamp'
+        redis.set(CATALOG_EPOCH_KEY, f'{uuid4().hex}:{time()}', nx=True)
+        epoch = redis.get(CATALOG_EPOCH_KEY)
+
+    epoch, _, started = (epoch.decode('utf-8') if isinstance(epoch, bytes) else epoch).partition(':')
+    modified = float(started or 0) if modified is None else float(modified)
+    return f'{epoch}.{field}.{int(counter or 0)}', datetime.fromtimestamp(modified, tz=timezone.utc)
+
+
+def get_catalog_validators(field: str, language_code: Optional[str] = None) -> Tuple[str, datetime]:
+    """
+    Returns ETag and Last-Modified of the responses with the data of the catalog `field`
+    in the language with `language_code`
+    """
+    generation, modified = get_catalog_generation(field)
+    return (f'{generation}.{language_code}' if language_code else generation), modified
@@ -0,0 +1,295 @@
+import csv
+import json
+from io import StringIO
+from typing import Iterable, Iterator, List, Optional, TextIO, Tuple
+
+from django.conf import settings
+from django.db import connection
+
+# columns of the feed, products are identified by `slug`, categories and manufacturers by their slugs,
+# property categories and properties by their names in the default language (`property_category`, `property`),
+# `property_category_name` and `property_name` are their names in the language of the row
+PRODUCT_COLUMNS = ('slug', 'name', 'category', 'manufacturer', 'manufacturer_name', 'price', 'description',
+                   'available', 'promotional', 'promotional_price')
+PROPERTY_COLUMNS = ('product', 'property_category', 'property', 'language', 'property_category_name',
+                    'property_name', 'text_value', 'units', 'numeric_value')
+COPY_CHUNK_SIZE = 10000  # number of rows, which are sent to Postgres with one COPY
+
+STAGING_TABLES_SQL = '''
+CREATE TEMP TABLE import_product_row (
+    line bigint, slug varchar(100), name varchar(100), category varchar(50), manufacturer varchar(50),
+    manufacturer_name varchar(50), price numeric(10, 2), description text, available boolean,
+    promotional boolean, promotional_price numeric(10, 2)
+) ON COMMIT DROP;
+CREATE TEMP TABLE import_property_row (
+    line bigint, product varchar(100), property_category varchar(100), property varchar(50),
+    language varchar(15), property_category_name varchar(100), property_name varchar(50),
+    text_value varchar(255), units varchar(10), numeric_value numeric(6, 2)
+) ON COMMIT DROP;
+'''
+
+# product, which is repeated in several rows of the feed, takes the last passed value of each column
+PRODUCTS_SQL = 'CREATE TEMP TABLE import_product ON COMMIT DROP AS SELECT slug, {columns} ' \
+               'FROM import_product_row WHERE slug IS NOT NULL GROUP BY slug'.format(columns=', '.join(
+                   f'(array_agg({column} ORDER BY line DESC) FILTER (WHERE {column} IS NOT NULL))[1] AS {column}'
+                   for column in PRODUCT_COLUMNS[1:]))
+
+MERGE_SQL = (
+    # manufacturers
+    ('updated_manufacturers', '''
+UPDATE goods_manufacturer m SET name = s.manufacturer_name
+FROM (SELECT DISTINCT manufacturer, manufacturer_name FROM import_product
+      WHERE manufacturer IS NOT NULL AND manufacturer_name IS NOT NULL) s
+WHERE m.slug = s.manufacturer AND m.name <> s.manufacturer_name
+'''),
+    ('created_manufacturers', '''
+INSERT INTO goods_manufacturer (name, slug, description)
+SELECT DISTINCT ON (manufacturer) COALESCE(manufacturer_name, manufacturer), manufacturer, ''
+FROM import_product s
+WHERE manufacturer IS NOT NULL AND NOT EXISTS (SELECT 1 FROM goods_manufacturer m WHERE m.slug = s.manufacturer)
+ORDER BY manufacturer
+'''),
+    # products
+    ('updated_products', '''
+UPDATE goods_product p SET
+    name = COALESCE(s.name, p.name),
+    category_id = COALESCE(c.id, p.category_id),
+    manufacturer_id = COALESCE(m.id, p.manufacturer_id),
+    price = COALESCE(s.price, p.price),
+    description = COALESCE(s.description, p.description),
+    available = COALESCE(s.available, p.available),
+    promotional = COALESCE(s.promotional, p.promotional),
+    promotional_price = COALESCE(s.promotional_price, p.promotional_price),
+    updated = now()
+FROM import_product s
+LEFT JOIN goods_category c ON c.slug = s.category
+LEFT JOIN goods_manufacturer m ON m.slug = s.manufacturer
+WHERE p.slug = s.slug
+'''),
+    ('created_products', '''
+INSERT INTO goods_product (star, name, slug, manufacturer_id, price, description, image, available, promotional,
+                           promotional_price, created, updated, category_id, rating, views)
+SELECT 1, s.name, s.slug, m.id, s.price, COALESCE(s.description, ''), '', COALESCE(s.available, true),
+       COALESCE(s.promotional, false), COALESCE(s.promotional_price, 0), now(), now(), c.id, 0, 0
+FROM import_product s
+JOIN goods_category c ON c.slug = s.category
+LEFT JOIN goods_manufacturer m ON m.slug = s.manufacturer
+WHERE s.name IS NOT NULL AND s.price IS NOT NULL
+  AND NOT EXISTS (SELECT 1 FROM goods_product p WHERE p.slug = s.slug)
+'''),
+    # property categories
+    ('', '''
+CREATE TEMP TABLE import_property_category ON COMMIT DROP AS
+SELECT s.property_category AS key, min(t.master_id) AS id, false AS created
+FROM (SELECT DISTINCT property_category FROM import_property_row WHERE property_category IS NOT NULL) s
+LEFT JOIN goods_propertycategory_translation t ON t.name = s.property_category AND t.language_code = %(default)s
+GROUP BY s.property_category
+'''),
+    ('created_property_categories', '''
+UPDATE import_property_category SET id = nextval(pg_get_serial_sequence('goods_propertycategory', 'id')),
+                                    created = true
+WHERE id IS NULL
+'''),
+    ('', 'INSERT INTO goods_propertycategory (id) SELECT id FROM import_property_category WHERE created'),
+    ('', '''
+INSERT INTO goods_propertycategory_translation (language_code, name, master_id)
+SELECT %(default)s, key, id FROM import_property_category WHERE created
+'''),
+    ('', '''
+INSERT INTO goods_propertycategory_translation (language_code, name, master_id)
+SELECT DISTINCT ON (k.id, s.language) s.language, s.property_category_name, k.id
+FROM import_property_row s JOIN import_property_category k ON k.key = s.property_category
+WHERE s.property_category_name IS NOT NULL AND s.language = ANY(%(languages)s)
+ORDER BY k.id, s.language, s.line DESC
+ON CONFLICT (language_code, master_id) DO UPDATE SET name = EXCLUDED.name
+'''),
+    ('', '''
+INSERT INTO goods_propertycategory_product_categories (propertycategory_id, category_id)
+SELECT DISTINCT k.id, p.category_id
+FROM import_property_row s
+JOIN import_property_category k ON k.key = s.property_category
+JOIN goods_product p ON p.slug = s.product
+ON CONFLICT (propertycategory_id, category_id) DO NOTHING
+'''),
+    # properties
+    ('', '''
+CREATE TEMP TABLE import_property ON COMMIT DROP AS
+SELECT p.id AS product_id, k.id AS category_property_id, s.property AS key,
+       (array_agg(s.numeric_value ORDER BY s.line DESC) FILTER (WHERE s.numeric_value IS NOT NULL))[1]
+           AS numeric_value,
+       NULL::bigint AS id, false AS created
+FROM import_property_row s
+JOIN goods_product p ON p.slug = s.product
+JOIN import_property_category k ON k.key = s.property_category
+WHERE s.property IS NOT NULL
+GROUP BY p.id, k.id, s.property
+'''),
+    ('', '''
+UPDATE import_property k SET id = e.id
+FROM (SELECT pr.product_id, pr.category_property_id, t.name, min(pr.id) AS id
+      FROM goods_property pr
+      JOIN goods_property_translation t ON t.master_id = pr.id AND t.language_code = %(default)s
+      WHERE pr.product_id IN (SELECT product_id FROM import_property)
+      GROUP BY pr.product_id, pr.category_property_id, t.name) e
+WHERE e.product_id = k.product_id AND e.category_property_id = k.category_property_id AND e.name = k.key
+'''),
+    ('created_properties', '''
+UPDATE import_property SET id = nextval(pg_get_serial_sequence('goods_property', 'id')), created = true
+WHERE id IS NULL
+'''),
+    ('', '''
+INSERT INTO goods_property (id, numeric_value, category_property_id, product_id)
+SELECT id, COALESCE(numeric_value, 0), category_property_id, product_id FROM import_property WHERE created
+'''),
+    ('updated_properties', '''
+UPDATE goods_property pr SET numeric_value = k.numeric_value
+FROM import_property k
+WHERE pr.id = k.id AND NOT k.created AND k.numeric_value IS NOT NULL
+'''),
+    ('', '''
+INSERT INTO goods_property_translation (language_code, name, text_value, units, detail_description, master_id)
+SELECT %(default)s, key, '', '', '', id FROM import_property WHERE created
+'''),
+    ('property_translations', '''
+INSERT INTO goods_property_translation (language_code, name, text_value, units, detail_description, master_id)
+SELECT DISTINCT ON (k.id, s.language) s.language, COALESCE(s.property_name, s.property),
+       COALESCE(s.text_value, ''), COALESCE(s.units, ''), '', k.id
+FROM import_property_row s
+JOIN goods_product p ON p.slug = s.product
+JOIN import_property_category c ON c.key = s.property_category
+JOIN import_property k ON k.product_id = p.id AND k.category_property_id = c.id AND k.key = s.property
+WHERE s.language = ANY(%(languages)s)
+ORDER BY k.id, s.language, s.line DESC
+ON CONFLICT (language_code, master_id) DO UPDATE
+SET name = EXCLUDED.name, text_value = EXCLUDED.text_value, units = EXCLUDED.units
+'''),
+)
+
+
+def read_csv(file: TextIO) -> Iterator[Tuple[Optional[dict], List[dict]]]:
+    """
+    Yields product and its properties from each row of CSV `file` with header, which contains
+    `PRODUCT_COLUMNS` and `PROPERTY_COLUMNS` (`product` column is the same as `slug`).
+    Product is repeated in the row of each its property, empty cells are not changed in DB
+    """
+    for row in csv.DictReader(file):
+        product = row if row.get('slug') else None
+        properties = [{**row, 'product': row.get('product') or row.get('slug')}] if row.get('property') else []
+        yield product, properties
+
+
+def read_jsonl(file: TextIO) -> Iterator[Tuple[Optional[dict], List[dict]]]:
+    """
+    Yields product and its properties from each line of JSONL `file`, line is the object with `PRODUCT_COLUMNS`
+    and `properties` list -> [{'property_category': ..., 'property': ..., 'numeric_value': ...,
+    'translations': {language: {'property_category_name': ..., 'property_name': ..., 'text_value': ...,
+    'units': ...}}}]
+    """
+    for line in file:
+        if not line.strip():
+            continue
+        product = json.loads(line)
+        properties = []
+        for prop in product.get('properties') or []:
+            translations = prop.get('translations') or {settings.LANGUAGE_CODE: {}}
+            properties.extend({**prop, **translation, 'product': product.get('slug'), 'language': language}
+                              for language, translation in translations.items())
+        yield product, properties
+
+
+def _format_value(value) -> Optional[str]:
+    if isinstance(value, bool):
+        return 'true' if value else 'false'
+    return None if value is None or value == '' else str(value)
+
+
+class CopyWriter:
+    """
+    Sends rows to the staging `table` with COPY by chunks, so that feed of any size is streamed to Postgres
+    """
+
+    def __init__(self, cursor, table: str, columns: Iterable[str]):
+        self.cursor = cursor
+        self.sql = f'COPY {table} (line, {", ".join(columns)}) FROM STDIN WITH (FORMAT csv)'
+        self.columns = tuple(columns)
+        self.buffer = StringIO()
+        self.writer = csv.writer(self.buffer)
+        self.pending = 0
+        self.count = 0
+
+    def write(self, line: int, row: dict) -> None:
+        self.writer.writerow([line, *(_format_value(row.get(column)) for column in self.columns)])
+        self.pending += 1
+        if self.pending >= COPY_CHUNK_SIZE:
+            self.flush()
+
+    def flush(self) -> None:
+        if self.pending:
+            self.buffer.seek(0)
+            self.cursor.copy_expert(self.sql, self.buffer)
+            self.count += self.pending
+            self.buffer.seek(0)
+            self.buffer.truncate()
+            self.pending = 0
+
+
+def stage_catalog(rows: Iterable[Tuple[Optional[dict], List[dict]]]) -> Tuple[int, int]:
+    """
+    Creates staging tables, which are dropped at the end of the transaction, streams products
+    and properties `rows` into them with COPY and merges repeated products.
+    Returns numbers of staged products and properties rows
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(STAGING_TABLES_SQL)
+        products = CopyWriter(cursor, 'import_product_row', PRODUCT_COLUMNS)
+        properties = CopyWriter(cursor, 'import_property_row', PROPERTY_COLUMNS)
+        for line, (product, product_properties) in enumerate(rows, start=1):
+            if product:
+                products.write(line, product)
+            for prop in product_properties:
+                properties.write(line, prop)
+        products.flush()
+        properties.flush()
+        cursor.execute(PRODUCTS_SQL)
+    return products.count, properties.count
+
+
+def merge_catalog() -> dict:
+    """
+    Merges staged rows into manufacturers, products, property categories and properties with their
+    translations with set-based queries. Returns numbers of changed rows -> {name: count}
+    """
+    params = {'default': settings.LANGUAGE_CODE, 'languages': [code for code, _name in settings.LANGUAGES]}
+    stats = {}
+    with connection.cursor() as cursor:
+        cursor.execute('''SELECT count(*) FROM import_product s WHERE NOT EXISTS (
+                              SELECT 1 FROM goods_product p WHERE p.slug = s.slug
+                          ) AND (s.name IS NULL OR s.price IS NULL OR NOT EXISTS (
+                              SELECT 1 FROM goods_category c WHERE c.slug = s.category
+                          ))''')
+        stats['skipped_products'] = cursor.fetchone()[0]
+        for name, sql in MERGE_SQL:
+            cursor.execute(sql, params)
+            if name:
+                stats[name] = cursor.rowcount
+    return stats
+
+
+def get_staged_products_states() -> dict:
+    """
+    Returns categories and availability of the existing products, which are staged for import ->
+    {product_id: (category_id, available)}
+    """
+    with connection.cursor() as cursor:
+        cursor.execute('SELECT p.id, p.category_id, p.available FROM goods_product p '
+                       'JOIN import_product s ON s.slug = p.slug')
+        return {product_id: (category_id, available) for product_id, category_id, available in cursor.fetchall()}
+
+
+def drop_staging_tables() -> None:
+    """
+    Drops staging tables, e.g. when import is run in the savepoint of outer transaction
+    """
+    with connection.cursor() as cursor:
+        cursor.execute('DROP TABLE IF EXISTS import_product_row, import_property_row, import_product, '
+                       'import_property_category, import_property')
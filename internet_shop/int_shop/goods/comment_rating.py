@@ -0,0 +1,74 @@
+from functools import partial
+from typing import Iterable, Tuple
+
+from django.db import transaction
+from django.db.models import Count, F, IntegerField, OuterRef, Subquery, Value, QuerySet
+from django.db.models.functions import Coalesce
+
+from goods.models import Comment
+from goods.product_pages import invalidate_product_page
+
+CommentLike = Comment.profiles_likes.through
+CommentUnlike = Comment.profiles_unlikes.through
+
+
+def _count_subquery(through) -> Coalesce:
+    return Coalesce(Subquery(through.objects.filter(comment_id=OuterRef('pk')).order_by().values(
+        'comment_id').annotate(count=Count('pk')).values('count'), output_field=IntegerField()), 0)
+
+
+def recount_comments_rating(comments_ids: Iterable[int]) -> None:
+    """
+    Recomputes stored numbers of likes and dislikes of the comments with `comments_ids`
+    from their likes and dislikes rows, e.g. after they have been changed in admin
+    """
+    comments = Comment.objects.filter(pk__in=list(comments_ids))
+    comments.update(likes_count=_count_subquery(CommentLike), unlikes_count=_count_subquery(CommentUnlike))
+    invalidate_product_page(*comments.values_list('product_id', flat=True).distinct())
+
+
+def toggle_comment_rating(comment_id: int, profile_id: int, action: str) -> Tuple[int, int]:
+    """
+    Sets like (`action` is "like") or dislike (`action` is "unlike") of the profile with `profile_id`
+    to the comment with `comment_id`, or cancels it, if it has been already set.
+    Opposite rating of the profile is cancelled. Stored numbers of likes and dislikes are changed
+    with atomic updates in the same transaction. Returns new numbers of likes and dislikes of the comment
+    """
+    through, opposite_through = (CommentLike, CommentUnlike) if action == 'like' else (CommentUnlike, CommentLike)
+    with transaction.atomic():
+        # lock the comment, so that concurrent toggles of the same comment are applied one by one
+        comment = Comment.objects.select_for_update().only('pk', 'product_id').get(pk=comment_id)
+        deleted, _ = through.objects.filter(comment_id=comment.pk, profile_id=profile_id).delete()
+        if deleted:
+            delta, opposite_delta = -1, 0
+        else:
+            through.objects.create(comment_id=comment.pk, profile_id=profile_id)
+            opposite_deleted, _ = opposite_through.objects.filter(comment_id=comment.pk, profile_id=profile_id).delete()
+            delta, opposite_delta = 1, -opposite_deleted
+
+        likes_delta, unlikes_delta = (delta, opposite_delta) if action == 'like' else (opposite_delta, delta)
+        comments = Comment.objects.filter(pk=comment.pk)
+        comments.update(likes_count=F('likes_count') + likes_delta, unlikes_count=F('unlikes_count') + unlikes_delta)
+        transaction.on_commit(partial(invalidate_product_page, comment.product_id))
+        return comments.values_list('likes_count', 'unlikes_count').get()
+
+
+def get_profile_rated_comments(profile_id: int, comments: QuerySet) -> dict:
+    """
+    Returns ids of `comments`, under which the profile with `profile_id` had set like or dislike,
+    which are obtained with one query
+    """
+    comments_ids = comments.order_by().values('pk')
+    rated = CommentLike.objects.filter(profile_id=profile_id, comment_id__in=comments_ids).annotate(
+        liked=Value(True),
+    ).values_list('comment_id', 'liked').union(
+        CommentUnlike.objects.filter(profile_id=profile_id, comment_id__in=comments_ids).annotate(
+            liked=Value(False),
+        ).values_list('comment_id', 'liked'),
+        all=True,
+    )
+
+    result = {'liked_comments': [], 'unliked_comments': []}
+    for comment_id, liked in rated:
+        result['liked_comments' if liked else 'unliked_comments'].append(comment_id)
+    return result
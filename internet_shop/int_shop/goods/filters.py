@@ -1,23 +1,90 @@
+from decimal import Decimal
+from typing import Iterable
+
 from django.core.cache import cache
-from django.db.models import Max, Min
+from django.db import connection
 
-from goods.models import Product
+from goods.models import Product, EFFECTIVE_PRICE
 
+PRICE_HISTOGRAM_BUCKETS = 10  # number of equal-width price ranges of the histogram
 
-def get_max_min_price(category_slug: str) -> tuple:
+
+def get_price_stats_key(category_slug: str) -> str:
     """
-    Returns maximum and minimum products price for category with category_slug
+    Returns cache key of the price statistics of the category with `category_slug`
+    """
+    return f'price_stats_{category_slug}'
+
+
+def compute_price_stats(category_slug: str) -> dict:
+    """
+    Returns minimum, maximum and histogram of effective price (promotional price for promotional products)
+    of available products of the category with `category_slug`, which are computed by one query.
+    Histogram is the list of price ranges with quantity of products, that cost within each range,
+    and height of the range bar in percents of the highest one
+    """
+    prices = Product.available_objects.filter(category__slug=category_slug).annotate(
+        effective_price=EFFECTIVE_PRICE,
+    ).values('effective_price').order_by()
+    prices_sql, params = prices.query.sql_with_params()
+
+    # the most expensive products are placed into the last bucket instead of the overflow one
+    sql = f'''
+        WITH prices AS ({prices_sql}),
+             bounds AS (SELECT MIN(effective_price) AS min_price, MAX(effective_price) AS max_price FROM prices)
+        SELECT bounds.min_price, bounds.max_price,
+               CASE WHEN bounds.min_price = bounds.max_price THEN 1
+                    ELSE LEAST(WIDTH_BUCKET(prices.effective_price, bounds.min_price, bounds.max_price, %s), %s)
+               END AS bucket,
+               COUNT(*)
+        FROM prices CROSS JOIN bounds
+        GROUP BY bounds.min_price, bounds.max_price, bucket
+    '''
+    with connection.cursor() as cursor:
+        cursor.execute(sql, (*params, PRICE_HISTOGRAM_BUCKETS, PRICE_HISTOGRAM_BUCKETS))
+        rows = cursor.fetchall()
+
+    if not rows:
+        return {'min_price': None, 'max_price': None, 'histogram': []}
+
+    min_price, max_price = rows[0][0], rows[0][1]
+    counts = {bucket: count for _min, _max, bucket, count in rows}
+    buckets_number = PRICE_HISTOGRAM_BUCKETS if min_price != max_price else 1
+    width = (max_price - min_price) / buckets_number
+    max_count = max(counts.values())
+    histogram = [{
+        'price_from': (min_price + width * i).quantize(Decimal('0.01')),
+        'price_to': (min_price + width * (i + 1)).quantize(Decimal('0.01')),
+        'count': counts.get(i + 1, 0),
+        'height': round(counts.get(i + 1, 0) * 100 / max_count),
+    } for i in range(buckets_number)]
+
+    return {'min_price': min_price, 'max_price': max_price, 'histogram': histogram}
+
+
+def refresh_price_stats(categories_slugs: Iterable[str]) -> None:
+    """
+    Recomputes price statistics of the categories with `categories_slugs` and puts them to the cache,
+    so that visitors are served with the previous statistics meanwhile
+    """
+    cache.set_many({get_price_stats_key(slug): compute_price_stats(slug) for slug in categories_slugs}, None)
+
+
+def get_price_stats(category_slug: str) -> dict:
+    """
+    Returns price statistics of the category with `category_slug` from the cache.
+    Statistics are computed synchronously only once, if they haven't been cached yet
     """
+    price_stats = cache.get(get_price_stats_key(category_slug))
+    if price_stats is None:
+        price_stats = compute_price_stats(category_slug)
+        cache.set(get_price_stats_key(category_slug), price_stats, None)
+    return price_stats
 
-    # get prices from cache if they are existing
-    max_price = cache.get(f'max_price_{category_slug}')
-    min_price = cache.get(f'min_price_{category_slug}')
 
-    # caching prices by categories, if they are no in the cache yet
-    if max_price and min_price:
-        return max_price['max_price'], min_price['min_price']
-    else:
-        max_price = Product.available_objects.filter(category__slug=category_slug).aggregate(max_price=Max('price'))
-        min_price = Product.available_objects.filter(category__slug=category_slug).aggregate(min_price=Min('price'))
-        cache.set_many({f'max_price_{category_slug}': max_price, f'min_price_{category_slug}': min_price}, None)
-        return max_price['max_price'], min_price['min_price']
+def get_max_min_price(category_slug: str) -> tuple:
+    """
+    Returns maximum and minimum products price for category with category_slug
+    """
+    price_stats = get_price_stats(category_slug)
+    return price_stats['max_price'], price_stats['min_price']
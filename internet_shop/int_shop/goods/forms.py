@@ -53,11 +53,16 @@ class CommentProductForm(forms.ModelForm, forms.Form):
 
 class FilterByPriceForm(forms.Form):
     """
-    Form for products filter by price
+    Form for products filter by price.
+    Form also carries histogram of products prices to display their distribution
     """
     price_min = forms.CharField(widget=forms.TextInput(attrs={'class': 'min-price'}))
     price_max = forms.CharField(widget=forms.TextInput(attrs={'class': 'max-price'}))
 
+    def __init__(self, *args, histogram: list = None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.histogram = histogram or []
+
 
 class FilterByManufacturerForm(forms.Form):
     """
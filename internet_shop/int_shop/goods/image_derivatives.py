@@ -0,0 +1,114 @@
+import hashlib
+import os
+from functools import partial
+from io import BytesIO
+from typing import Dict, Iterable
+
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.db.models.fields.files import FieldFile
+from PIL import Image, ImageOps
+
+from common.media_cleanup import queue_media_cleanup
+from goods.models import ImageDerivative
+
+# maximal sizes (width, height) of the image copies, images are not enlarged and keep their proportions
+IMAGE_PRESETS = {
+    ImageDerivative.Preset.THUMBNAIL: (100, 100),
+    ImageDerivative.Preset.CARD: (200, 200),
+    ImageDerivative.Preset.DETAIL: (400, 400),
+}
+IMAGE_QUALITY = 80
+IMAGE_DERIVATIVES_TIMEOUT = 60 * 60 * 24  # seconds
+
+
+def get_image_derivatives_key(source: str) -> str:
+    """
+    Returns cache key of the copies of the image with storage name `source`
+    """
+    return f'image_derivatives:{hashlib.md5(source.encode()).hexdigest()}'
+
+
+def render_image_derivatives(source: str) -> int:
+    """
+    Renders copies of the image with storage name `source` for all presets in WebP and JPEG formats,
+    saves them to the storage and replaces previous copies of the image in the lookup table.
+    Returns number of rendered copies
+    """
+    with default_storage.open(source) as file:
+        original = Image.open(file)
+        original.load()
+    original = ImageOps.exif_transpose(original)
+    if original.mode != 'RGB':  # transparent background is replaced with white one, since JPEG has no alpha
+        background = Image.new('RGB', original.size, 'white')
+        background.paste(original, mask=original.convert('RGBA').getchannel('A'))
+        original = background
+
+    base_name = os.path.splitext(source)[0]
+    derivatives = []
+    for preset, size in IMAGE_PRESETS.items():
+        resized = original.copy()
+        resized.thumbnail(size, Image.LANCZOS)
+        for image_format in ImageDerivative.Format:
+            buffer = BytesIO()
+            resized.save(buffer, image_format.label.upper(), quality=IMAGE_QUALITY, optimize=True)
+            derivative = ImageDerivative(source=source, preset=preset, format=image_format)
+            derivative.image.save(f'{base_name}_{preset}.{image_format}', ContentFile(buffer.getvalue()), save=False)
+            derivative.width, derivative.height = resized.size
+            derivatives.append(derivative)
+
+    with transaction.atomic():
+        previous = list(ImageDerivative.objects.filter(source=source).values_list('image', flat=True))
+        ImageDerivative.objects.filter(source=source).delete()
+        ImageDerivative.objects.bulk_create(derivatives)
+        queue_media_cleanup(names=previous)
+        transaction.on_commit(partial(cache.delete, get_image_derivatives_key(source)))
+    return len(derivatives)
+
+
+def delete_image_derivatives(source: str) -> None:
+    """
+    Deletes copies of the image with storage name `source`, e.g. when the image has been deleted
+    """
+    names = list(ImageDerivative.objects.filter(source=source).values_list('image', flat=True))
+    ImageDerivative.objects.filter(source=source).delete()
+    queue_media_cleanup(names=names)
+    transaction.on_commit(partial(cache.delete, get_image_derivatives_key(source)))
+
+
+def get_image_derivatives(sources: Iterable[str]) -> Dict[str, Dict[str, Dict[str, dict]]]:
+    """
+    Returns copies of the images with storage names `sources` ->
+    {source: {preset: {format: {'url': ..., 'width': ..., 'height': ...}}}}.
+    Copies are obtained from cache with one request, missing ones are obtained from DB with one query.
+    Image without copies has empty dict
+    """
+    keys = {get_image_derivatives_key(source): source for source in set(sources) if source}
+    cached = cache.get_many(keys.keys())
+
+    missing = {source: {} for key, source in keys.items() if key not in cached}
+    if missing:
+        for derivative in ImageDerivative.objects.filter(source__in=missing.keys()):
+            missing[derivative.source].setdefault(derivative.preset, {})[derivative.format] = {
+                'url': derivative.image.url,
+                'width': derivative.width,
+                'height': derivative.height,
+            }
+        cache.set_many({get_image_derivatives_key(source): value for source, value in missing.items()},
+                       IMAGE_DERIVATIVES_TIMEOUT)
+
+    result = {source: cached[key] for key, source in keys.items() if key in cached}
+    result.update(missing)
+    return result
+
+
+def schedule_image_derivatives(image: FieldFile) -> None:
+    """
+    Renders copies of the `image` in background after transaction has been committed,
+    if the image has been uploaded and has no copies yet
+    """
+    if image and not ImageDerivative.objects.filter(source=image.name).exists():
+        from goods.tasks import generate_image_derivatives  # tasks module imports this one
+        transaction.on_commit(partial(generate_image_derivatives.delay, image.name))
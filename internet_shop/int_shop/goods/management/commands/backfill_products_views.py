@@ -0,0 +1,37 @@
+from django.core.management.base import BaseCommand
+
+from common.moduls_init import redis
+from goods.catalog_generations import reset_catalog_generations
+from goods.models import Product
+from goods.utils import PRODUCTS_VIEWS_BUFFER_KEY
+
+
+class Command(BaseCommand):
+    """
+    Set `views` column of all products from the hashes with products views counters.
+    Command is meant to be run once after adding the column, since it overwrites
+    views in DB and drops views, which have been buffered for flushing.
+    """
+    help = 'Copy products views from Redis hashes to DB'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000, help='Number of products per batch')
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        products_ids = list(Product.objects.order_by('pk').values_list('pk', flat=True))
+
+        updated = 0
+        for i in range(0, len(products_ids), batch_size):
+            batch = products_ids[i:i + batch_size]
+            with redis.pipeline(transaction=False) as pipe:
+                for pk in batch:
+                    pipe.hget(f'product_id:{pk}', 'views')
+                views = pipe.execute()
+
+            products = [Product(pk=pk, views=int(product_views or 0)) for pk, product_views in zip(batch, views)]
+            updated += Product.objects.bulk_update(products, ['views'])
+
+        redis.delete(PRODUCTS_VIEWS_BUFFER_KEY)  # buffered views are already included in the hashes
+        reset_catalog_generations()  # views of all products have been changed
+        self.stdout.write(self.style.SUCCESS(f'Views have been copied for {updated} products'))
@@ -0,0 +1,42 @@
+from django.core.files.images import get_image_dimensions
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand
+
+from goods.models import Product, ProductPhoto, get_file_hash
+from goods.product_pages import invalidate_product_page
+from goods.product_photos import invalidate_product_photos
+
+
+class Command(BaseCommand):
+    """
+    Add detail photos, which have been put to the products directories of the media storage directly,
+    to the photos manifest. Command is meant to be run once after adding the manifest
+    or after copying photos without admin site, photos which are already in the manifest are skipped.
+    """
+    help = 'Add detail photos of the products from the media storage to the photos manifest'
+
+    def handle(self, *args, **options):
+        known_names = set(ProductPhoto.objects.values_list('image', flat=True))
+        photos = []
+        for product in Product.objects.only('pk', 'name').iterator():
+            directory = f'products/product_{product.name}/Detail_photos'
+            try:
+                _dirs, files = default_storage.listdir(directory)
+            except FileNotFoundError:
+                continue
+
+            for position, file_name in enumerate(sorted(files)):
+                name = f'{directory}/{file_name}'
+                if name in known_names:
+                    continue
+                with default_storage.open(name) as file:
+                    width, height = get_image_dimensions(file)
+                    content_hash = get_file_hash(file)
+                photos.append(ProductPhoto(product=product, image=name, width=width or 0, height=height or 0,
+                                           content_hash=content_hash, position=position))
+
+        ProductPhoto.objects.bulk_create(photos)  # without signals
+        for product_id in {photo.product_id for photo in photos}:
+            invalidate_product_photos(product_id)
+            invalidate_product_page(product_id)
+        self.stdout.write(self.style.SUCCESS(f'{len(photos)} photos have been added to the manifest'))
@@ -0,0 +1,20 @@
+from common.exports import ExportCommand
+from goods.catalog_export import CATALOG_COLUMNS, flatten_catalog_record, get_catalog_queryset, iter_catalog_records
+
+
+class Command(ExportCommand):
+    """
+    Export products with their translated properties in the layout of the `import_catalog` command.
+    Products are read with server-side cursor by chunks, so memory doesn't depend on the size of the catalog
+    """
+    help = 'Export catalog of the products with their properties to CSV or JSONL file'
+    columns = CATALOG_COLUMNS
+    name = 'products'
+    flatten = staticmethod(flatten_catalog_record)
+
+    def add_arguments(self, parser):
+        super().add_arguments(parser)
+        parser.add_argument('--category', help='Slug of the category, by default products of all categories')
+
+    def get_records(self, options: dict):
+        return iter_catalog_records(get_catalog_queryset(options['category']))
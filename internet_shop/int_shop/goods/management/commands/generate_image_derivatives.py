@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand
+
+from account.models import Profile
+from goods.models import ImageDerivative, Product, ProductPhoto
+from goods.tasks import generate_image_derivatives
+
+
+class Command(BaseCommand):
+    """
+    Render resized copies of the product images, product photos and profile photos,
+    which have been uploaded before adding of copies. Images, which already have copies, are skipped
+    """
+    help = 'Render resized copies of the images, which have no copies'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sync', action='store_true', help='Render copies in this process instead of Celery')
+
+    def handle(self, *args, **options):
+        sources = set(Product.objects.exclude(image='').values_list('image', flat=True))
+        sources.update(ProductPhoto.objects.values_list('image', flat=True))
+        sources.update(Profile.objects.exclude(photo='').values_list('photo', flat=True))
+        sources -= set(ImageDerivative.objects.values_list('source', flat=True).distinct())
+
+        for source in sorted(sources):
+            if options['sync']:
+                generate_image_derivatives(source)
+            else:
+                generate_image_derivatives.delay(source)
+
+        action = 'rendered' if options['sync'] else 'queued for rendering'
+        self.stdout.write(self.style.SUCCESS(f'Copies of {len(sources)} images have been {action}'))
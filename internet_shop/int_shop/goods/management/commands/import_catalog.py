@@ -0,0 +1,66 @@
+import json
+import os
+from time import perf_counter
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DatabaseError, transaction
+from django.db.models.expressions import RawSQL
+
+from goods.catalog_import import (
+    drop_staging_tables,
+    get_staged_products_states,
+    merge_catalog,
+    read_csv,
+    read_jsonl,
+    stage_catalog,
+)
+from goods.models import Product
+from goods.product_bulk import run_products_side_effects
+
+
+class Command(BaseCommand):
+    """
+    Import products, manufacturers, property categories and translated properties from CSV or JSONL feed.
+    Feed is streamed to staging tables with COPY and merged with set-based queries in one transaction,
+    caches, search documents, facets and price statistics are refreshed once after the import
+    """
+    help = 'Import catalog of the products with their properties from CSV or JSONL file'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Path to the CSV or JSONL file')
+        parser.add_argument('--format', choices=('csv', 'jsonl'), help='Format of the file, by default by extension')
+
+    def handle(self, *args, **options):
+        path = options['path']
+        file_format = options['format'] or ('jsonl' if os.path.splitext(path)[1] in ('.jsonl', '.json') else 'csv')
+        reader = read_jsonl if file_format == 'jsonl' else read_csv
+
+        start = perf_counter()
+        try:
+            with open(path, 'r', encoding='utf-8', newline='') as file, transaction.atomic():
+                products_rows, properties_rows = stage_catalog(reader(file))
+                staged = perf_counter()
+                old_states = get_staged_products_states()
+                stats = merge_catalog()
+                merged = perf_counter()
+
+                products = list(Product.objects.filter(
+                    slug__in=RawSQL('SELECT slug FROM import_product', []),
+                ).only('pk', 'name', 'category_id', 'available'))
+                drop_staging_tables()
+                for product in products:
+                    product.loaded_state = old_states.get(product.pk, (None, None))
+                run_products_side_effects([product for product in products if product.pk not in old_states],
+                                          [product for product in products if product.pk in old_states],
+                                          renamed=True, properties_changed=bool(properties_rows))
+        except (OSError, ValueError, DatabaseError) as e:  # file, JSON or values of the feed are invalid
+            raise CommandError(f'Catalog has not been imported: {e}')
+        finished = perf_counter()
+
+        rows = products_rows + properties_rows
+        self.stdout.write(f'{rows} rows have been staged in {staged - start:.2f}s '
+                          f'({rows / max(staged - start, 1e-6):.0f} rows/s), '
+                          f'merged in {merged - staged:.2f}s, caches have been refreshed in {finished - merged:.2f}s')
+        self.stdout.write(json.dumps(stats))
+        self.stdout.write(self.style.SUCCESS(f'{len(products)} products have been imported '
+                                             f'in {finished - start:.2f}s ({rows / (finished - start):.0f} rows/s)'))
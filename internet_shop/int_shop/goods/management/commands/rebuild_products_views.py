@@ -0,0 +1,73 @@
+from django.core.management.base import BaseCommand
+
+from common.moduls_init import redis
+from goods.models import Product
+from goods.utils import PRODUCTS_VIEWS_KEY, get_category_views_key
+
+
+class Command(BaseCommand):
+    """
+    Rebuild Redis sorted sets with views of all products and products of each category
+    from the hashes with products views counters.
+    """
+    help = 'Rebuild sorted sets with products views from the products views hashes'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000, help='Number of products per Redis pipeline')
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        products = Product.available_objects.order_by('pk').values_list('pk', 'category_id')
+
+        # all products and products of each category with their views -> {key: {product_id: views}}
+        sorted_sets = {PRODUCTS_VIEWS_KEY: {}}
+        batch = []
+        for product in products.iterator(chunk_size=batch_size):
+            batch.append(product)
+            if len(batch) == batch_size:
+                self._collect_views(batch, sorted_sets)
+                batch.clear()
+        self._collect_views(batch, sorted_sets)
+
+        # sorted sets of categories, which have no available products anymore
+        stale_keys = [key for key in redis.scan_iter(match=get_category_views_key('*'))
+                      if (key.decode('utf-8') if isinstance(key, bytes) else key) not in sorted_sets]
+
+        # fill temporary keys and then rename them, so that readers never see half-filled sorted sets
+        with redis.pipeline() as pipe:
+            for key, views in sorted_sets.items():
+                pipe.delete(f'{key}:rebuild')
+                items = list(views.items())
+                for i in range(0, len(items), batch_size):
+                    pipe.zadd(f'{key}:rebuild', dict(items[i:i + batch_size]))
+                if views:
+                    pipe.rename(f'{key}:rebuild', key)
+                else:
+                    pipe.delete(key)
+            if stale_keys:
+                pipe.delete(*stale_keys)
+            pipe.execute()
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Sorted sets have been rebuilt for {len(sorted_sets[PRODUCTS_VIEWS_KEY])} products '
+            f'of {len(sorted_sets) - 1} categories'
+        ))
+
+    @staticmethod
+    def _collect_views(batch: list, sorted_sets: dict) -> None:
+        """
+        Obtain views of the products from `batch` using one Redis round trip
+        and add them to the corresponding sorted sets in `sorted_sets`
+        """
+        if not batch:
+            return
+
+        with redis.pipeline(transaction=False) as pipe:
+            for pk, _category_id in batch:
+                pipe.hget(f'product_id:{pk}', 'views')
+            views = pipe.execute()
+
+        for (pk, category_id), product_views in zip(batch, views):
+            product_views = int(product_views or 0)
+            sorted_sets[PRODUCTS_VIEWS_KEY][pk] = product_views
+            sorted_sets.setdefault(get_category_views_key(category_id), {})[pk] = product_views
@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand
+
+from goods.models import Category
+from goods.property_filters import get_not_indexed_categories, rebuild_categories_facets
+
+
+class Command(BaseCommand):
+    """
+    Rebuild properties facets of the categories, e.g. after they have been changed bypassing signals.
+    Categories, which haven't been indexed yet, are also indexed on the first read
+    """
+    help = 'Rebuild properties facets of all categories or of the passed ones'
+
+    def add_arguments(self, parser):
+        parser.add_argument('categories', nargs='*', type=int, help='Ids of the categories, by default all categories')
+        parser.add_argument('--missing', action='store_true',
+                            help='Rebuild facets only of the categories, which haven\'t been indexed yet')
+
+    def handle(self, *args, **options):
+        categories_ids = options['categories'] or list(Category.objects.order_by('pk').values_list('pk', flat=True))
+        if options['missing']:
+            categories_ids = get_not_indexed_categories(categories_ids)
+
+        rebuild_categories_facets(categories_ids)
+        self.stdout.write(self.style.SUCCESS(f'Facets of {len(categories_ids)} categories have been rebuilt'))
@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+
+from goods.models import Product
+from goods.search import rebuild_search_documents
+
+
+class Command(BaseCommand):
+    """
+    Rebuild full-text search documents of all products in all site languages.
+    """
+    help = 'Rebuild full-text search documents of the products'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500, help='Number of products per batch')
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        products_ids = list(Product.objects.order_by('pk').values_list('pk', flat=True))
+
+        for i in range(0, len(products_ids), batch_size):
+            rebuild_search_documents(products_ids[i:i + batch_size])
+
+        self.stdout.write(self.style.SUCCESS(f'Search documents have been rebuilt for {len(products_ids)} products'))
@@ -0,0 +1,40 @@
+# Generated by Django 4.1.9 on 2026-10-18 19:07
+
+import django.contrib.postgres.fields
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('goods', '0050_remove_untranslated_fields_category_prop'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PropertyFacet',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('language_code', models.CharField(max_length=15, verbose_name='Language')),
+                ('category_property_name', models.CharField(max_length=100, verbose_name='Category property name')),
+                ('name', models.CharField(max_length=50, verbose_name='Property name')),
+                ('text_value', models.CharField(blank=True, max_length=255, verbose_name='Text value')),
+                ('numeric_value', models.DecimalField(decimal_places=2, max_digits=6, verbose_name='Numeric value')),
+                ('units', models.CharField(blank=True, max_length=10, verbose_name='Units')),
+                ('item_count', models.PositiveIntegerField(default=0, verbose_name='Products quantity')),
+                ('product_ids', django.contrib.postgres.fields.ArrayField(base_field=models.BigIntegerField(), default=list, size=None, verbose_name='Products ids')),
+                ('category', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='property_facets', to='goods.category', verbose_name='Category')),
+                ('category_property', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='facets', to='goods.propertycategory', verbose_name='Category property')),
+            ],
+            options={
+                'verbose_name': 'Property facet',
+                'verbose_name_plural': 'Property facets',
+                'ordering': ('category_property_name', 'name', 'text_value', 'numeric_value'),
+            },
+        ),
+        migrations.AddIndex(
+            model_name='propertyfacet',
+            index=models.Index(fields=['category', 'language_code'], name='goods_facet_category_lang_idx'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.1.9 on 2026-10-18 19:11
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('goods', '0051_property_facet'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='views',
+            field=models.PositiveIntegerField(db_index=True, default=0, verbose_name='Views'),
+        ),
+    ]
@@ -0,0 +1,47 @@
+# Generated by Django 4.1.9 on 2026-10-18 19:13
+
+from django.contrib.postgres.operations import TrigramExtension
+import django.contrib.postgres.indexes
+import django.contrib.postgres.search
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('goods', '0052_product_views'),
+    ]
+
+    operations = [
+        TrigramExtension(),
+        migrations.CreateModel(
+            name='ProductSearchDocument',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('language_code', models.CharField(max_length=15, verbose_name='Language')),
+                ('search_vector', django.contrib.postgres.search.SearchVectorField(verbose_name='Search vector')),
+            ],
+            options={
+                'verbose_name': 'Product search document',
+                'verbose_name_plural': 'Product search documents',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['name'], name='goods_product_name_trgm_idx', opclasses=('gin_trgm_ops',)),
+        ),
+        migrations.AddField(
+            model_name='productsearchdocument',
+            name='product',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='search_documents', to='goods.product', verbose_name='Product'),
+        ),
+        migrations.AddIndex(
+            model_name='productsearchdocument',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['search_vector'], name='goods_search_vector_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='productsearchdocument',
+            constraint=models.UniqueConstraint(fields=('product', 'language_code'), name='goods_search_product_lang_unique'),
+        ),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 4.1.9 on 2026-10-18 19:16
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('goods', '0053_product_search'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(condition=models.Q(('available', True)), fields=['name', 'id'], name='goods_product_name_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(condition=models.Q(('available', True)), fields=['-created', '-id'], name='goods_product_created_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(models.Case(models.When(promotional=True, then=models.F('promotional_price')), default=models.F('price')), models.F('id'), condition=models.Q(('available', True)), name='goods_product_price_id_idx'),
+        ),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 4.1.9 on 2026-10-18 19:28
+
+from django.db import migrations, models
+from django.db.models import Count, IntegerField, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def count_comments_rating(apps, schema_editor):
+    Comment = apps.get_model('goods', 'Comment')
+
+    def count_subquery(through):
+        return Coalesce(Subquery(through.objects.filter(comment_id=OuterRef('pk')).order_by().values(
+            'comment_id').annotate(count=Count('pk')).values('count'), output_field=IntegerField()), 0)
+
+    Comment.objects.update(likes_count=count_subquery(Comment.profiles_likes.through),
+                           unlikes_count=count_subquery(Comment.profiles_unlikes.through))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('goods', '0054_product_keyset_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='comment',
+            name='likes_count',
+            field=models.PositiveIntegerField(default=0, verbose_name='Likes'),
+        ),
+        migrations.AddField(
+            model_name='comment',
+            name='unlikes_count',
+            field=models.PositiveIntegerField(default=0, verbose_name='Dislikes'),
+        ),
+        migrations.RunPython(count_comments_rating, migrations.RunPython.noop),
+    ]
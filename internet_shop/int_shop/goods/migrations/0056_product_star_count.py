@@ -0,0 +1,46 @@
+# Generated by Django 4.1.9 on 2026-10-18 19:29
+
+from decimal import Decimal, ROUND_HALF_UP
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def seed_star_counts(apps, schema_editor):
+    """
+    Previous rating has no votes, so it is kept as one vote with the nearest star
+    """
+    Product = apps.get_model('goods', 'Product')
+    ProductStarCount = apps.get_model('goods', 'ProductStarCount')
+    ProductStarCount.objects.bulk_create(
+        ProductStarCount(product_id=pk, star=int(rating.quantize(Decimal('1'), rounding=ROUND_HALF_UP)), count=1)
+        for pk, rating in Product.objects.filter(rating__gte=1).values_list('pk', 'rating').iterator()
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('goods', '0055_comment_rating_counters'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProductStarCount',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('star', models.PositiveSmallIntegerField(choices=[(1, '1'), (2, '2'), (3, '3'), (4, '4'), (5, '5')], verbose_name='Star')),
+                ('count', models.PositiveIntegerField(default=0, verbose_name='Number of votes')),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='star_counts', to='goods.product', verbose_name='Product')),
+            ],
+            options={
+                'verbose_name': 'Product star count',
+                'verbose_name_plural': 'Product star counts',
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='productstarcount',
+            constraint=models.UniqueConstraint(fields=('product', 'star'), name='goods_star_count_product_star_unique'),
+        ),
+        migrations.RunPython(seed_star_counts, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 4.1.9 on 2026-10-18 19:36
+
+from django.db import migrations, models
+import django.db.models.deletion
+import goods.models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('goods', '0056_product_star_count'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProductPhoto',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('image', models.ImageField(height_field='height', max_length=255, upload_to=goods.models.get_product_photo_path, verbose_name='Image', width_field='width')),
+                ('width', models.PositiveIntegerField(default=0, editable=False, verbose_name='Width')),
+                ('height', models.PositiveIntegerField(default=0, editable=False, verbose_name='Height')),
+                ('content_hash', models.CharField(editable=False, max_length=64, verbose_name='Content hash')),
+                ('position', models.PositiveSmallIntegerField(default=0, verbose_name='Position')),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='photos', to='goods.product', verbose_name='Product')),
+            ],
+            options={
+                'verbose_name': 'Product photo',
+                'verbose_name_plural': 'Product photos',
+                'ordering': ['position', 'pk'],
+            },
+        ),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 4.1.9 on 2026-10-18 19:37
+
+from django.db import migrations, models
+import goods.models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('goods', '0057_product_photo'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ImageDerivative',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('source', models.CharField(db_index=True, max_length=500, verbose_name='Original image')),
+                ('preset', models.CharField(choices=[('thumbnail', 'Thumbnail'), ('card', 'Card'), ('detail', 'Detail')], max_length=10, verbose_name='Preset')),
+                ('format', models.CharField(choices=[('webp', 'WebP'), ('jpeg', 'JPEG')], max_length=4, verbose_name='Format')),
+                ('image', models.ImageField(height_field='height', max_length=500, upload_to=goods.models.get_image_derivative_path, verbose_name='Image', width_field='width')),
+                ('width', models.PositiveIntegerField(default=0, verbose_name='Width')),
+                ('height', models.PositiveIntegerField(default=0, verbose_name='Height')),
+            ],
+            options={
+                'verbose_name': 'Image derivative',
+                'verbose_name_plural': 'Image derivatives',
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='imagederivative',
+            constraint=models.UniqueConstraint(fields=('source', 'preset', 'format'), name='goods_image_derivative_source_preset_format_unique'),
+        ),
+    ]
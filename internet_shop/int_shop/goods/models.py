@@ -1,7 +1,11 @@
+import hashlib
 import os
 from decimal import Decimal
 
 from django.conf import settings
+from django.contrib.postgres.fields import ArrayField
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVectorField
 from django.core.validators import MaxValueValidator, MinValueValidator
 from django.db import models
 from django.db.models.query import QuerySet
@@ -29,6 +33,30 @@ def get_product_image_path(instance, filename):
     return f'products/product_{instance.name}/{filename}'
 
 
+def get_file_hash(file) -> str:
+    """
+    Returns SHA-256 hash of the `file` content, which is read by chunks
+    """
+    sha = hashlib.sha256()
+    file.seek(0)
+    for chunk in file.chunks():
+        sha.update(chunk)
+    file.seek(0)
+    return sha.hexdigest()
+
+
+def get_product_photo_path(instance, filename):
+    """
+    Returns the save path for detail photos of each product
+    """
+    return f'products/product_{instance.product.name}/Detail_photos/{filename}'
+
+
+# product price considering promotional price, the same expression is used by index for ordering by price
+EFFECTIVE_PRICE = models.Case(models.When(promotional=True, then=models.F('promotional_price')),
+                              default=models.F('price'))
+
+
 class Product(models.Model):
     """
     Product model
@@ -70,6 +98,7 @@ class Product(models.Model):
                                  decimal_places=1,
                                  validators=[MinValueValidator(Decimal(0.0)), MaxValueValidator(Decimal(5.0))],
                                  verbose_name=_('Rating'))
+    views = models.PositiveIntegerField(default=0, db_index=True, verbose_name=_('Views'))
 
     available_objects = AvailableProductsManager()
     objects = models.Manager()
@@ -77,11 +106,16 @@ class Product(models.Model):
     def __str__(self):
         return self.name
 
-    def get_all_product_photos(self) -> list:
+    @classmethod
+    def from_db(cls, db, field_names, values):
         """
-        Returns names of all product images in list format
+        Overriding the method to remember category and availability of the loaded product,
+        in order to know whether they were changed while saving the product
         """
-        return os.listdir(os.path.join(settings.MEDIA_ROOT, f'products/product_{self.name}', 'Detail_photos'))
+        instance = super().from_db(db, field_names, values)
+        loaded_values = dict(zip(field_names, values))
+        instance.loaded_state = (loaded_values.get('category_id'), loaded_values.get('available'))
+        return instance
 
     def save(self, *args, **kwargs):
         """
@@ -89,6 +123,7 @@ class Product(models.Model):
         and creating directories for storage product's picture
         """
         super().save(*args, **kwargs)
+        self.loaded_state = (self.category_id, self.available)  # signals handlers have already received old state
         try:
             os.makedirs(os.path.join(settings.MEDIA_ROOT, f'products/product_{self.name}', 'Detail_photos'))
         except FileExistsError:
@@ -105,6 +140,17 @@ class Product(models.Model):
         verbose_name = _('Product')
         verbose_name_plural = _('Products')
         ordering = ('name',)
+        indexes = [
+            GinIndex(fields=('name',), name='goods_product_name_trgm_idx', opclasses=('gin_trgm_ops',)),
+            # composite keys of listings with keyset pagination
+            models.Index(fields=('name', 'id'), name='goods_product_name_id_idx', condition=models.Q(available=True)),
+            models.Index(fields=('-created', '-id'),
+                         name='goods_product_created_id_idx',
+                         condition=models.Q(available=True)),
+            models.Index(EFFECTIVE_PRICE, models.F('id'),
+                         name='goods_product_price_id_idx',
+                         condition=models.Q(available=True)),
+        ]
 
 
 class Favorite(models.Model):
@@ -190,6 +236,9 @@ class Comment(models.Model):
                                               blank=True,
                                               default=0,
                                               verbose_name=_('Profile\'s dislikes'))
+    # denormalized numbers of likes and dislikes, which are kept in sync with `profiles_likes` and `profiles_unlikes`
+    likes_count = models.PositiveIntegerField(default=0, verbose_name=_('Likes'))
+    unlikes_count = models.PositiveIntegerField(default=0, verbose_name=_('Dislikes'))
     created = models.DateTimeField(auto_now_add=True, verbose_name=_('Created date'))
     updated = models.DateTimeField(auto_now=True, verbose_name=_('Updated date'))
 
@@ -299,3 +348,169 @@ class Property(TranslatableModel):
 
     def __str__(self):
         return f'{self.category_property}: {self.name}'
+
+
+class PropertyFacet(models.Model):
+    """
+    Precomputed facet of the products properties for filters sidebar.
+    Contains number of available products of the category, that have
+    the property with the same name and value in the certain language
+    """
+    category = models.ForeignKey(Category,
+                                 on_delete=models.CASCADE,
+                                 related_name='property_facets',
+                                 verbose_name=_('Category'))
+    language_code = models.CharField(max_length=15, verbose_name=_('Language'))
+    category_property = models.ForeignKey(PropertyCategory,
+                                          on_delete=models.CASCADE,
+                                          related_name='facets',
+                                          verbose_name=_('Category property'))
+    category_property_name = models.CharField(max_length=100, verbose_name=_('Category property name'))
+    name = models.CharField(max_length=50, verbose_name=_('Property name'))
+    text_value = models.CharField(max_length=255, blank=True, verbose_name=_('Text value'))
+    numeric_value = models.DecimalField(max_digits=6, decimal_places=2, verbose_name=_('Numeric value'))
+    units = models.CharField(max_length=10, blank=True, verbose_name=_('Units'))
+    item_count = models.PositiveIntegerField(default=0, verbose_name=_('Products quantity'))
+    product_ids = ArrayField(models.BigIntegerField(), default=list, verbose_name=_('Products ids'))
+
+    def __str__(self):
+        return f'{self.category_property_name}: {self.name} ({self.item_count})'
+
+    class Meta:
+        verbose_name = _('Property facet')
+        verbose_name_plural = _('Property facets')
+        ordering = ('category_property_name', 'name', 'text_value', 'numeric_value')
+        indexes = [
+            models.Index(fields=('category', 'language_code'), name='goods_facet_category_lang_idx'),
+        ]
+
+
+class ProductSearchDocument(models.Model):
+    """
+    Full-text search document of the product in the certain language.
+    Contains weighted lexemes of product name, manufacturer name,
+    translated properties and description
+    """
+    product = models.ForeignKey(Product,
+                                on_delete=models.CASCADE,
+                                related_name='search_documents',
+                                verbose_name=_('Product'))
+    language_code = models.CharField(max_length=15, verbose_name=_('Language'))
+    search_vector = SearchVectorField(verbose_name=_('Search vector'))
+
+    def __str__(self):
+        return f'{self.product_id} ({self.language_code})'
+
+    class Meta:
+        verbose_name = _('Product search document')
+        verbose_name_plural = _('Product search documents')
+        constraints = [
+            models.UniqueConstraint(fields=('product', 'language_code'), name='goods_search_product_lang_unique'),
+        ]
+        indexes = [
+            GinIndex(fields=('search_vector',), name='goods_search_vector_idx'),
+        ]
+
+
+class ProductStarCount(models.Model):
+    """
+    Number of votes with the certain star for the product.
+    Product rating is the mean of the stars weighted by these numbers
+    """
+    product = models.ForeignKey(Product,
+                                on_delete=models.CASCADE,
+                                related_name='star_counts',
+                                verbose_name=_('Product'))
+    star = models.PositiveSmallIntegerField(choices=Product.Rating.choices, verbose_name=_('Star'))
+    count = models.PositiveIntegerField(default=0, verbose_name=_('Number of votes'))
+
+    def __str__(self):
+        return f'{self.product_id}: {self.star} ({self.count})'
+
+    class Meta:
+        verbose_name = _('Product star count')
+        verbose_name_plural = _('Product star counts')
+        constraints = [
+            models.UniqueConstraint(fields=('product', 'star'), name='goods_star_count_product_star_unique'),
+        ]
+
+
+class ProductPhoto(models.Model):
+    """
+    Detail photo of the product. Photos are the manifest of the files in the media storage
+    with their dimensions and content hashes, so that files are not listed on the storage
+    """
+    product = models.ForeignKey(Product,
+                                on_delete=models.CASCADE,
+                                related_name='photos',
+                                verbose_name=_('Product'))
+    image = models.ImageField(upload_to=get_product_photo_path,
+                              width_field='width',
+                              height_field='height',
+                              max_length=255,
+                              verbose_name=_('Image'))
+    width = models.PositiveIntegerField(default=0, editable=False, verbose_name=_('Width'))
+    height = models.PositiveIntegerField(default=0, editable=False, verbose_name=_('Height'))
+    content_hash = models.CharField(max_length=64, editable=False, verbose_name=_('Content hash'))
+    position = models.PositiveSmallIntegerField(default=0, verbose_name=_('Position'))
+
+    def __str__(self):
+        return self.image.name
+
+    def save(self, *args, **kwargs):
+        """
+        Overriding the method to compute SHA-256 hash of the new uploaded file
+        """
+        if self.image and not self.image._committed:
+            self.content_hash = get_file_hash(self.image)
+        super().save(*args, **kwargs)
+
+    class Meta:
+        ordering = ['position', 'pk']
+        verbose_name = _('Product photo')
+        verbose_name_plural = _('Product photos')
+
+
+def get_image_derivative_path(instance, filename):
+    """
+    Returns the save path for resized copies of the images
+    """
+    return f'derivatives/{filename}'
+
+
+class ImageDerivative(models.Model):
+    """
+    Resized and re-encoded copy of the uploaded image (product image, product photo or profile photo),
+    which is found by storage name of the original image
+    """
+
+    class Preset(models.TextChoices):
+        THUMBNAIL = ('thumbnail', _('Thumbnail'))
+        CARD = ('card', _('Card'))
+        DETAIL = ('detail', _('Detail'))
+
+    class Format(models.TextChoices):
+        WEBP = ('webp', 'WebP')
+        JPEG = ('jpeg', 'JPEG')
+
+    source = models.CharField(max_length=500, db_index=True, verbose_name=_('Original image'))
+    preset = models.CharField(max_length=10, choices=Preset.choices, verbose_name=_('Preset'))
+    format = models.CharField(max_length=4, choices=Format.choices, verbose_name=_('Format'))
+    image = models.ImageField(upload_to=get_image_derivative_path,
+                              width_field='width',
+                              height_field='height',
+                              max_length=500,
+                              verbose_name=_('Image'))
+    width = models.PositiveIntegerField(default=0, verbose_name=_('Width'))
+    height = models.PositiveIntegerField(default=0, verbose_name=_('Height'))
+
+    def __str__(self):
+        return f'{self.source} ({self.preset}, {self.format})'
+
+    class Meta:
+        verbose_name = _('Image derivative')
+        verbose_name_plural = _('Image derivatives')
+        constraints = [
+            models.UniqueConstraint(fields=('source', 'preset', 'format'),
+                                    name='goods_image_derivative_source_preset_format_unique'),
+        ]
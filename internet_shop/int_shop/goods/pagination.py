@@ -0,0 +1,228 @@
+import json
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from binascii import Error as BinasciiError
+from collections.abc import Sequence
+from datetime import datetime
+from typing import Any, List, Tuple, Union
+
+from django.core.exceptions import FieldDoesNotExist, ValidationError
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Q, QuerySet
+from django.utils.functional import cached_property
+
+CURSOR_PARAM = 'cursor'  # query parameter, which switches listing to keyset pagination
+
+
+class InvalidCursor(ValueError):
+    """
+    Cursor can not be decoded or does not match ordering of the listing
+    """
+
+
+class CursorJSONEncoder(DjangoJSONEncoder):
+    """
+    Encoder keeps microseconds of datetime values, so that rows can be compared with them exactly
+    """
+
+    def default(self, o):
+        if isinstance(o, datetime):
+            return o.isoformat()
+        return super().default(o)
+
+
+def encode_cursor(payload: dict) -> str:
+    return urlsafe_b64encode(json.dumps(payload, cls=CursorJSONEncoder).encode()).decode()
+
+
+def decode_cursor(cursor: str) -> dict:
+    try:
+        payload = json.loads(urlsafe_b64decode(cursor.encode()))
+    except (BinasciiError, UnicodeError, ValueError):
+        raise InvalidCursor(f'Invalid cursor "{cursor}"')
+    if not isinstance(payload, dict):
+        raise InvalidCursor(f'Invalid cursor "{cursor}"')
+    return payload
+
+
+def estimate_count(queryset: QuerySet) -> int:
+    """
+    Returns number of rows in `queryset`, which is estimated by Postgres planner without scanning rows
+    """
+    plan = json.loads(queryset.order_by().explain(format='json'))
+    return plan[0]['Plan']['Plan Rows']
+
+
+class KeysetPage(Sequence):
+    """
+    Page of the keyset paginator.
+    Page has no number, neighbour pages are addressed by cursors
+    """
+    is_keyset = True
+    number = 1  # keeps templates, which build URLs with the page number, working
+
+    def __init__(self, object_list: list, paginator, next_cursor: str = None, previous_cursor: str = None):
+        self.object_list = object_list
+        self.paginator = paginator
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    def __repr__(self):
+        return f'<Keyset page with {len(self.object_list)} objects>'
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __getitem__(self, index):
+        return self.object_list[index]
+
+    def has_next(self) -> bool:
+        return self.next_cursor is not None
+
+    def has_previous(self) -> bool:
+        return self.previous_cursor is not None
+
+    def has_other_pages(self) -> bool:
+        return self.has_next() or self.has_previous()
+
+
+class KeysetPaginator:
+    """
+    Paginator, which fetches page of the `queryset` by filtering rows after (or before)
+    the last (or the first) row of the neighbour page instead of OFFSET, and does not count rows.
+    Rows are ordered by `ordering` of the queryset, completed with primary key, so that the key is unique.
+    Sequences, which are not querysets (e.g. products ranked in Redis), are paginated by position in the cursor,
+    since they are able to slice cheaply.
+    """
+
+    def __init__(self, object_list: Union[QuerySet, Sequence], per_page: int):
+        self.object_list = object_list
+        self.per_page = int(per_page)
+        self.ordering = self._get_ordering() if isinstance(object_list, QuerySet) else ()
+
+    @cached_property
+    def count(self) -> int:
+        """
+        Estimated number of all objects
+        """
+        if isinstance(self.object_list, QuerySet):
+            return estimate_count(self.object_list)
+        return len(self.object_list)
+
+    def page(self, cursor: str = None) -> KeysetPage:
+        """
+        Returns page, that goes after (or before) the position, which is encoded in `cursor`.
+        Returns the first page, if `cursor` is empty
+        """
+        payload = decode_cursor(cursor) if cursor else {}
+        if not isinstance(self.object_list, QuerySet):
+            return self._get_sequence_page(payload)
+
+        reverse = payload.get('r', False)  # whether page goes before the cursor position
+        position = self._to_python(payload['p']) if 'p' in payload else None
+
+        ordering = self.ordering
+        if reverse:
+            ordering = tuple(key[1:] if key.startswith('-') else f'-{key}' for key in ordering)
+
+        queryset = self.object_list.order_by(*ordering)
+        if position is not None:
+            queryset = queryset.filter(self._get_lookups(ordering, position))
+
+        objects = list(queryset[:self.per_page + 1])
+        has_more = len(objects) > self.per_page
+        objects = objects[:self.per_page]
+        if reverse:
+            objects.reverse()
+
+        has_next, has_previous = (True, has_more) if reverse else (has_more, position is not None)
+        return KeysetPage(
+            objects,
+            self,
+            next_cursor=encode_cursor({'p': self._get_position(objects[-1])}) if has_next and objects else None,
+            previous_cursor=(encode_cursor({'p': self._get_position(objects[0]), 'r': True})
+                             if has_previous and objects else None),
+        )
+
+    def _get_sequence_page(self, payload: dict) -> KeysetPage:
+        offset = payload.get('o', 0)
+        if not isinstance(offset, int) or offset < 0:
+            raise InvalidCursor('Invalid cursor offset')
+
+        objects = list(self.object_list[offset:offset + self.per_page + 1])
+        has_next = len(objects) > self.per_page
+        previous_offset = max(offset - self.per_page, 0)
+        return KeysetPage(
+            objects[:self.per_page],
+            self,
+            next_cursor=encode_cursor({'o': offset + self.per_page}) if has_next else None,
+            previous_cursor=encode_cursor({'o': previous_offset}) if offset > 0 else None,
+        )
+
+    def _get_ordering(self) -> Tuple[str, ...]:
+        query = self.object_list.query
+        ordering = list(query.order_by or (query.get_meta().ordering if query.default_ordering else ()))
+        for key in ordering:
+            if not isinstance(key, str) or '__' in key or key.lstrip('-') == '?':
+                raise ValueError(f'Keyset pagination does not support ordering by {key!r}')
+
+        pk_name = query.get_meta().pk.name
+        if not {key.lstrip('-') for key in ordering} & {'pk', pk_name}:
+            # primary key as the last key makes composite key unique
+            ordering.append('-pk' if ordering and ordering[-1].startswith('-') else 'pk')
+        return tuple(ordering)
+
+    def _get_field(self, name: str):
+        meta = self.object_list.query.get_meta()
+        if name == 'pk':
+            return meta.pk
+        try:
+            return meta.get_field(name)
+        except FieldDoesNotExist:
+            return self.object_list.query.annotations[name].output_field
+
+    def _get_position(self, obj) -> List[Any]:
+        return [getattr(obj, key.lstrip('-')) for key in self.ordering]
+
+    def _to_python(self, position: list) -> list:
+        if not isinstance(position, list) or len(position) != len(self.ordering):
+            raise InvalidCursor('Cursor does not match ordering of the listing')
+        try:
+            return [None if value is None else self._get_field(key.lstrip('-')).to_python(value)
+                    for key, value in zip(self.ordering, position)]
+        except (KeyError, ValidationError):
+            raise InvalidCursor('Cursor does not match ordering of the listing')
+
+    @staticmethod
+    def _get_lookups(ordering: Tuple[str, ...], position: list) -> Q:
+        """
+        Returns condition, that selects rows after `position` in `ordering`:
+        (a > x) OR (a = x AND b > y) OR ..., the first key is also bounded separately,
+        so that the index on the ordering keys can be used
+        """
+        lookups = Q()
+        equal = Q()
+        for key, value in zip(ordering, position):
+            name, operator = (key[1:], 'lt') if key.startswith('-') else (key, 'gt')
+            lookups |= equal & Q(**{f'{name}__{operator}': value})
+            equal &= Q(**{name: value})
+
+        first_name, first_operator = (ordering[0][1:], 'lte') if ordering[0].startswith('-') else (ordering[0], 'gte')
+        return Q(**{f'{first_name}__{first_operator}': position[0]}) & lookups
+
+
+class KeysetPaginationMixin:
+    """
+    Switches list view to keyset pagination, when request contains `cursor` parameter.
+    Wrong cursor leads to the first page
+    """
+
+    def paginate_queryset(self, queryset, page_size):
+        if CURSOR_PARAM not in self.request.GET:
+            return super().paginate_queryset(queryset, page_size)
+
+        paginator = KeysetPaginator(queryset, page_size)
+        try:
+            page = paginator.page(self.request.GET.get(CURSOR_PARAM))
+        except InvalidCursor:
+            page = paginator.page()
+        return paginator, page, page.object_list, page.has_other_pages()
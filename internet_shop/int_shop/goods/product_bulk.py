@@ -0,0 +1,93 @@
+import os
+from functools import partial
+from typing import Iterable, List
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from common.moduls_init import redis
+from common.transactions import on_commit_batched
+from goods.catalog_generations import bump_catalog_generations
+from goods.models import Product
+from goods.product_cards import invalidate_product_card
+from goods.product_pages import invalidate_product_page
+from goods.property_filters import rebuild_categories_facets
+from goods.search import rebuild_search_documents
+from goods.tasks import refresh_categories_price_stats
+from goods.utils import PRODUCTS_VIEWS_KEY, get_category_views_key, invalidate_manufacturer_facets
+
+PRODUCTS_BULK_MAX_LENGTH = 1000  # maximal number of products in one bulk request
+PRODUCTS_BULK_BATCH_SIZE = 500  # number of rows in one bulk query
+
+
+def save_products(created: List[Product], updated: List[Product], update_fields: Iterable[str]) -> None:
+    """
+    Creates `created` products and updates `update_fields` of the `updated` products with bulk queries
+    in one transaction. Side effects of the products saving, which are run by `Product.save` and signals
+    for each product, are run once for all products
+    """
+    update_fields = set(update_fields)
+    with transaction.atomic():
+        if created:
+            Product.objects.bulk_create(created, batch_size=PRODUCTS_BULK_BATCH_SIZE)
+        if updated and update_fields:
+            now = timezone.now()  # `auto_now` field is not set by bulk update
+            for product in updated:
+                product.updated = now
+            Product.objects.bulk_update(updated, [*update_fields, 'updated'], batch_size=PRODUCTS_BULK_BATCH_SIZE)
+        run_products_side_effects(created, updated, renamed='name' in update_fields)
+
+
+def run_products_side_effects(created: List[Product], updated: List[Product],
+                              renamed: bool = False, properties_changed: bool = False) -> None:
+    """
+    Creates media directories and keeps Redis sets in sync for `created` and `updated` products,
+    invalidates their caches and validators and rebuilds their search documents, facets and price statistics
+    after transaction has been committed. Each side effect is run once for all products.
+    Facets of all categories of the products are rebuilt, if their properties have been changed
+    """
+    products = created + updated
+    if not products:
+        return
+    products_ids = [product.pk for product in products]
+
+    for product in created + (updated if renamed else []):
+        os.makedirs(os.path.join(settings.MEDIA_ROOT, f'products/product_{product.name}', 'Detail_photos'),
+                    exist_ok=True)
+
+    categories_ids, changed_categories_ids, changed = set(), set(), []
+    for product in products:
+        old_category_id, old_available = getattr(product, 'loaded_state', (None, None))
+        categories_ids.update({old_category_id, product.category_id} - {None})
+        if old_category_id != product.category_id or old_available != product.available:
+            if old_category_id is not None:  # new product has no properties yet, its facets are not changed
+                changed_categories_ids.update({old_category_id, product.category_id})
+            changed.append((product, old_category_id))
+        product.loaded_state = (product.category_id, product.available)
+
+    # products, whose availability or category has been changed, are moved in sorted sets with views
+    with redis.pipeline() as pipe:
+        for product, _old_category_id in changed:
+            pipe.hget(f'product_id:{product.pk}', 'views')
+        views = [int(value or 0) for value in pipe.execute()]
+    with redis.pipeline() as pipe:
+        pipe.sadd('products_ids', *products_ids)
+        for (product, old_category_id), product_views in zip(changed, views):
+            if old_category_id and old_category_id != product.category_id:
+                pipe.zrem(get_category_views_key(old_category_id), product.pk)
+            if product.available:
+                pipe.zadd(PRODUCTS_VIEWS_KEY, {product.pk: product_views})
+                pipe.zadd(get_category_views_key(product.category_id), {product.pk: product_views})
+            else:
+                pipe.zrem(PRODUCTS_VIEWS_KEY, product.pk)
+                pipe.zrem(get_category_views_key(product.category_id), product.pk)
+        pipe.execute()
+
+    invalidate_product_card(*products_ids)
+    invalidate_product_page(*products_ids)
+    invalidate_manufacturer_facets(*categories_ids)
+    bump_catalog_generations(products_ids, categories_ids)
+    transaction.on_commit(partial(refresh_categories_price_stats.delay, list(categories_ids)))
+    on_commit_batched(rebuild_search_documents, products_ids)
+    on_commit_batched(rebuild_categories_facets, categories_ids if properties_changed else changed_categories_ids)
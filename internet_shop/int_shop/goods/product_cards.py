@@ -0,0 +1,56 @@
+from typing import Dict, Iterable
+
+from django.conf import settings
+from django.core.cache import cache
+from django.template.loader import render_to_string
+from django.utils.safestring import mark_safe
+
+from .image_derivatives import get_image_derivatives
+from .models import Product
+
+PRODUCT_CARD_TIMEOUT = 60 * 60 * 24  # seconds
+# places in the cached card markup, which are filled with markup of the certain user on each request
+FAVORITE_PLACEHOLDER = '<!--product-card-favorite-->'
+CSRF_PLACEHOLDER = '<!--product-card-csrf-->'
+
+
+def get_product_card_key(product_id: int, language_code: str) -> str:
+    """
+    Returns cache key of the product card markup in the language with `language_code`
+    """
+    return f'product_card:{language_code}:{product_id}'
+
+
+def get_product_cards(products: Iterable[Product], language_code: str) -> Dict[int, str]:
+    """
+    Returns markup of the cards of `products` in the language with `language_code` -> {product_id: markup}.
+    Cards are obtained from cache with one request, missing cards are rendered and cached.
+    Markup contains placeholders instead of the user-specific parts
+    """
+    products = {get_product_card_key(product.pk, language_code): product for product in products}
+    cards = cache.get_many(products.keys())
+
+    missing_products = {key: product for key, product in products.items() if key not in cards}
+    # copies of the images of all missing cards are obtained at once
+    image_derivatives = get_image_derivatives(product.image.name for product in missing_products.values())
+    missing_cards = {
+        key: render_to_string('goods/product/card.html', {
+            'product': product,
+            'image_derivatives': image_derivatives,
+            'favorite_overlay': mark_safe(FAVORITE_PLACEHOLDER),
+            'csrf_overlay': mark_safe(CSRF_PLACEHOLDER),
+        }) for key, product in missing_products.items()
+    }
+    if missing_cards:
+        cache.set_many(missing_cards, PRODUCT_CARD_TIMEOUT)
+        cards.update(missing_cards)
+
+    return {product.pk: cards[key] for key, product in products.items()}
+
+
+def invalidate_product_card(*products_ids: int) -> None:
+    """
+    Delete cached card markup of the products with `products_ids` in all site languages
+    """
+    cache.delete_many([get_product_card_key(product_id, language_code)
+                       for product_id in products_ids for language_code, _ in settings.LANGUAGES])
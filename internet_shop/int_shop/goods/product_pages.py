@@ -0,0 +1,87 @@
+from typing import Optional, Tuple
+from uuid import uuid4
+
+from django.conf import settings
+from django.core.cache import cache
+from django.middleware.csrf import get_token
+from django.template.loader import render_to_string
+from django.utils.safestring import mark_safe
+
+from cart.cart import Cart
+from common.utils import create_captcha_image
+
+PRODUCT_PAGE_TIMEOUT = 60 * 60  # seconds
+# places in the cached page markup, which are filled with markup of the certain visitor on each request
+CSRF_TOKEN_PLACEHOLDER = 'product-page-csrf-token'
+CAPTCHA_PLACEHOLDER = 'product-page-captcha'
+CART_PANEL_PLACEHOLDER = '<!--product-page-cart-panel-->'
+# context of the page, which is rendered for caching
+PRODUCT_PAGE_OVERLAYS = {
+    'csrf_token': CSRF_TOKEN_PLACEHOLDER,
+    'captcha_image': CAPTCHA_PLACEHOLDER,
+    'cart_panel_overlay': mark_safe(CART_PANEL_PLACEHOLDER),
+}
+
+
+def get_product_page_key(product_id: int, language_code: str) -> str:
+    """
+    Returns cache key of the detail page markup of the product in the language with `language_code`
+    """
+    return f'product_page:{language_code}:{product_id}'
+
+
+def get_product_page_version_key(product_id: int) -> str:
+    """
+    Returns cache key of the version of the product detail pages,
+    which is changed with the product, its properties, comments or rating
+    """
+    return f'product_page:{product_id}:version'
+
+
+def get_product_page(product_id: int, language_code: str) -> Tuple[Optional[dict], str]:
+    """
+    Returns cached detail page of the product with `product_id` in the language with `language_code`
+    (None, if it is missing or outdated) and current version of the product pages.
+    Both are obtained from cache with one request
+    """
+    version_key = get_product_page_version_key(product_id)
+    page_key = get_product_page_key(product_id, language_code)
+    cached = cache.get_many([version_key, page_key])
+
+    version = cached.get(version_key)
+    if version is None:
+        version = uuid4().hex
+        if not cache.add(version_key, version, None):  # version has been set concurrently
+            version = cache.get(version_key)
+
+    page = cached.get(page_key)
+    return (page if page and page['version'] == version else None), version
+
+
+def set_product_page(product_id: int, language_code: str, page: dict) -> None:
+    """
+    Puts detail `page` of the product with `product_id` in the language with `language_code` to the cache.
+    `page` -> {'version': ..., 'slug': ..., 'category_id': ..., 'html': ...}
+    """
+    cache.set(get_product_page_key(product_id, language_code), page, PRODUCT_PAGE_TIMEOUT)
+
+
+def fill_product_page(html: str, request) -> str:
+    """
+    Returns cached page markup `html`, in which CSRF token, captcha and cart panel
+    of the visitor of the `request` are placed
+    """
+    cart_panel = render_to_string('cart/cart_panel.html', {'cart': Cart(request)})
+    return html.replace(CSRF_TOKEN_PLACEHOLDER, get_token(request)).replace(
+        CAPTCHA_PLACEHOLDER, create_captcha_image(request, width=135, font_size=30),
+    ).replace(CART_PANEL_PLACEHOLDER, cart_panel)
+
+
+def invalidate_product_page(*products_ids: int) -> None:
+    """
+    Makes cached detail pages of the products with `products_ids` outdated in all site languages
+    by changing their versions
+    """
+    cache.set_many({get_product_page_version_key(product_id): uuid4().hex for product_id in products_ids}, None)
+    cache.delete_many([get_product_page_key(product_id, language_code)
+                       for product_id in products_ids for language_code, _ in settings.LANGUAGES])
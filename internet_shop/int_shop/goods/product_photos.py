@@ -0,0 +1,42 @@
+from typing import List
+
+from django.core.cache import cache
+
+from goods.models import ProductPhoto
+
+PRODUCT_PHOTOS_TIMEOUT = 60 * 60 * 24  # seconds
+
+
+def get_product_photos_key(product_id: int) -> str:
+    """
+    Returns cache key of the photos manifest of the product
+    """
+    return f'product_photos:{product_id}'
+
+
+def get_product_photos(product_id: int) -> List[dict]:
+    """
+    Returns manifest of the detail photos of the product with `product_id` from cache ->
+    [{'name': ..., 'url': ..., 'width': ..., 'height': ..., 'content_hash': ...}].
+    Manifest is obtained from DB only once, files are never listed on the media storage.
+    URL contains part of the content hash, so that changed file is not obtained from browser cache
+    """
+    key = get_product_photos_key(product_id)
+    photos = cache.get(key)
+    if photos is None:
+        photos = [{
+            'name': photo.image.name,
+            'url': f'{photo.image.url}?v={photo.content_hash[:12]}',
+            'width': photo.width,
+            'height': photo.height,
+            'content_hash': photo.content_hash,
+        } for photo in ProductPhoto.objects.filter(product_id=product_id)]
+        cache.set(key, photos, PRODUCT_PHOTOS_TIMEOUT)
+    return photos
+
+
+def invalidate_product_photos(product_id: int) -> None:
+    """
+    Delete cached photos manifest of the product with `product_id`
+    """
+    cache.delete(get_product_photos_key(product_id))
@@ -0,0 +1,57 @@
+from decimal import Decimal
+from typing import Dict, Iterable
+
+from django.db.models import DecimalField, ExpressionWrapper, F, OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce, Round
+
+from common.moduls_init import redis
+from goods.models import Product, ProductStarCount
+
+# Redis hash with votes, which have not been flushed to DB yet, field is "<product id>:<star>"
+PRODUCTS_RATING_BUFFER_KEY = 'products_rating_buffer'
+STARS = tuple(Product.Rating.values)
+
+
+def add_product_vote(product_id: int, star: int) -> None:
+    """
+    Buffers vote with `star` for the product with `product_id` in Redis,
+    so that concurrent votes are counted atomically without rewriting of the product row
+    """
+    redis.hincrby(PRODUCTS_RATING_BUFFER_KEY, f'{product_id}:{star}', 1)
+
+
+def calculate_rating(star_counts: Dict[int, int]) -> Decimal:
+    """
+    Returns mean of the stars, which are weighted by their numbers of votes from `star_counts`
+    """
+    votes = sum(star_counts.values())
+    if not votes:
+        return Decimal('0.0')
+    return (Decimal(sum(star * count for star, count in star_counts.items())) / votes).quantize(Decimal('0.1'))
+
+
+def get_star_counts(product_id: int) -> Dict[int, int]:
+    """
+    Returns numbers of votes for each star of the product with `product_id`,
+    including votes, which have not been flushed to DB yet
+    """
+    star_counts = dict.fromkeys(STARS, 0)
+    star_counts.update(ProductStarCount.objects.filter(product_id=product_id).values_list('star', 'count'))
+    buffered = redis.hmget(PRODUCTS_RATING_BUFFER_KEY, [f'{product_id}:{star}' for star in STARS])
+    for star, count in zip(STARS, buffered):
+        star_counts[star] += int(count or 0)
+    return star_counts
+
+
+def update_products_rating(products_ids: Iterable[int]) -> None:
+    """
+    Recomputes stored rating of the products with `products_ids` from their numbers of votes
+    """
+    star_counts = ProductStarCount.objects.filter(product_id=OuterRef('pk')).order_by().values('product_id')
+    total = Subquery(star_counts.annotate(total=Sum(F('star') * F('count'))).values('total'))
+    votes = Subquery(star_counts.annotate(votes=Sum('count')).values('votes'))
+    Product.objects.filter(pk__in=list(products_ids)).update(rating=Coalesce(
+        Round(ExpressionWrapper(total * Decimal('1.0') / votes, output_field=DecimalField()), 1),
+        Decimal('0.0'),
+        output_field=DecimalField(),
+    ))
@@ -1,13 +1,16 @@
-from typing import Union
+from typing import Iterable, List, Union
 
+from django.conf import settings
+from django.contrib.postgres.aggregates import ArrayAgg
 from django.core.cache import cache
-from django.db.models import F, Q
-from django.db.models import QuerySet
+from django.db import connection, transaction
+from django.db.models import F, IntegerField, QuerySet
 from django.db.models.aggregates import Count
-from django.utils.text import slugify
+from django.db.models.expressions import RawSQL
 from django.utils.translation import gettext_lazy as _, gettext
 
-from .models import Property, PropertyCategory
+from common.moduls_init import redis
+from .models import Category, Property, PropertyFacet
 
 MOBILE_PHONES_NECESSARY_PROPS = {
     gettext('Display'): (_('Diagonal'), _('Resolution'), _('Type')),
@@ -52,59 +55,135 @@ SMART_GADGETS_NECESSARY_PROPS = {
 }
 
 
-def get_property_for_category(products_category: str,
+CATEGORIES_NECESSARY_PROPS = {
+    'Mobile phones': MOBILE_PHONES_NECESSARY_PROPS,
+    'Laptops': LAPTOPS_NECESSARY_PROPS,
+    'Audio Video': AUDIO_VIDEO_NECESSARY_PROPS,
+    'Smart Gadgets': SMART_GADGETS_NECESSARY_PROPS
+}
+
+
+def get_category_facets_indexed_key(category_id: int) -> str:
+    """
+    Returns cache key of the marker, that facets of the category with `category_id` have been built,
+    so that category without facets is told apart from the category, which hasn't been indexed yet
+    """
+    return f'property_facets:{category_id}:indexed'
+
+
+def get_not_indexed_categories(categories_ids: Iterable[int]) -> List[int]:
+    """
+    Returns ids of the categories from `categories_ids`, whose facets haven't been built yet
+    """
+    categories_ids = list(categories_ids)
+    indexed = cache.get_many([get_category_facets_indexed_key(category_id) for category_id in categories_ids])
+    return [category_id for category_id in categories_ids
+            if get_category_facets_indexed_key(category_id) not in indexed]
+
+
+def rebuild_category_facets(category_id: int) -> None:
+    """
+    Recomputes properties facets of the available products
+    for category with `category_id` in all site languages.
+    Facets are rebuilt by signals and `rebuild_property_facets` command, while reading
+    they are built only once for the category, which hasn't been indexed yet.
+    Concurrent rebuilds of the category are serialized, so that facets are not duplicated
+    """
+    with redis.lock(f'property_facets:{category_id}:lock', timeout=300):
+        _rebuild_category_facets(category_id)
+
+
+def _rebuild_category_facets(category_id: int) -> None:
+    facets = []
+    for language_code, _language in settings.LANGUAGES:
+        properties = Property.objects.filter(
+            product__category_id=category_id,
+            product__available=True,
+            translations__language_code=language_code,
+            category_property__translations__language_code=language_code,
+        ).values(
+            'category_property_id',
+            'numeric_value',
+            facet_category_property_name=F('category_property__translations__name'),
+            facet_name=F('translations__name'),
+            facet_text_value=F('translations__text_value'),
+            facet_units=F('translations__units'),
+        ).annotate(
+            item_count=Count('product_id', distinct=True),
+            product_ids=ArrayAgg('product_id', distinct=True),
+        ).order_by()
+
+        facets.extend(PropertyFacet(category_id=category_id,
+                                    language_code=language_code,
+                                    category_property_id=prop['category_property_id'],
+                                    category_property_name=prop['facet_category_property_name'],
+                                    name=prop['facet_name'],
+                                    text_value=prop['facet_text_value'],
+                                    numeric_value=prop['numeric_value'],
+                                    units=prop['facet_units'],
+                                    item_count=prop['item_count'],
+                                    product_ids=prop['product_ids']) for prop in properties)
+
+    with transaction.atomic():
+        PropertyFacet.objects.filter(category_id=category_id).delete()
+        PropertyFacet.objects.bulk_create(facets)
+    cache.set(get_category_facets_indexed_key(category_id), True, None)
+
+
+def rebuild_categories_facets(categories_ids: Iterable[int]) -> None:
+    """
+    Recomputes properties facets of the categories with `categories_ids`
+    """
+    for category_id in categories_ids:
+        rebuild_category_facets(category_id)
+
+
+def get_property_for_category(category: Category,
                               language_code: str,
                               prods_queryset: Union[QuerySet, None] = None) -> dict:
     """
-    Returns necessary properties for passed `products_category`.
+    Returns necessary properties for passed products `category` from the facets index.
+    If `prods_queryset` was passed, quantity of products for each property
+    is counted only among products from this queryset with one query.
     """
-    necessary_props = None
-    rest_props = None
-    lookup = Q()
-
-    properties = {
-        'Mobile phones': MOBILE_PHONES_NECESSARY_PROPS,
-        'Laptops': LAPTOPS_NECESSARY_PROPS,
-        'Audio Video': AUDIO_VIDEO_NECESSARY_PROPS,
-        'Smart Gadgets': SMART_GADGETS_NECESSARY_PROPS
-    }
-
-    necessary_props = properties.get(products_category, {})
-
-    if prods_queryset:
-        lookup = Q(product__in=prods_queryset)
-
-    # getting queryset from cache
-    all_props = cache.get(
-        f'category_{slugify(products_category)}_props_{language_code}')
-    if not all_props:
-        properties_categories = PropertyCategory.objects.prefetch_related('product_categories').filter(
-            translations__language_code=language_code)
-
-        lookup &= Q(category_property__in=properties_categories,
-                    product__category__name__iexact=products_category,
-                    product__available=True)
-        all_props = Property.objects.prefetch_related('category_property', 'translations').filter(
-            lookup, translations__language_code=language_code)
-        # saving queryset to cache
-        cache.set(
-            f'category_{slugify(products_category)}_props_{language_code}', all_props)
-
-    if prods_queryset:
-        # remaining filtered products properties
-        rest_props = all_props.filter(lookup, translations__language_code=language_code)
+    necessary_props = CATEGORIES_NECESSARY_PROPS.get(category.name, {})
+    if get_not_indexed_categories([category.pk]):  # e.g. after deploy, index is built on the first read
+        rebuild_category_facets(category.pk)
+
+    # indexed category without facets has no properties in this language
+    facets = PropertyFacet.objects.filter(category=category, language_code=language_code).defer('product_ids')
+    if prods_queryset is not None:  # filtered products are counted by DB without loading their ids
+        filtered_sql, filtered_params = prods_queryset.order_by().values('pk').query.sql_with_params()
+        product_ids = f'{connection.ops.quote_name(PropertyFacet._meta.db_table)}.' \
+                      f'{connection.ops.quote_name("product_ids")}'
+        facets = facets.annotate(filtered_count=RawSQL(
+            f'SELECT count(*) FROM unnest({product_ids}) AS facet_product(id) '
+            f'WHERE facet_product.id IN ({filtered_sql})',
+            filtered_params,
+            output_field=IntegerField(),
+        ))
 
     # select necessary categories and properties for searching
     result = {}
-    for prop in (rest_props or all_props).select_related('category_property').values('translations__name',
-                                                                                     'translations__text_value',
-                                                                                     'numeric_value',
-                                                                                     'translations__units',).annotate(
-            category_property=F('category_property__translations__name'),
-            category_property_pk=F('category_property_id'),
-            item_count=Count('translations__name')).order_by('category_property'):
-        if (prop['category_property'] in necessary_props and
-                prop['translations__name'] in necessary_props[prop['category_property']]):
-            result.setdefault(gettext(prop['category_property']), []).append(prop)
+    for facet in facets:
+        if not (facet.category_property_name in necessary_props and
+                facet.name in necessary_props[facet.category_property_name]):
+            continue
+
+        item_count = facet.item_count
+        if prods_queryset is not None:  # remaining filtered products properties
+            item_count = facet.filtered_count
+            if not item_count:
+                continue
+
+        result.setdefault(gettext(facet.category_property_name), []).append({
+            'translations__name': facet.name,
+            'translations__text_value': facet.text_value,
+            'numeric_value': facet.numeric_value,
+            'translations__units': facet.units,
+            'category_property': facet.category_property_name,
+            'category_property_pk': facet.category_property_id,
+            'item_count': item_count,
+        })
 
     return result
@@ -0,0 +1,104 @@
+from typing import Iterable, Union
+
+from django.conf import settings
+from django.contrib.postgres.aggregates import StringAgg
+from django.contrib.postgres.search import SearchQuery, SearchRank, SearchVector, TrigramSimilarity
+from django.db import transaction
+from django.db.models import (
+    BooleanField, Case, F, Q, QuerySet, Value, When, FilteredRelation, ExpressionWrapper, FloatField,
+)
+from django.db.models.functions import Coalesce, Concat, Ln
+
+from .models import Product, ProductSearchDocument
+
+# Postgres text search configurations for the site languages,
+# languages without own configuration (e.g. Ukrainian) use "simple" configuration
+SEARCH_CONFIGS = {
+    'en': 'english',
+}
+DEFAULT_SEARCH_CONFIG = 'simple'
+POPULARITY_WEIGHT = 0.1  # how much product views boost relevance of the search result
+
+
+def get_search_config(language_code: str) -> str:
+    """
+    Returns Postgres text search configuration for the language with `language_code`
+    """
+    return SEARCH_CONFIGS.get(language_code, DEFAULT_SEARCH_CONFIG)
+
+
+def get_search_vector(language_code: str) -> SearchVector:
+    """
+    Returns weighted search vector of the product name, manufacturer name,
+    names and values of product properties in the language with `language_code` and description
+    """
+    config = get_search_config(language_code)
+    properties = StringAgg(Concat('properties__translations__name', Value(' '), 'properties__translations__text_value'),
+                           delimiter=' ',
+                           distinct=True,
+                           filter=Q(properties__translations__language_code=language_code))
+
+    return (SearchVector('name', weight='A', config=config)
+            + SearchVector('manufacturer__name', weight='B', config=config)
+            + SearchVector(properties, weight='C', config=config)
+            + SearchVector('description', weight='D', config=config))
+
+
+def rebuild_search_documents(product_ids: Iterable[int]) -> None:
+    """
+    Recomputes search documents of the products with `product_ids` in all site languages.
+    Documents of deleted products are just removed
+    """
+    product_ids = list(product_ids)
+    documents = []
+    for language_code, _language in settings.LANGUAGES:
+        vectors = Product.objects.filter(pk__in=product_ids).annotate(
+            document=get_search_vector(language_code),
+        ).values_list('pk', 'document').order_by()
+
+        documents.extend(ProductSearchDocument(product_id=pk,
+                                               language_code=language_code,
+                                               search_vector=document) for pk, document in vectors)
+
+    with transaction.atomic():
+        ProductSearchDocument.objects.filter(product_id__in=product_ids).delete()
+        ProductSearchDocument.objects.bulk_create(documents)
+
+
+def search_products(query: str, language_code: str, queryset: Union[QuerySet, None] = None,
+                    products_ids: Iterable[int] = ()) -> QuerySet:
+    """
+    Returns products from `queryset` (all available products by default), which match the search `query`
+    either by full-text search document in the language with `language_code` or by trigram similarity of the name.
+    Products with `products_ids` (e.g. ids typed into the query) are found regardless of the query.
+    Products are sorted by descending of relevance, which combines rank of full-text match,
+    name similarity and number of product views, products with `products_ids` are placed first
+    """
+    if queryset is None:
+        queryset = Product.available_objects.all()
+    products_ids = list(products_ids)
+
+    search_query = SearchQuery(query, config=get_search_config(language_code), search_type='websearch')
+    # each branch of union is served by its own index
+    branches = [Product.objects.filter(name__trigram_similar=query).values('pk').order_by()]
+    if products_ids:
+        branches.append(Product.objects.filter(pk__in=products_ids).values('pk').order_by())
+    matched_ids = ProductSearchDocument.objects.filter(
+        language_code=language_code, search_vector=search_query,
+    ).values('product_id').union(*branches)
+
+    ordering = ['-relevance', '-views']
+    if products_ids:
+        # flag is annotated, so that the ordering consists of field names and can be used by keyset pagination
+        queryset = queryset.annotate(id_match=Case(When(pk__in=products_ids, then=Value(True)), default=Value(False),
+                                                   output_field=BooleanField()))
+        ordering.insert(0, '-id_match')
+    return queryset.filter(pk__in=matched_ids).annotate(
+        document=FilteredRelation('search_documents', condition=Q(search_documents__language_code=language_code)),
+        rank=Coalesce(SearchRank(F('document__search_vector'), search_query), Value(0.0)),
+        similarity=TrigramSimilarity('name', query),
+        relevance=ExpressionWrapper(
+            (F('rank') + F('similarity')) * (Value(1.0) + Value(POPULARITY_WEIGHT) * Ln(F('views') + 1)),
+            output_field=FloatField(),
+        ),
+    ).order_by(*ordering)
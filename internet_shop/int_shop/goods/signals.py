@@ -1,59 +1,349 @@
-import os
-import shutil
+from functools import partial
+from typing import Optional
 
-import boto3
-from django.conf import settings
-from django.core.cache import cache
-from django.db.models.signals import post_save, post_delete
+from django.db import transaction
+from django.db.models.signals import m2m_changed, post_save, post_delete, pre_delete
 from django.dispatch import receiver
 
+from account.models import Profile
+from common.media_cleanup import queue_media_cleanup
+from common.transactions import on_commit_batched
 from common.moduls_init import redis
-from common.storage_backends import MediaStorage
-from goods.models import Product, Property, Category
+from goods.catalog_generations import bump_catalog_generations, delete_product_generation
+from goods.comment_rating import recount_comments_rating
+from goods.image_derivatives import delete_image_derivatives, schedule_image_derivatives
+from goods.models import Comment, Favorite, Product, ProductPhoto, Property, Manufacturer
+from goods.product_cards import invalidate_product_card
+from goods.product_pages import invalidate_product_page
+from goods.product_photos import invalidate_product_photos
+from goods.property_filters import rebuild_categories_facets
+from goods.search import rebuild_search_documents
+from goods.tasks import refresh_categories_price_stats
+from goods.utils import (
+    PRODUCTS_VIEWS_KEY,
+    get_category_views_key,
+    invalidate_all_manufacturer_facets,
+    invalidate_favorites,
+    invalidate_manufacturer_facets,
+    update_favorites,
+)
+
+
+def _get_product_category_id(instance) -> Optional[int]:
+    """
+    Returns category id of the product of the property or comment `instance`. Only category id is loaded,
+    unless the product has been loaded already, and it is loaded once for all signals of the instance
+    """
+    if type(instance).product.is_cached(instance):
+        return instance.product.category_id
+    product_id, category_id = getattr(instance, '_product_category', (None, None))
+    if product_id != instance.product_id:
+        product_id, category_id = instance.product_id, Product.objects.filter(
+            pk=instance.product_id,
+        ).values_list('category_id', flat=True).first()
+        instance._product_category = product_id, category_id
+    return category_id
+
+
+@receiver(signal=[post_save, post_delete], sender=Product)
+def refresh_price_stats_cache(sender, instance: Product, *args, **kwargs):
+    """
+    Refresh cached price statistics of the product category (and of the previous category,
+    if the product has been moved) in background after transaction has been committed,
+    when adding, changing or deleting the product
+    """
+    old_category_id, _old_available = getattr(instance, 'loaded_state', (None, None))
+    categories_ids = list({old_category_id, instance.category_id} - {None})
+    transaction.on_commit(partial(refresh_categories_price_stats.delay, categories_ids))
+
+
+@receiver(signal=[post_save, post_delete], sender=Product)
+def invalidate_product_card_cache(sender, instance: Product, *args, **kwargs):
+    """
+    Delete cached card markup of the product, when the product has been changed or deleted
+    """
+    invalidate_product_card(instance.pk)
+
+
+def invalidate_property_product_card_cache(sender, instance, **kwargs):
+    """
+    Delete cached card markup of the product, when its property or property translation has been changed
+    """
+    prop = instance if isinstance(instance, Property) else instance.master
+    invalidate_product_card(prop.product_id)
+
+
+@receiver(signal=[post_save, post_delete], sender=Product)
+def invalidate_product_page_cache(sender, instance: Product, *args, **kwargs):
+    """
+    Make cached detail pages of the product outdated, when the product has been changed or deleted
+    """
+    invalidate_product_page(instance.pk)
+
+
+@receiver(signal=[post_save, post_delete], sender=Product)
+def bump_product_catalog_generations(sender, instance: Product, *args, **kwargs):
+    """
+    Change validators of the product and of the lists of its category (and of the previous category,
+    if the product has been moved), when the product has been changed or deleted.
+    Generation of the deleted product is deleted
+    """
+    old_category_id, _old_available = getattr(instance, 'loaded_state', (None, None))
+    if kwargs['signal'] is post_delete:
+        bump_catalog_generations(categories_ids=[old_category_id, instance.category_id])
+        delete_product_generation(instance.pk)
+    else:
+        bump_catalog_generations([instance.pk], [old_category_id, instance.category_id])
+
+
+def bump_property_catalog_generations(sender, instance, **kwargs):
+    """
+    Change validators of the product and of the lists of its category,
+    when its property or property translation has been changed
+    """
+    prop = instance if isinstance(instance, Property) else instance.master
+    bump_catalog_generations([prop.product_id], [_get_product_category_id(prop)])
+
+
+@receiver(signal=[post_save, post_delete], sender=Comment)
+def bump_comment_catalog_generations(sender, instance: Comment, *args, **kwargs):
+    """
+    Change validators of the product and of the lists of its category, since they contain product comments
+    """
+    bump_catalog_generations([instance.product_id], [_get_product_category_id(instance)])
+
+
+@receiver(signal=[post_save, post_delete], sender=Comment)
+def invalidate_comment_product_page_cache(sender, instance: Comment, *args, **kwargs):
+    """
+    Make cached detail pages of the product outdated, when its comment has been added, changed or deleted
+    """
+    invalidate_product_page(instance.product_id)
+
+
+@receiver(signal=[post_save, post_delete], sender=ProductPhoto)
+def invalidate_product_photos_cache(sender, instance: ProductPhoto, *args, **kwargs):
+    """
+    Delete cached photos manifest and make cached detail pages of the product outdated,
+    when its photo has been uploaded, changed or deleted
+    """
+    invalidate_product_photos(instance.product_id)
+    invalidate_product_page(instance.product_id)
+
+
+@receiver(signal=post_save, sender=Product)
+@receiver(signal=post_save, sender=ProductPhoto)
+def generate_image_derivatives(sender, instance, *args, **kwargs):
+    """
+    Render resized copies of the uploaded product image or photo in background
+    """
+    schedule_image_derivatives(instance.image)
+
+
+@receiver(signal=post_delete, sender=Product)
+@receiver(signal=post_delete, sender=ProductPhoto)
+def delete_image_derivatives_files(sender, instance, *args, **kwargs):
+    """
+    Delete resized copies of the deleted product image or photo
+    """
+    if instance.image:
+        delete_image_derivatives(instance.image.name)
+
+
+@receiver(signal=post_delete, sender=ProductPhoto)
+def delete_product_photo_file(sender, instance: ProductPhoto, *args, **kwargs):
+    """
+    Queue photo file for deletion from the media storage after transaction has been committed
+    """
+    queue_media_cleanup(names=[instance.image.name], storage=instance.image.storage)
+
+
+def invalidate_property_product_page_cache(sender, instance, **kwargs):
+    """
+    Make cached detail pages of the product outdated, when its property or property translation has been changed
+    """
+    prop = instance if isinstance(instance, Property) else instance.master
+    invalidate_product_page(prop.product_id)
+
+
+def update_property_facets(sender, instance, **kwargs):
+    """
+    Update properties facets index for the product category
+    after transaction has been committed, when creating, updating
+    or deleting product property or property translation
+    """
+    prop = instance if isinstance(instance, Property) else instance.master
+    # facets of the category are rebuilt once for all properties, which have been changed in the transaction,
+    # category of the deleted product is None, its facets are deleted by cascade
+    on_commit_batched(rebuild_categories_facets, [_get_product_category_id(prop)])
+
+
+def update_property_search_document(sender, instance, **kwargs):
+    """
+    Update search documents of the product after transaction has been committed,
+    when creating, updating or deleting product property or property translation
+    """
+    prop = instance if isinstance(instance, Property) else instance.master
+    on_commit_batched(rebuild_search_documents, [prop.product_id])
+
+
+@receiver(signal=post_save, sender=Product)
+def update_product_search_document(sender, instance: Product, *args, **kwargs):
+    """
+    Update search documents of the product after transaction has been committed
+    """
+    on_commit_batched(rebuild_search_documents, [instance.pk])
+
+
+@receiver(signal=post_save, sender=Manufacturer)
+def update_manufacturer_search_documents(sender, instance: Manufacturer, created: bool, *args, **kwargs):
+    """
+    Update search documents of all manufacturer's products, since they contain manufacturer name
+    """
+    if created:  # new manufacturer has no products yet
+        return
+    on_commit_batched(rebuild_search_documents, instance.products.values_list('pk', flat=True))
 
 
 @receiver(signal=[post_save, post_delete], sender=Product)
-def invalidate_prices_cache(sender, instance: Product, *args, **kwargs):
+def invalidate_manufacturer_facets_cache(sender, instance: Product, *args, **kwargs):
+    """
+    Invalidate cached manufacturer facets of the product category (and of the previous category,
+    if the product has been moved), when the product has been changed or deleted
+    """
+    old_category_id, _old_available = getattr(instance, 'loaded_state', (None, None))
+    invalidate_manufacturer_facets(*{old_category_id, instance.category_id} - {None})
+
+
+@receiver(signal=[post_save, post_delete], sender=Manufacturer)
+def invalidate_manufacturer_name_facets_cache(sender, instance: Manufacturer, *args, **kwargs):
     """
-    Invalidate the cache of maximum or minimum price for product category,
-    when adding the new product or deleting the existing product
+    Invalidate all cached manufacturer facets, since they contain manufacturer names
     """
-    max_price = cache.get(f'max_price_{instance.category.slug}')
-    min_price = cache.get(f'min_price_{instance.category.slug}')
+    invalidate_all_manufacturer_facets()
 
-    if max_price and (instance.price > max_price['max_price'] or instance.price == max_price['max_price']):
-        cache.delete(f'max_price_{instance.category.slug}')
-    if min_price and (instance.price < min_price['min_price'] or instance.price == min_price['min_price']):
-        cache.delete(f'min_price_{instance.category.slug}')
 
+@receiver(signal=post_save, sender=Product)
+def update_product_facets(sender, instance: Product, created: bool, *args, **kwargs):
+    """
+    Update properties facets index, when the product has changed
+    either its availability or its category
+    """
+    if created:  # new product has no properties yet
+        return
+
+    old_category_id, old_available = getattr(instance, 'loaded_state', (None, None))
+    if old_category_id == instance.category_id and old_available == instance.available:
+        return
+
+    on_commit_batched(rebuild_categories_facets, [old_category_id, instance.category_id])
 
-def invalidate_properties_cache(sender, instance, **kwargs):
+
+@receiver(signal=post_save, sender=Product)
+def update_product_popularity(sender, instance: Product, created: bool, *args, **kwargs):
     """
-    Invalidate the cache for the storage queryset with products properties,
-    when deleting the product category or either creating or deleting product property
+    Keep Redis sorted sets with products views in sync with product's availability and category.
+    Available product is added to the sorted sets with number of views from its hash,
+    unavailable product is removed from the sorted sets
     """
-    category = None
-    if isinstance(instance, Property):
-        category = instance.product.category.slug
-    elif isinstance(instance, Category):
-        category = instance.slug
+    old_category_id, old_available = getattr(instance, 'loaded_state', (None, None))
+    if not created and old_category_id == instance.category_id and old_available == instance.available:
+        return
 
-    cache.delete(f'category_{category}_props')
+    views = int(redis.hget(f'product_id:{instance.pk}', 'views') or 0)
+    with redis.pipeline() as pipe:
+        if old_category_id and old_category_id != instance.category_id:
+            pipe.zrem(get_category_views_key(old_category_id), instance.pk)
+        if instance.available:
+            pipe.zadd(PRODUCTS_VIEWS_KEY, {instance.pk: views})
+            pipe.zadd(get_category_views_key(instance.category_id), {instance.pk: views})
+        else:
+            pipe.zrem(PRODUCTS_VIEWS_KEY, instance.pk)
+            pipe.zrem(get_category_views_key(instance.category_id), instance.pk)
+        pipe.execute()
 
 
 @receiver(signal=post_delete, sender=Product)
 def delete_product_images_folder(sender, instance: Product, *args, **kwargs):
     """
-    Deleting product image from AWS Bucket,
-    deleting directory with product photos from media root,
-    and deleting product id from Redis
-    """
-    # if using AWS Cloud storage
-    if isinstance(instance.image.storage, MediaStorage):
-        aws_image_key = f'media/{instance.image.name}'
-        aws_s3_bucket = MediaStorage().bucket_name
-        client = boto3.client('s3')
-        client.delete_object(Bucket=aws_s3_bucket, Key=aws_image_key)
-    # deleting product's photo directory from the file system
-    shutil.rmtree(os.path.join(settings.MEDIA_ROOT, f'products/product_{instance.name}'))
-    redis.srem('products_ids', instance.pk)
+    Queue product image and directory with product photos for deletion from the media storage
+    after transaction has been committed, and delete product id from Redis
+    """
+    queue_media_cleanup(names=[instance.image.name],
+                        directories=[f'products/product_{instance.name}'],
+                        storage=instance.image.storage)
+    with redis.pipeline() as pipe:
+        pipe.srem('products_ids', instance.pk)
+        pipe.zrem(PRODUCTS_VIEWS_KEY, instance.pk)
+        pipe.zrem(get_category_views_key(instance.category_id), instance.pk)
+        pipe.execute()
+
+
+@receiver(signal=m2m_changed, sender=Favorite.product.through)
+def update_favorites_set(sender, instance, action: str, reverse: bool, pk_set: set, *args, **kwargs):
+    """
+    Keep Redis sets with favorite products of the profiles in sync with their favorites in DB.
+    Sets of the profiles, whose favorites have been changed from the product side, are just deleted
+    and are filled from DB on demand
+    """
+    if not reverse:  # favorites of the profile have been changed
+        if action == 'post_add':
+            update_favorites(instance.profile_id, added_ids=pk_set)
+        elif action == 'post_remove':
+            update_favorites(instance.profile_id, removed_ids=pk_set)
+        elif action == 'post_clear':
+            invalidate_favorites(instance.profile_id)
+    elif action in ('post_add', 'post_remove'):
+        invalidate_favorites(*Favorite.objects.filter(pk__in=pk_set).values_list('profile_id', flat=True))
+    elif action == 'pre_clear':
+        invalidate_favorites(*instance.favorite_set.values_list('profile_id', flat=True))
+
+
+@receiver(signal=pre_delete, sender=Product)
+def invalidate_product_favorites_sets(sender, instance: Product, *args, **kwargs):
+    """
+    Delete Redis sets with favorite products of the profiles, which have the product in their favorites,
+    since rows of the product in favorites are deleted by cascade without m2m signals
+    """
+    invalidate_favorites(*instance.favorite_set.values_list('profile_id', flat=True))
+
+
+@receiver(signal=m2m_changed, sender=Comment.profiles_likes.through)
+@receiver(signal=m2m_changed, sender=Comment.profiles_unlikes.through)
+def update_comments_rating(sender, instance, action: str, reverse: bool, pk_set: set, *args, **kwargs):
+    """
+    Recompute stored numbers of likes and dislikes of the comments,
+    when their likes or dislikes have been changed through M2M managers (e.g. in admin)
+    """
+    if not reverse:  # likes (dislikes) of the comment have been changed
+        if action in ('post_add', 'post_remove', 'post_clear'):
+            recount_comments_rating([instance.pk])
+        return
+
+    # rated comments of the profile have been changed
+    if action == 'pre_clear':  # remember comments, since they are unknown after clearing
+        rated_comments = instance.comments_liked if sender is Comment.profiles_likes.through else \
+            instance.comments_unliked
+        instance.cleared_comments_ids = list(rated_comments.values_list('pk', flat=True))
+    elif action == 'post_clear':
+        recount_comments_rating(getattr(instance, 'cleared_comments_ids', []))
+    elif action in ('post_add', 'post_remove'):
+        recount_comments_rating(pk_set)
+
+
+@receiver(signal=pre_delete, sender=Profile)
+def remember_profile_rated_comments(sender, instance: Profile, *args, **kwargs):
+    """
+    Remember comments, which have been liked or disliked by the profile,
+    since its likes and dislikes are deleted by cascade without m2m signals
+    """
+    instance.rated_comments_ids = list(instance.comments_liked.order_by().values_list('pk', flat=True).union(
+        instance.comments_unliked.order_by().values_list('pk', flat=True)))
+
+
+@receiver(signal=post_delete, sender=Profile)
+def update_profile_rated_comments_rating(sender, instance: Profile, *args, **kwargs):
+    """
+    Recompute stored numbers of likes and dislikes of the comments, which have been rated by the deleted profile
+    """
+    recount_comments_rating(getattr(instance, 'rated_comments_ids', []))
@@ -0,0 +1,132 @@
+from functools import reduce
+from operator import or_
+
+from celery import shared_task
+from django.db import transaction
+from django.db.models import F, Case, When, Value, Q
+
+from common.moduls_init import redis
+from goods.catalog_generations import bump_products_generations
+from goods.filters import refresh_price_stats
+from goods.image_derivatives import render_image_derivatives
+from goods.models import Category, Product, ProductStarCount
+from goods.product_cards import invalidate_product_card
+from goods.product_pages import invalidate_product_page
+from goods.product_rating import PRODUCTS_RATING_BUFFER_KEY, update_products_rating
+from goods.utils import PRODUCTS_VIEWS_BUFFER_KEY
+
+# buffer with products views, which are being flushed to DB right now
+PRODUCTS_VIEWS_FLUSHING_KEY = f'{PRODUCTS_VIEWS_BUFFER_KEY}:flushing'
+# buffer with products votes, which are being flushed to DB right now
+PRODUCTS_RATING_FLUSHING_KEY = f'{PRODUCTS_RATING_BUFFER_KEY}:flushing'
+FLUSH_BATCH_SIZE = 500
+
+
+@shared_task
+def flush_products_views() -> str:
+    """
+    Task moves products views, which have been buffered in Redis hash since last flush,
+    to `views` column of the products in DB.
+    Buffer is renamed before reading, so that new views are buffered into new hash meanwhile,
+    and buffer which failed to flush last time is flushed first.
+    """
+    lock = redis.lock(f'{PRODUCTS_VIEWS_FLUSHING_KEY}:lock', timeout=300)
+    if not lock.acquire(blocking=False):
+        return 'Views are being flushed by another worker'
+
+    try:
+        if not redis.exists(PRODUCTS_VIEWS_FLUSHING_KEY):
+            if not redis.exists(PRODUCTS_VIEWS_BUFFER_KEY):
+                return 'No views to flush'
+            redis.rename(PRODUCTS_VIEWS_BUFFER_KEY, PRODUCTS_VIEWS_FLUSHING_KEY)
+
+        views = {int(pk): int(amount) for pk, amount in redis.hgetall(PRODUCTS_VIEWS_FLUSHING_KEY).items()}
+        products_ids = sorted(views)  # same order of rows locking for concurrent updates
+        with transaction.atomic():
+            for i in range(0, len(products_ids), FLUSH_BATCH_SIZE):
+                batch = products_ids[i:i + FLUSH_BATCH_SIZE]
+                Product.objects.filter(pk__in=batch).update(
+                    views=F('views') + Case(*[When(pk=pk, then=Value(views[pk])) for pk in batch], default=Value(0))
+                )
+        redis.delete(PRODUCTS_VIEWS_FLUSHING_KEY)
+        bump_products_generations(products_ids)
+    finally:
+        lock.release()
+
+    return f'Views of {len(products_ids)} products have been flushed'
+
+
+@shared_task
+def flush_products_rating() -> str:
+    """
+    Task adds products votes, which have been buffered in Redis hash since last flush,
+    to numbers of votes for each star of the products in DB with atomic increments
+    and recomputes stored rating of these products from the new numbers of votes.
+    Buffer is flushed in the same way as buffer with products views.
+    """
+    lock = redis.lock(f'{PRODUCTS_RATING_FLUSHING_KEY}:lock', timeout=300)
+    if not lock.acquire(blocking=False):
+        return 'Votes are being flushed by another worker'
+
+    try:
+        if not redis.exists(PRODUCTS_RATING_FLUSHING_KEY):
+            if not redis.exists(PRODUCTS_RATING_BUFFER_KEY):
+                return 'No votes to flush'
+            redis.rename(PRODUCTS_RATING_BUFFER_KEY, PRODUCTS_RATING_FLUSHING_KEY)
+
+        votes = {}
+        for field, amount in redis.hgetall(PRODUCTS_RATING_FLUSHING_KEY).items():
+            product_id, star = map(int, field.decode().split(':'))
+            votes[(product_id, star)] = int(amount)
+        products_ids = sorted({product_id for product_id, _star in votes})
+        existing_products_ids = set(Product.objects.filter(pk__in=products_ids).values_list('pk', flat=True))
+        keys = sorted(key for key in votes if key[0] in existing_products_ids)  # skip votes of deleted products
+
+        with transaction.atomic():
+            ProductStarCount.objects.bulk_create(
+                [ProductStarCount(product_id=product_id, star=star) for product_id, star in keys],
+                ignore_conflicts=True,
+            )
+            for i in range(0, len(keys), FLUSH_BATCH_SIZE):
+                batch = keys[i:i + FLUSH_BATCH_SIZE]
+                star_counts = reduce(or_, [Q(product_id=product_id, star=star) for product_id, star in batch])
+                ProductStarCount.objects.filter(star_counts).update(count=F('count') + Case(
+                    *[When(product_id=product_id, star=star, then=Value(votes[(product_id, star)]))
+                      for product_id, star in batch],
+                    default=Value(0),
+                ))
+            update_products_rating(existing_products_ids)
+        redis.delete(PRODUCTS_RATING_FLUSHING_KEY)
+        # rating has been updated bypassing signals, cached cards and pages show rating stars
+        invalidate_product_card(*existing_products_ids)
+        invalidate_product_page(*existing_products_ids)
+        bump_products_generations(existing_products_ids)
+    finally:
+        lock.release()
+
+    return f'Votes of {len(existing_products_ids)} products have been flushed'
+
+
+@shared_task
+def refresh_categories_price_stats(categories_ids: list) -> str:
+    """
+    Task recomputes cached price statistics (bounds and histogram for the price filter)
+    of the categories with `categories_ids`, after their products have been changed
+    """
+    categories_slugs = list(Category.objects.filter(pk__in=categories_ids).values_list('slug', flat=True))
+    refresh_price_stats(categories_slugs)
+    return f'Price statistics of {len(categories_slugs)} categories have been refreshed'
+
+
+@shared_task
+def generate_image_derivatives(source: str) -> str:
+    """
+    Task renders resized copies of the uploaded image with storage name `source`
+    and makes cached cards and pages of the products with this image outdated, so that they use the copies
+    """
+    rendered = render_image_derivatives(source)
+    products_ids = list(Product.objects.filter(image=source).values_list('pk', flat=True))
+    invalidate_product_card(*products_ids)
+    invalidate_product_page(*products_ids)
+    bump_products_generations(products_ids)
+    return f'{rendered} copies of the image {source} have been rendered'
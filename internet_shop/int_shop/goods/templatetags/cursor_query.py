@@ -0,0 +1,16 @@
+from django import template
+from django.http import QueryDict
+
+from goods.pagination import CURSOR_PARAM
+
+register = template.Library()
+
+
+@register.simple_tag(name='cursor_query')
+def cursor_query(request_get: QueryDict, cursor: str) -> str:
+    """
+    Tag returns query string of the current request, in which cursor of keyset pagination is replaced by `cursor`
+    """
+    query = request_get.copy()
+    query[CURSOR_PARAM] = cursor
+    return f'?{query.urlencode()}'
@@ -0,0 +1,45 @@
+from django import template
+from django.middleware.csrf import get_token
+from django.template.loader import render_to_string
+from django.utils.html import format_html
+from django.utils.safestring import mark_safe
+from django.utils.translation import get_language
+
+from goods.models import Product
+from goods.product_cards import get_product_cards, FAVORITE_PLACEHOLDER, CSRF_PLACEHOLDER
+
+register = template.Library()
+
+
+@register.simple_tag(name='product_card', takes_context=True)
+def product_card(context, product: Product) -> str:
+    """
+    Tag returns cached card markup of the `product`, in which favorite icon and CSRF token
+    of the current user are placed. Cards of all products on the page
+    are obtained from cache at once, while the first card is rendering
+    """
+    state = context.render_context.get('product_cards')
+    if state is None:
+        products = list(context.get('products') or [])
+        if product not in products:
+            products.append(product)
+
+        favorites = context.get('favorites') or set()  # ids of favorite products of the current profile
+        request = context.get('request')
+        state = {
+            'cards': get_product_cards(products, get_language()),
+            'favorites': favorites,
+            'icons': {in_favorites: render_to_string('goods/product/card_favorite.html',
+                                                     {'in_favorites': in_favorites})
+                      for in_favorites in (True, False)},
+            'csrf_input': format_html('<input type="hidden" name="csrfmiddlewaretoken" value="{}">',
+                                      get_token(request)) if request else '',
+        }
+        context.render_context['product_cards'] = state
+
+    card = state['cards'].get(product.pk)
+    if card is None:  # product is not in the products list of the page
+        card = get_product_cards([product], get_language())[product.pk]
+
+    card = card.replace(FAVORITE_PLACEHOLDER, state['icons'][product.pk in state['favorites']])
+    return mark_safe(card.replace(CSRF_PLACEHOLDER, state['csrf_input']))
@@ -0,0 +1,30 @@
+from django import template
+from django.db.models.fields.files import FieldFile
+from django.utils.html import format_html
+
+from goods.image_derivatives import get_image_derivatives
+from goods.models import ImageDerivative
+
+register = template.Library()
+
+
+@register.simple_tag(name='responsive_image', takes_context=True)
+def responsive_image(context, image: FieldFile, preset: str, width: int, height: int, alt: str = '') -> str:
+    """
+    Tag returns markup of the `image` copy for the `preset` in WebP format with JPEG fallback
+    for the browsers without WebP support. Original image is used, while copies have not been rendered yet.
+    Copies of all images on the page are taken from `image_derivatives` of the context, if the view has passed them
+    """
+    derivatives = context.get('image_derivatives') or {}
+    if image.name not in derivatives:
+        derivatives = get_image_derivatives([image.name])
+    copies = derivatives.get(image.name, {}).get(preset)
+    if not copies:
+        return format_html('<img src="{}" width="{}" height="{}" alt="{}">', image.url, width, height, alt)
+
+    return format_html(
+        '<picture><source srcset="{}" type="image/webp"><img src="{}" width="{}" height="{}" alt="{}"></picture>',
+        copies[ImageDerivative.Format.WEBP]['url'],
+        copies[ImageDerivative.Format.JPEG]['url'],
+        width, height, alt,
+    )
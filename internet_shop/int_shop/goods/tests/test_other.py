@@ -1,12 +1,28 @@
+import hashlib
 import os
 import shutil
+import json
+import tempfile
+from io import BytesIO, StringIO
 
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
 from django.test import TestCase
+from PIL import Image
 import redis
 from django.conf import settings
 from unittest.mock import patch
-from goods.filters import get_max_min_price
-from goods.models import Category, Manufacturer, Product
+from goods.filters import PRICE_HISTOGRAM_BUCKETS, compute_price_stats, get_max_min_price, get_price_stats_key
+from account.models import Profile
+from django.contrib.auth.models import User
+from goods.image_derivatives import get_image_derivatives, render_image_derivatives
+from goods.models import Category, Favorite, ImageDerivative, Manufacturer, Product, ProductPhoto, Property
+from goods.pagination import KeysetPaginator
+from goods.product_photos import get_product_photos
+from goods.search import rebuild_search_documents, search_products
+from goods.templatetags.responsive_image import responsive_image
+from goods.utils import PRODUCTS_VIEWS_KEY, PopularProducts, get_category_views_key, get_page_obj, get_keyset_page_obj
+from goods.utils import get_favorite_products_ids, get_favorites_key, get_manufacturer_facets
 from decimal import Decimal
 from random import randint
 from django.core.cache import cache
@@ -65,28 +81,244 @@ class TestOtherFunctions(TestCase):
         self.assertEqual(result[0], self.product2.price)
         self.assertEqual(result[1], self.product1.price)
 
-        max_price = cache.get(f'max_price_{self.product1.category.slug}')
-        min_price = cache.get(f'min_price_{self.product1.category.slug}')
-
-        self.assertDictEqual(max_price, {'max_price': self.product2.price})
-        self.assertDictEqual(min_price, {'min_price': self.product1.price})
+        price_stats = cache.get(get_price_stats_key(self.product1.category.slug))
+        self.assertEqual(price_stats['max_price'], self.product2.price)
+        self.assertEqual(price_stats['min_price'], self.product1.price)
 
         # if there are data in the cache before call the filter
-        cache.set(f'max_price_{self.product1.category.slug}', {'max_price': self.product2.price})
-        cache.set(f'min_price_{self.product1.category.slug}', {'min_price': self.product1.price})
+        with self.assertNumQueries(0):
+            result = get_max_min_price(self.product1.category.slug)
+        self.assertEqual(result, (self.product2.price, self.product1.price))
 
-        result = get_max_min_price(self.product1.category.slug)
-        self.assertIsInstance(result, tuple)
-        self.assertEqual(result[0], self.product2.price)
-        self.assertEqual(result[1], self.product1.price)
+    def test_compute_price_stats(self):
+        """
+        Checking bounds and histogram of effective products prices, which are computed by one query
+        """
+        Product.objects.filter(pk=self.product2.pk).update(promotional=True, promotional_price=Decimal('500.25'))
+        with self.assertNumQueries(1):
+            price_stats = compute_price_stats(self.product1.category.slug)
+
+        self.assertEqual(price_stats['min_price'], Decimal('300.25'))
+        self.assertEqual(price_stats['max_price'], Decimal('500.25'))
+        histogram = price_stats['histogram']
+        self.assertEqual(len(histogram), PRICE_HISTOGRAM_BUCKETS)
+        self.assertEqual(histogram[0], {'price_from': Decimal('300.25'), 'price_to': Decimal('320.25'),
+                                        'count': 1, 'height': 100})
+        self.assertEqual(histogram[-1]['count'], 1)  # the most expensive product is in the last range
+        self.assertEqual(sum(price_range['count'] for price_range in histogram), 2)
+
+    def test_popular_products_sequence(self):
+        """
+        Checking lazy sequence of the products sorted by descending of views, which are ranked in Redis
+        """
+        category_id = self.product1.category_id
+        self.redis.zadd(get_category_views_key(category_id), {self.product1.pk: 5, self.product2.pk: 10})
+
+        popular_products = PopularProducts(category_id=category_id)
+        self.assertEqual(len(popular_products), 2)
+        self.assertEqual(list(popular_products), [self.product2, self.product1])
+        self.assertEqual(popular_products[0], self.product2)
+        self.assertEqual(popular_products[1:], [self.product1])
+        self.assertEqual(PopularProducts(category_id=category_id, limit=1).get_ids(), [self.product2.pk])
+
+        # only products of the requested page are obtained
+        page_obj = get_page_obj(per_pages=1, page=2, queryset=popular_products)
+        self.assertEqual(page_obj.paginator.num_pages, 2)
+        self.assertEqual(page_obj.object_list, [self.product1])
+
+    def test_keyset_paginator(self):
+        """
+        Checking keyset pagination of the products by composite keys
+        """
+        paginator = KeysetPaginator(Product.available_objects.order_by('-price'), per_page=1)
+        self.assertEqual(paginator.ordering, ('-price', '-pk'))
+
+        first_page = paginator.page()
+        self.assertEqual(list(first_page), [self.product2])
+        self.assertFalse(first_page.has_previous())
+        self.assertTrue(first_page.has_next())
+
+        second_page = paginator.page(first_page.next_cursor)
+        self.assertEqual(list(second_page), [self.product1])
+        self.assertFalse(second_page.has_next())
+
+        # going back from the second page
+        self.assertEqual(list(paginator.page(second_page.previous_cursor)), [self.product2])
+
+        # wrong cursor leads to the first page
+        page_obj = get_keyset_page_obj(per_pages=1, cursor='wrong', queryset=Product.available_objects.all())
+        self.assertEqual(list(page_obj), [self.product1])
+
+    def test_search_products(self):
+        """
+        Checking search of the products by full-text search documents and trigram similarity of the name
+        """
+        self.product2.description = 'Smartphone with long battery life'
+        self.product2.save()
+        rebuild_search_documents([self.product1.pk, self.product2.pk])
+
+        # found only by description, word form differs from the description
+        self.assertEqual(list(search_products('batteries', 'en')), [self.product2])
+        # found by manufacturer name
+        self.assertEqual(list(search_products(self.product1.manufacturer.name, 'en')), [self.product1])
+
+        # found both by name, more watched product goes first
+        Product.objects.filter(pk=self.product1.pk).update(views=100)
+        self.assertEqual(list(search_products('product', 'en')), [self.product1, self.product2])
+        # product with passed id is found regardless of the query and goes first
+        self.assertEqual(list(search_products('product', 'en', products_ids=[self.product2.pk])),
+                         [self.product2, self.product1])
+        self.assertEqual(list(search_products(str(self.product2.pk), 'en', products_ids=[self.product2.pk])),
+                         [self.product2])
+
+    def test_get_manufacturer_facets(self):
+        """
+        Checking manufacturers with quantity of products, which are obtained with one query and are cached
+        until the product of the category has been changed
+        """
+        category_id = self.product1.category_id
+        products = Product.available_objects.filter(category_id=category_id)
+        with self.assertNumQueries(1):
+            manufacturers, quantities = get_manufacturer_facets(products, category_key=category_id)
+        self.assertDictEqual(quantities, {self.product1.manufacturer.name: 1, self.product2.manufacturer.name: 1})
+        self.assertEqual(set(manufacturers), {self.product1.manufacturer, self.product2.manufacturer})
+
+        with self.assertNumQueries(0):  # facets are taken from the cache
+            get_manufacturer_facets(products, category_key=category_id)
+
+        self.product2.manufacturer = self.product1.manufacturer
+        self.product2.save()
+        _manufacturers, quantities = get_manufacturer_facets(products, category_key=category_id)
+        self.assertDictEqual(quantities, {self.product1.manufacturer.name: 2})
+
+    def test_favorite_products_ids(self):
+        """
+        Checking Redis set with ids of profile's favorite products,
+        which is filled from DB once and is kept in sync, when favorites change
+        """
+        profile = Profile.objects.create(user=User.objects.create_user(username='favorites_user'))
+        favorite = Favorite.objects.create(profile=profile)
+        favorite.product.add(self.product1)
+        redis_key = get_favorites_key(profile.pk)
+        self.redis.delete(redis_key)
+
+        self.assertEqual(get_favorite_products_ids(profile.pk), {self.product1.pk})
+        with self.assertNumQueries(0):  # ids are taken from Redis
+            self.assertEqual(get_favorite_products_ids(profile.pk), {self.product1.pk})
+
+        favorite.product.add(self.product2)
+        favorite.product.remove(self.product1)
+        with self.assertNumQueries(0):
+            self.assertEqual(get_favorite_products_ids(profile.pk), {self.product2.pk})
+
+        favorite.product.clear()
+        self.assertEqual(get_favorite_products_ids(profile.pk), set())
+        with self.assertNumQueries(0):  # profile without favorites is not loaded from DB again
+            self.assertEqual(get_favorite_products_ids(profile.pk), set())
+        self.redis.delete(redis_key)
+
+    def test_get_product_photos(self):
+        """
+        Checking photos manifest of the product with dimensions and content hashes of the uploaded photos,
+        which is obtained from cache and is refreshed, when photos change
+        """
+        image_file = BytesIO()
+        Image.new('RGB', (40, 30)).save(image_file, 'PNG')
+        content = image_file.getvalue()
+        photo = ProductPhoto.objects.create(product=self.product1,
+                                            image=SimpleUploadedFile('photo.png', content, content_type='image/png'))
+        self.assertEqual((photo.width, photo.height), (40, 30))
+        self.assertEqual(photo.content_hash, hashlib.sha256(content).hexdigest())
 
-        self.assertDictEqual(max_price, {'max_price': self.product2.price})
-        self.assertDictEqual(min_price, {'min_price': self.product1.price})
+        photos = get_product_photos(self.product1.pk)
+        self.assertEqual(photos, [{
+            'name': f'products/product_{self.product1.name}/Detail_photos/photo.png',
+            'url': f'{photo.image.url}?v={photo.content_hash[:12]}',
+            'width': 40,
+            'height': 30,
+            'content_hash': photo.content_hash,
+        }])
+        with self.assertNumQueries(0):  # manifest is taken from cache
+            self.assertEqual(get_product_photos(self.product1.pk), photos)
+
+        photo.delete()
+        self.assertEqual(get_product_photos(self.product1.pk), [])
+
+    def test_render_image_derivatives(self):
+        """
+        Checking rendering of resized copies of the product image and choosing the copy by the template tag
+        """
+        image_file = BytesIO()
+        Image.new('RGBA', (600, 300)).save(image_file, 'PNG')
+        self.product1.image = SimpleUploadedFile('image.png', image_file.getvalue(), content_type='image/png')
+        self.product1.save()
+        source = self.product1.image.name
+        self.assertEqual(render_image_derivatives(source), 6)  # 3 presets in 2 formats
+
+        derivatives = get_image_derivatives([source])[source]
+        self.assertEqual(set(derivatives), {'thumbnail', 'card', 'detail'})
+        self.assertEqual((derivatives['card']['webp']['width'], derivatives['card']['webp']['height']), (200, 100))
+        self.assertEqual((derivatives['detail']['jpeg']['width'], derivatives['detail']['jpeg']['height']), (400, 200))
+        with self.assertNumQueries(0):  # copies are taken from cache
+            markup = responsive_image({}, self.product1.image, 'card', 200, 200)
+        # copies of the page images, which have been passed by the view, are not looked up again
+        with patch('goods.templatetags.responsive_image.get_image_derivatives') as mocked_get:
+            self.assertEqual(responsive_image({'image_derivatives': {source: derivatives}},
+                                              self.product1.image, 'card', 200, 200), markup)
+        mocked_get.assert_not_called()
+        self.assertIn(f'<source srcset="{derivatives["card"]["webp"]["url"]}" type="image/webp">', markup)
+        self.assertIn(f'<img src="{derivatives["card"]["jpeg"]["url"]}"', markup)
+
+        # rendering again replaces previous copies
+        self.assertEqual(render_image_derivatives(source), 6)
+        self.assertEqual(ImageDerivative.objects.filter(source=source).count(), 6)
+        shutil.rmtree(os.path.join(settings.MEDIA_ROOT, 'derivatives', f'products/product_{self.product1.name}'))
+
+    def test_import_catalog(self):
+        """
+        Checking import of the products with translated properties from JSONL feed
+        """
+        feed = [
+            {'slug': self.product1.slug, 'price': '199.99', 'available': False},
+            {'slug': 'imported-product', 'name': 'Imported product', 'category': self.product1.category.slug,
+             'manufacturer': 'imported-manufacturer', 'manufacturer_name': 'Imported manufacturer',
+             'price': '100.00', 'properties': [{
+                 'property_category': 'Display', 'property': 'Diagonal', 'numeric_value': '6.1',
+                 'translations': {'en': {'property_category_name': 'Display', 'text_value': 'Big', 'units': 'in'},
+                                  'uk': {'property_category_name': 'Дисплей', 'property_name': 'Діагональ',
+                                         'text_value': 'Великий', 'units': 'дюйм'}},
+             }]},
+        ]
+        with tempfile.NamedTemporaryFile('w', suffix='.jsonl', encoding='utf-8', delete=False) as file:
+            file.write('\n'.join(json.dumps(product, ensure_ascii=False) for product in feed))
+        call_command('import_catalog', file.name, stdout=StringIO())
+
+        self.product1.refresh_from_db()
+        self.assertEqual(self.product1.price, Decimal('199.99'))
+        self.assertFalse(self.product1.available)
+        self.assertEqual(self.product1.name, f'Product_{self.random_number}')  # not passed, not changed
+
+        product = Product.objects.get(slug='imported-product')
+        self.assertEqual(product.manufacturer.name, 'Imported manufacturer')
+        prop = Property.objects.get(product=product)
+        self.assertEqual(prop.numeric_value, Decimal('6.1'))
+        self.assertEqual((prop.safe_translation_getter('name', language_code='en'),
+                          prop.safe_translation_getter('text_value', language_code='uk')), ('Diagonal', 'Великий'))
+        self.assertIn(product.category, prop.category_property.product_categories.all())
+
+        # import is idempotent
+        call_command('import_catalog', file.name, stdout=StringIO())
+        self.assertEqual(Property.objects.filter(product=product).count(), 1)
+        self.assertEqual(Product.objects.filter(slug='imported-product').count(), 1)
+        os.remove(file.name)
+        shutil.rmtree(os.path.join(settings.MEDIA_ROOT, 'products/product_Imported product'))
 
     def tearDown(self) -> None:
         # deleting product directory from media root
         shutil.rmtree(os.path.join(settings.MEDIA_ROOT, f'products/product_{self.product1.name}'))
         shutil.rmtree(os.path.join(settings.MEDIA_ROOT, f'products/product_{self.product2.name}'))
 
-        cache.delete(f'max_price_{self.product1.category.slug}')
-        cache.delete(f'min_price_{self.product1.category.slug}')
+        cache.delete(get_price_stats_key(self.product1.category.slug))
+
+        self.redis.delete(get_category_views_key(self.product1.category_id))
+        self.redis.zrem(PRODUCTS_VIEWS_KEY, self.product1.pk, self.product2.pk)
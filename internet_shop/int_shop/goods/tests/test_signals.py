@@ -6,11 +6,29 @@ from unittest.mock import patch
 
 import redis
 from django.conf import settings
+from django.contrib.auth.models import User
 from django.core.cache import cache
-from django.db.models.signals import post_delete, post_save
+from django.db.models.signals import post_delete
 from django.test import TestCase
 
-from goods.models import Product, Category, Manufacturer, PropertyCategory, Property
+from account.models import Profile
+from common.media_cleanup import MEDIA_CLEANUP_PATHS_KEY
+from common.tasks import cleanup_media
+from goods.catalog_generations import (
+    CATALOG_GENERATIONS_KEY,
+    CATALOG_MODIFIED_KEY,
+    get_catalog_generation,
+    get_product_generation_field,
+)
+from goods.comment_rating import toggle_comment_rating
+from goods.filters import compute_price_stats, get_price_stats_key
+from goods.models import Product, Category, Comment, Manufacturer, PropertyCategory, Property, PropertyFacet
+from goods.property_filters import (
+    get_category_facets_indexed_key,
+    get_not_indexed_categories,
+    get_property_for_category,
+)
+from goods.tasks import refresh_categories_price_stats
 
 
 class TestGoodsSignals(TestCase):
@@ -50,105 +68,164 @@ class TestGoodsSignals(TestCase):
         redis_patcher = patch('common.moduls_init.redis', redis_instance)
         self.redis = redis_patcher.start()
 
-    def test_invalidate_prices_cache(self):
+    def test_refresh_price_stats_cache(self):
         """
-        Checking signal, that invalidates cache of maximum and minimum price
-        for product category, when adding the new product or deleting the existing product
+        Checking signal, that refreshes cached price statistics of the product category in background,
+        when adding the new product or deleting the existing product
         """
-        # set data in cache
-        cache.set_many({f'max_price_{self.category_1.slug}': {'max_price': self.product1.price},
-                        f'min_price_{self.category_1.slug}': {'min_price': self.product1.price}})
-        # check whether data are in cache
-        self.assertEqual(cache.get(f'max_price_{self.category_1.slug}'), {'max_price': self.product1.price})
-        self.assertEqual(cache.get(f'min_price_{self.category_1.slug}'), {'min_price': self.product1.price})
+        cache.set(get_price_stats_key(self.category_1.slug), compute_price_stats(self.category_1.slug))
 
         self.product2 = Product(name=f'Product_{self.random_number + 1}',
                                 slug=f'product_{self.random_number + 1}',
                                 manufacturer=self.manufacturer1,
-                                price=Decimal('300.25'),
+                                price=Decimal('500.25'),
                                 description='Description',
                                 category=self.category_1)
 
-        # simulate connecting the signal with transmitter of this signal
-        with patch('goods.signals.invalidate_prices_cache', autospec=True) as mocked_handler:
-            post_save.connect(mocked_handler, sender=Product)
-            self.product2.save()  # action that leading to the signal sendr
+        with patch('goods.signals.refresh_categories_price_stats.delay') as mocked_delay:
+            with self.captureOnCommitCallbacks(execute=True):
+                self.product2.save()
+        mocked_delay.assert_called_once_with([self.category_1.pk])
+        # previous statistics are served, until they have been refreshed
+        self.assertEqual(cache.get(get_price_stats_key(self.category_1.slug))['max_price'], self.product1.price)
 
-        # number of callings of the signal must be not greater than 1
-        self.assertEqual(mocked_handler.call_count, 1)
-        cache_after_test = cache.get_many(f'max_price_{self.product2.category.slug}',
-                                          f'min_price_{self.product2.category.slug}')
-        self.assertFalse(cache_after_test)  # must be nothing
-        shutil.rmtree(os.path.join(settings.MEDIA_ROOT, f'products/product_{self.product2.name}'))
-        self.redis.srem('products_ids', self.product2.pk)
-
-        # set data in cache
-        cache.set_many({f'max_price_{self.category_1.slug}': {'max_price': self.product1.price},
-                        f'min_price_{self.category_1.slug}': {'min_price': self.product1.price}})
-
-        self.product2 = Product(name=f'Product_{self.random_number + 2}',
-                                slug=f'product_{self.random_number + 2}',
-                                manufacturer=self.manufacturer1,
-                                price=Decimal('300.25'),
-                                description='Description',
-                                category=self.category_1)
-        self.product2.save()
+        refresh_categories_price_stats([self.category_1.pk])
+        self.assertEqual(cache.get(get_price_stats_key(self.category_1.slug))['max_price'], self.product2.price)
 
-        # simulate connecting the signal with transmitter of this signal
-        with patch('goods.signals.invalidate_prices_cache', autospec=True) as mocked_handler:
-            post_delete.connect(mocked_handler, sender=Product)
-            self.redis.srem('product_ids', self.product2.pk)
-            self.product2.delete()  # action that leading to the signal send
+        with patch('goods.signals.refresh_categories_price_stats.delay') as mocked_delay:
+            with self.captureOnCommitCallbacks(execute=True):
+                self.redis.srem('products_ids', self.product2.pk)
+                self.product2.delete()
+        mocked_delay.assert_called_once_with([self.category_1.pk])
 
-        # number of callings of the signal must be not greater than 1
-        self.assertEqual(mocked_handler.call_count, 1)
-        cache_after_test = cache.get_many(f'max_price_{self.product2.category.slug}',
-                                          f'min_price_{self.product2.category.slug}')
-        self.assertFalse(cache_after_test)  # must be nothing
+        refresh_categories_price_stats([self.category_1.pk])
+        self.assertEqual(cache.get(get_price_stats_key(self.category_1.slug))['max_price'], self.product1.price)
+        cache.delete(get_price_stats_key(self.category_1.slug))
 
-    def test_invalidate_properties_cache(self):
+    def test_update_property_facets(self):
         """
-        Checking signal, that invalidates cache for storage with queryset with product properties,
-        when create or delete the product property or product category
+        Checking signals, that update properties facets index of the product category,
+        when create, delete the product property or change product availability
         """
-        cache.set(f'category_{self.category_1.slug}_props', [self.property1])  # initial cache value
-
         # calling the signal while creating new property
-        with patch('goods.signals.invalidate_properties_cache', autospec=True) as mocked_handler:
-            post_save.connect(mocked_handler, sender=Property)
-            self.property2 = Property(name='Diagonal',
-                                      numeric_value=Decimal('15.6'),
-                                      category_property=self.property_category,
-                                      product=self.product1)
-            self.property2.save()
-        # number of callings of the signal must be not greater than 1
-        self.assertEqual(mocked_handler.call_count, 1)
-        cache_after_test = cache.get(f'category_{self.category_1.slug}_props')
-        self.assertIsNone(cache_after_test)  # must be empty value
+        with self.captureOnCommitCallbacks(execute=True):
+            self.property2 = Property.objects.create(name='Diagonal',
+                                                     numeric_value=Decimal('15.6'),
+                                                     category_property=self.property_category,
+                                                     product=self.product1)
 
-        cache.set(f'category_{self.category_1.slug}_props', [self.property2])  # initial cache value
+        facets = PropertyFacet.objects.filter(category=self.category_1, language_code='en')
+        self.assertEqual(sorted(facet.name for facet in facets), ['Color', 'Diagonal'])
+        self.assertEqual([facet.product_ids for facet in facets], [[self.product1.pk], [self.product1.pk]])
 
         # calling the signal while deleting property
-        with patch('goods.signals.invalidate_properties_cache', autospec=True) as mocked_handler:
-            post_delete.connect(mocked_handler, sender=Property)
+        with self.captureOnCommitCallbacks(execute=True):
             self.property1.delete()
 
-        # number of callings of the signal must be not greater than 1
-        self.assertEqual(mocked_handler.call_count, 1)
-        cache_after_test = cache.get(f'category_{self.category_1.slug}_props')
-        self.assertIsNone(cache_after_test)  # must be empty value
+        facets = PropertyFacet.objects.filter(category=self.category_1, language_code='en')
+        self.assertEqual([facet.name for facet in facets], ['Diagonal'])
 
-        cache.set(f'category_{self.category_1.slug}_props', [self.property1])
+        # calling the signal while product becomes unavailable
+        with self.captureOnCommitCallbacks(execute=True):
+            self.product1.available = False
+            self.product1.save()
 
-        # calling the signal while deleting product category
-        with patch('goods.signals.invalidate_properties_cache', autospec=True) as mocked_handler:
-            post_delete.connect(mocked_handler, sender=Category)
-            self.category_1.delete()
+        self.assertFalse(PropertyFacet.objects.filter(category=self.category_1).exists())
 
-        # number of callings of the signal must be not greater than 1
-        self.assertEqual(mocked_handler.call_count, 1)
-        cache_after_test = cache.get(f'category_{self.category_1.slug}_props')
-        self.assertIsNone(cache_after_test)  # must be empty value
+        # indexed category without facets is read as empty, facets aren't rebuilt while reading
+        self.assertEqual(get_not_indexed_categories([self.category_1.pk]), [])
+        with patch('goods.property_filters.rebuild_category_facets') as rebuild:
+            self.assertEqual(get_property_for_category(self.category_1, language_code='en'), {})
+            rebuild.assert_not_called()
+        cache.delete(get_category_facets_indexed_key(self.category_1.pk))
+
+    def test_update_property_facets_once_per_transaction(self):
+        """
+        Checking that facets of the category are rebuilt once for all properties changed in the transaction,
+        that deleting of the property translation updates facets, and that not indexed category is indexed
+        on the first read
+        """
+        with patch('goods.property_filters._rebuild_category_facets') as rebuild, \
+                self.captureOnCommitCallbacks(execute=True):
+            for name in ('Diagonal', 'Resolution'):
+                Property.objects.create(name=name, numeric_value=Decimal('15.6'),
+                                        category_property=self.property_category, product=self.product1)
+        rebuild.assert_called_once_with(self.category_1.pk)
+
+        self.property_category.set_current_language('uk')
+        self.property_category.name = 'Категорія'
+        self.property_category.save()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.property1.set_current_language('uk')
+            self.property1.name = 'Колір'
+            self.property1.save()
+        self.assertTrue(PropertyFacet.objects.filter(category=self.category_1, language_code='uk').exists())
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.property1.delete_translation('uk')
+        self.assertFalse(PropertyFacet.objects.filter(category=self.category_1, language_code='uk').exists())
+
+        PropertyFacet.objects.filter(category=self.category_1).delete()
+        cache.delete(get_category_facets_indexed_key(self.category_1.pk))
+        get_property_for_category(self.category_1, language_code='en')
+        self.assertTrue(PropertyFacet.objects.filter(category=self.category_1, language_code='en').exists())
+        self.assertEqual(get_not_indexed_categories([self.category_1.pk]), [])
+        cache.delete(get_category_facets_indexed_key(self.category_1.pk))
+
+    def test_update_comments_rating(self):
+        """
+        Checking signal, that recomputes stored numbers of likes and dislikes of the comment,
+        when its likes or dislikes have been changed through M2M managers
+        """
+        profile = Profile.objects.create(user=User.objects.create_user(username='rating_user'))
+        comment = Comment.objects.create(product=self.product1, profile=profile, user_name='Name', body='Body')
+
+        comment.profiles_likes.add(profile)
+        profile.comments_unliked.add(comment)
+        comment.refresh_from_db()
+        self.assertEqual((comment.likes_count, comment.unlikes_count), (1, 1))
+
+        profile.comments_liked.clear()
+        comment.profiles_unlikes.remove(profile)
+        comment.refresh_from_db()
+        self.assertEqual((comment.likes_count, comment.unlikes_count), (0, 0))
+
+        # toggling of the rating changes numbers without M2M managers
+        self.assertEqual(toggle_comment_rating(comment.pk, profile.pk, 'like'), (1, 0))
+        self.assertEqual(toggle_comment_rating(comment.pk, profile.pk, 'unlike'), (0, 1))
+        self.assertEqual(toggle_comment_rating(comment.pk, profile.pk, 'unlike'), (0, 0))
+
+        # likes and dislikes of the deleted profile are deleted by cascade without M2M signals
+        rating_profile = Profile.objects.create(user=User.objects.create_user(username='deleted_rating_user'))
+        comment.profiles_likes.add(rating_profile)
+        other_comment = Comment.objects.create(product=self.product1, profile=profile, user_name='Name', body='Body')
+        other_comment.profiles_unlikes.add(rating_profile)
+        rating_profile.delete()
+        comment.refresh_from_db()
+        other_comment.refresh_from_db()
+        self.assertEqual((comment.likes_count, comment.unlikes_count), (0, 0))
+        self.assertEqual((other_comment.likes_count, other_comment.unlikes_count), (0, 0))
+
+    def test_delete_product_catalog_generation(self):
+        """
+        Checking signal, which increments generation of the changed product and deletes generation
+        of the deleted product, and that reading of the generation writes nothing
+        """
+        field = get_product_generation_field(self.product1.pk)
+        with patch('goods.signals.refresh_categories_price_stats.delay'), self.captureOnCommitCallbacks(execute=True):
+            self.product1.save()
+        self.assertTrue(self.redis.hexists(CATALOG_GENERATIONS_KEY, field))
+        self.assertTrue(self.redis.hexists(CATALOG_MODIFIED_KEY, field))
+
+        with patch('goods.signals.refresh_categories_price_stats.delay'), \
+                patch('common.tasks.cleanup_media.apply_async'), self.captureOnCommitCallbacks(execute=True):
+            self.product1.delete()
+        self.assertFalse(self.redis.hexists(CATALOG_GENERATIONS_KEY, field))
+        self.assertFalse(self.redis.hexists(CATALOG_MODIFIED_KEY, field))
+
+        # generation of unknown product is 0 and is not stored
+        self.assertTrue(get_catalog_generation(field)[0].endswith(f'.{field}.0'))
+        self.assertFalse(self.redis.hexists(CATALOG_MODIFIED_KEY, field))
 
     def test_delete_product_images_folder(self):
         """
@@ -158,13 +235,20 @@ class TestGoodsSignals(TestCase):
         self.redis.sadd('products_ids', self.product1.pk)
         product_id = self.product1.pk  # save product id, that to be removed
 
-        with patch('goods.signals.delete_product_images_folder', autospec=True) as mocked_handler:
+        with patch('goods.signals.delete_product_images_folder', autospec=True) as mocked_handler, \
+                patch('common.tasks.cleanup_media.apply_async'), self.captureOnCommitCallbacks(execute=True):
             post_delete.connect(mocked_handler, sender=Product)
             self.product1.delete()
 
         # number of callings of the signal must be not greater than 1
         self.assertEqual(mocked_handler.call_count, 1)
         self.assertFalse(self.redis.sismember('products_ids', product_id))  # must be no product id in redis set
+        # directory is queued for deletion by worker
+        self.assertIn(os.path.join(settings.MEDIA_ROOT, f'products/product_{self.product1.name}').encode(),
+                      self.redis.smembers(MEDIA_CLEANUP_PATHS_KEY))
+        self.assertIn(f'product_{self.product1.name}', os.listdir(os.path.join(settings.MEDIA_ROOT, 'products/')))
+
+        cleanup_media()
         self.assertNotIn(f'product_{self.product1.name}',
                          os.listdir(os.path.join(settings.MEDIA_ROOT, 'products/')))
 
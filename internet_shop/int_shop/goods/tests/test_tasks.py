@@ -0,0 +1,102 @@
+import os
+import shutil
+from decimal import Decimal
+from random import randint
+
+from django.conf import settings
+from django.test import TestCase
+
+from common.moduls_init import redis
+from goods.models import Category, Manufacturer, Product, ProductStarCount
+from goods.product_cards import get_product_cards
+from goods.product_rating import PRODUCTS_RATING_BUFFER_KEY, add_product_vote, get_star_counts
+from goods.tasks import (
+    flush_products_rating,
+    flush_products_views,
+    PRODUCTS_RATING_FLUSHING_KEY,
+    PRODUCTS_VIEWS_FLUSHING_KEY,
+)
+from goods.utils import PRODUCTS_VIEWS_BUFFER_KEY
+
+
+class TestGoodsTasks(TestCase):
+    """
+    Testing celery tasks
+    """
+
+    def setUp(self) -> None:
+        settings.CELERY_TASK_ALWAYS_EAGER = True
+        self.random_number = randint(1, 50)
+        category = Category.objects.create(name=f'Category_{self.random_number}',
+                                           slug=f'category-{self.random_number}')
+
+        manufacturer = Manufacturer.objects.create(name=f'Manufacturer_{self.random_number}',
+                                                   slug=f'manufacturer_{self.random_number}',
+                                                   description='Description')
+
+        self.product1 = Product.objects.create(name=f'Product_{self.random_number}',
+                                               slug=f'product_{self.random_number}',
+                                               manufacturer=manufacturer,
+                                               price=Decimal('300.25'),
+                                               description='Description',
+                                               category=category,
+                                               views=10)
+
+        self.product2 = Product.objects.create(name=f'Product_{self.random_number + 1}',
+                                               slug=f'product_{self.random_number + 1}',
+                                               manufacturer=manufacturer,
+                                               price=Decimal('650.45'),
+                                               description='Description',
+                                               category=category)
+
+    def test_flush_products_views(self):
+        """
+        Checking adding buffered products views to products views in DB
+        """
+        redis.delete(PRODUCTS_VIEWS_BUFFER_KEY, PRODUCTS_VIEWS_FLUSHING_KEY)
+        self.assertEqual(flush_products_views.delay().get(), 'No views to flush')
+
+        redis.hset(PRODUCTS_VIEWS_BUFFER_KEY, mapping={self.product1.pk: 5, self.product2.pk: 2})
+        result = flush_products_views.delay().get()
+        self.assertEqual(result, 'Views of 2 products have been flushed')
+
+        self.product1.refresh_from_db()
+        self.product2.refresh_from_db()
+        self.assertEqual(self.product1.views, 15)
+        self.assertEqual(self.product2.views, 2)
+        # buffer must be empty after flushing
+        self.assertFalse(redis.exists(PRODUCTS_VIEWS_BUFFER_KEY, PRODUCTS_VIEWS_FLUSHING_KEY))
+
+    def test_flush_products_rating(self):
+        """
+        Checking adding buffered products votes to numbers of votes in DB and recomputing of products rating
+        """
+        redis.delete(PRODUCTS_RATING_BUFFER_KEY, PRODUCTS_RATING_FLUSHING_KEY)
+        self.assertEqual(flush_products_rating.delay().get(), 'No votes to flush')
+
+        ProductStarCount.objects.create(product=self.product1, star=5, count=1)
+        for star in (3, 5, 2):
+            add_product_vote(self.product1.pk, star)
+        add_product_vote(self.product2.pk, 4)
+        card = get_product_cards([self.product2], 'en')[self.product2.pk]  # card without rating is cached
+        self.assertNotIn('checked', card)
+        # buffered votes are counted before flushing
+        self.assertEqual(get_star_counts(self.product1.pk), {1: 0, 2: 1, 3: 1, 4: 0, 5: 2})
+
+        result = flush_products_rating.delay().get()
+        self.assertEqual(result, 'Votes of 2 products have been flushed')
+        self.assertEqual(get_star_counts(self.product1.pk), {1: 0, 2: 1, 3: 1, 4: 0, 5: 2})
+        self.assertEqual(dict(self.product1.star_counts.values_list('star', 'count')), {2: 1, 3: 1, 5: 2})
+
+        self.product1.refresh_from_db()
+        self.product2.refresh_from_db()
+        self.assertEqual(self.product1.rating, Decimal('3.8'))  # (2 + 3 + 5 * 2) / 4
+        self.assertEqual(self.product2.rating, Decimal('4.0'))
+        # cached card is rendered again with the new rating
+        self.assertEqual(get_product_cards([self.product2], 'en')[self.product2.pk].count('fa fa-star checked'), 4)
+        self.assertFalse(redis.exists(PRODUCTS_RATING_BUFFER_KEY, PRODUCTS_RATING_FLUSHING_KEY))
+
+    def tearDown(self) -> None:
+        for product in (self.product1, self.product2):
+            redis.srem('products_ids', product.pk)
+            shutil.rmtree(os.path.join(settings.MEDIA_ROOT, f'products/product_{product.name}'), ignore_errors=True)
@@ -5,6 +5,7 @@ from random import randint
 
 from django.conf import settings
 from django.contrib.auth.models import User
+from django.core.cache import cache
 from django.http import QueryDict
 from django.shortcuts import reverse
 from django.template import Template, Context
@@ -19,6 +20,7 @@ from goods.models import (
     Property,
     Favorite
 )
+from goods.product_cards import get_product_card_key
 from goods.views import ProductListView
 
 
@@ -190,6 +192,32 @@ class TestTemplatetagsGoods(TestCase):
 
         self.assertEqual(template.render(context), '?page=1?page=2?page=3')
 
+    def test_product_card_tag(self):
+        """
+        Checking custom tag, which returns cached product card markup
+        with favorite icon and CSRF token of the current user
+        """
+        self.profile.profile_favorite.product.add(self.product2)
+        request = RequestFactory().get(reverse('goods:product_list'))
+        template = Template('{% load product_card %}'
+                            '{% for product in products %}{% product_card product %}{% endfor %}')
+        context = Context({'products': [self.product1, self.product2],
+                           'favorites': {self.product2.pk},
+                           'request': request})
+
+        result = template.render(context)
+        self.assertEqual(result.count('bi-heart-fill'), 1)  # only product2 is in the favorite
+        self.assertEqual(result.count('name="csrfmiddlewaretoken"'), 2)
+        # cards are cached without user-specific markup
+        card = cache.get(get_product_card_key(self.product1.pk, 'en'))
+        self.assertIn(self.product1.name, card)
+        self.assertNotIn('csrfmiddlewaretoken', card)
+
+        # changing the product invalidates its card
+        self.product1.price = Decimal('200.00')
+        self.product1.save()
+        self.assertIsNone(cache.get(get_product_card_key(self.product1.pk, 'en')))
+
     def tearDown(self) -> None:
         # deleting product directory from media root
         shutil.rmtree(os.path.join(settings.MEDIA_ROOT, f'products/product_{self.product1.name}'))
@@ -37,6 +37,10 @@ from goods.models import (
     Property,
     PropertyCategory
 )
+from goods.product_pages import CART_PANEL_PLACEHOLDER, CAPTCHA_PLACEHOLDER, CSRF_TOKEN_PLACEHOLDER
+from goods.product_rating import PRODUCTS_RATING_BUFFER_KEY, get_star_counts
+from goods.property_filters import rebuild_category_facets
+from goods.utils import PRODUCTS_VIEWS_KEY, get_category_views_key
 from goods.views import ProductListView, ProductDetailView, FilterResultsView
 
 
@@ -153,7 +157,7 @@ class TestProductListView(TestCase):
             elif key == 'manufacturers_prod_qnty':
                 self.assertEqual(value, {self.product1.manufacturer.name: 1})
             elif key == 'favorites':
-                self.assertEqual(list(value), [self.product1])
+                self.assertEqual(value, {self.product1.pk})  # ids of favorite products
             elif key == 'sorting_by_price':
                 self.assertIsInstance(value, SortByPriceForm)
             elif key == 'search_form':
@@ -191,7 +195,7 @@ class TestProductListView(TestCase):
             elif key == 'manufacturers_prod_qnty':
                 self.assertEqual(value, {self.product1.manufacturer.name: 1})
             elif key == 'favorites':
-                self.assertEqual(list(value), [self.product1])
+                self.assertEqual(value, {self.product1.pk})  # ids of favorite products
             elif key == 'sorting_by_price':
                 self.assertIsInstance(value, SortByPriceForm)
             elif key == 'search_form':
@@ -233,9 +237,9 @@ class TestProductListView(TestCase):
         Checking the get method, if there was a search request
         """
 
-        # set number of product's views in redis
-        self.redis.hset(f'product_id:{self.product1.pk}', 'views', '5')
-        self.redis.hset(f'product_id:{self.product2.pk}', 'views', '10')
+        # set number of product's views
+        Product.objects.filter(pk=self.product1.pk).update(views=5)
+        Product.objects.filter(pk=self.product2.pk).update(views=10)
 
         # search request with "product" word
         request = self.factory.get(reverse('goods:product_list'), data={'query': 'product'})
@@ -252,9 +256,9 @@ class TestProductListView(TestCase):
         """
         Checking correspondence of the search results
         """
-        # set number of product's views in redis
-        self.redis.hset(f'product_id:{self.product1.pk}', 'views', '5')
-        self.redis.hset(f'product_id:{self.product2.pk}', 'views', '10')
+        # set number of product's views
+        Product.objects.filter(pk=self.product1.pk).update(views=5)
+        Product.objects.filter(pk=self.product2.pk).update(views=10)
 
         # if category_slug was passed
         result = self.instance._get_query_results(query='product', category_slug=f'category-{self.random_number}')
@@ -276,6 +280,7 @@ class TestProductListView(TestCase):
         self.assertEqual(self.instance.profile, self.guest_profile)  # must be a guest_user
 
         self.request.user = self.user  # user is authenticated
+        del self.request.profile  # profile is resolved once per request
         self.instance.dispatch(self.request)
         self.assertEqual(self.instance.profile, self.profile)  # must be a default profile
 
@@ -445,6 +450,7 @@ class TestProductDetailView(TestCase):
         self.assertEqual(self.instance.profile, self.guest_profile)  # must be a guest_user
 
         request.user = self.user  # user is authenticated
+        del request.profile  # profile is resolved once per request
         self.instance.dispatch(request)
         self.assertEqual(self.instance.profile, self.profile)  # must be a default profile
 
@@ -467,6 +473,35 @@ class TestProductDetailView(TestCase):
         self.assertTrue(expired_time <= 604800 and expired_time != -1)  # must not be -1 (key has no expire time)
         self.assertEqual(products_viewers, set(f'{self.profile.pk}'))  # only default user "watched" the product
 
+    def test_get_cached_guest_page(self):
+        """
+        Checking that detail page of the guest is obtained from cache with his CSRF token and captcha,
+        and it is outdated, when comment has been added to the product
+        """
+        url = reverse('goods:product_detail', args=(self.product1.pk, self.product1.slug))
+        self.client.get(url)
+        Product.objects.filter(pk=self.product1.pk).update(name='Changed name')  # without signals
+
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        content = response.content.decode()
+        self.assertIn(self.product1.name, content)  # page has been obtained from cache
+        self.assertNotIn('Changed name', content)
+        for placeholder in (CSRF_TOKEN_PLACEHOLDER, CAPTCHA_PLACEHOLDER, CART_PANEL_PLACEHOLDER):
+            self.assertNotIn(placeholder, content)
+        self.assertIn('cart-panel', content)
+        # views of the cached page are counted as well
+        self.assertEqual(self.redis.hget(f'product_id:{self.product1.pk}', 'views'), '2')
+
+        Comment.objects.create(product=self.product1,
+                               profile=self.guest_profile,
+                               user_name='Guest',
+                               user_email='guest@example.com',
+                               body='Body of new comment')
+        response = self.client.get(url)
+        self.assertIn('Changed name', response.content.decode())
+        Product.objects.filter(pk=self.product1.pk).update(name=self.product1.name)  # for deleting of directory
+
     def test_set_like_dislike_comment(self):
         """
         Checking setting like/dislike to comment, using AJAX request
@@ -679,6 +714,9 @@ class TestFilterResultsView(TestCase):
                                                  category_property=self.property_category2,
                                                  product=self.product4)
 
+        for category in (self.category_1, self.category_2):  # facets are built by signals after commit
+            rebuild_category_facets(category.pk)
+
         self.instance = FilterResultsView()
 
     def test_filtering_products_process_by_passed_parameters(self):
@@ -863,15 +901,6 @@ class TestOtherGoodsViews(TestCase):
     Testing other views of the goods application
     """
 
-    @property
-    def populars(self):
-        return self._popular_list
-
-    @populars.setter
-    def populars(self, value):
-        if isinstance(value, list):
-            self._popular_list = value
-
     @property
     def new(self):
         return self._new_list
@@ -884,7 +913,6 @@ class TestOtherGoodsViews(TestCase):
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
         # storage for previous data in redis before the test being start
-        self._popular_list = []
         self._new_list = []
 
     def __iter__(self):
@@ -1180,14 +1208,8 @@ class TestOtherGoodsViews(TestCase):
         # add views for each product to redis -> 5, 10, 15 views
         for product, views in zip(self, (v for v in (5, 10, 15))):
             self.redis.hset(f'product_id:{product.pk}', 'views', views)
-
-        try:
-            self.populars = self.redis.hget('popular_prods', 'ids').split(',')  # might be empty
-        except AttributeError:
-            pass
-
-        # set products as populars, adding products ids to redis to "popular_prods" hash name
-        self.redis.hset('popular_prods', 'ids', ','.join(str(product.pk) for product in self))
+            self.redis.zadd(PRODUCTS_VIEWS_KEY, {product.pk: views})
+            self.redis.zadd(get_category_views_key(product.category_id), {product.pk: views})
 
         # request without passing category
         response = self.client.get(reverse('goods:popular_list'))
@@ -1442,15 +1464,8 @@ class TestOtherGoodsViews(TestCase):
         # add views for each product to redis -> 10, 5, 15 views
         for product, views in zip(self, (v for v in (10, 5, 15))):
             self.redis.hset(f'product_id:{product.pk}', 'views', views)
-
-        # save to property existing records in redis from "popular_prods" hash name
-        try:
-            self.populars = self.redis.hget('popular_prods', 'ids').split(',')  # might be empty
-        except AttributeError:
-            pass
-
-        # set products as populars, adding products ids to redis to "popular_prods" hash name
-        self.redis.hset('popular_prods', 'ids', ','.join(str(product.pk) for product in self))
+            self.redis.zadd(PRODUCTS_VIEWS_KEY, {product.pk: views})
+            self.redis.zadd(get_category_views_key(product.category_id), {product.pk: views})
 
         # sorting products ascending
         response = self.client.get(reverse('goods:product_ordering',
@@ -1747,15 +1762,8 @@ class TestOtherGoodsViews(TestCase):
         # add views for each product to redis -> 10, 5, 15 views
         for product, views in zip(self, (v for v in (10, 5, 15))):
             self.redis.hset(f'product_id:{product.pk}', 'views', views)
-
-        # save to property existing records in redis from "popular_prods" hash name
-        try:
-            self.populars = self.redis.hget('popular_prods', 'ids').split(',')  # might be empty
-        except AttributeError:
-            pass
-
-        # set products as populars, adding products ids to redis to "popular_prods" hash name
-        self.redis.hset('popular_prods', 'ids', ','.join(str(product.pk) for product in self))
+            self.redis.zadd(PRODUCTS_VIEWS_KEY, {product.pk: views})
+            self.redis.zadd(get_category_views_key(product.category_id), {product.pk: views})
 
         # sorting products ascending
         response = self.client.get(reverse('goods:product_ordering',
@@ -2068,6 +2076,7 @@ class TestOtherGoodsViews(TestCase):
         """
         Checking how setting product rating
         """
+        self.redis.delete(PRODUCTS_RATING_BUFFER_KEY)
         response = self.client.post(reverse('goods:set_product_rating'),
                                     data={'product_id': self.product1.pk, 'star': 3},
                                     **{'HTTP_X-REQUESTED-WITH': 'XMLHttpRequest'})
@@ -2090,7 +2099,15 @@ class TestOtherGoodsViews(TestCase):
                                     **{'HTTP_X-REQUESTED-WITH': 'XMLHttpRequest'})
 
         response_content = json.loads(response.content)
-        self.assertEqual(response_content['current_rating'], '3.0')
+        self.assertEqual(response_content['current_rating'], '3.3')  # (3 + 5 + 2) / 3
+
+        # star out of the rating scale is not counted
+        response = self.client.post(reverse('goods:set_product_rating'),
+                                    data={'product_id': self.product1.pk, 'star': 6},
+                                    **{'HTTP_X-REQUESTED-WITH': 'XMLHttpRequest'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(get_star_counts(self.product1.pk), {1: 0, 2: 1, 3: 1, 4: 0, 5: 1})
+        self.redis.delete(PRODUCTS_RATING_BUFFER_KEY)
 
     def tearDown(self) -> None:
         # deleting product directory from media root
@@ -2102,11 +2119,8 @@ class TestOtherGoodsViews(TestCase):
         for product in self:
             self.redis.srem('products_ids', product.pk)
             self.redis.hdel(f'product_id:{product.pk}', 'views')
-
-        if self.populars:
-            # restore previous popular products ids
-            self.redis.hset('popular_prods', 'ids', ','.join(self.populars))
-            self.populars.clear()
+            self.redis.zrem(PRODUCTS_VIEWS_KEY, product.pk)
+            self.redis.zrem(get_category_views_key(product.category_id), product.pk)
 
         if self.new:
             # restore previous new products ids
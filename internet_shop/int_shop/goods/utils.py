@@ -1,11 +1,28 @@
 from decimal import Decimal
-from typing import Union, Generator, Tuple
+from hashlib import md5
+from typing import Union, Iterable, Iterator, List, Tuple, Dict, Set
+from uuid import uuid4
 
+from django.core.cache import cache
 from django.core.paginator import Paginator, PageNotAnInteger, EmptyPage, Page
-from django.db.models import QuerySet
+from django.db.models import Count, Q, QuerySet
 
 from common.moduls_init import redis
-from goods.models import Manufacturer, Product
+from goods.models import Favorite, Manufacturer, Product
+from goods.pagination import KeysetPage, KeysetPaginator, InvalidCursor
+
+PRODUCTS_VIEWS_KEY = 'products_views'  # Redis sorted set with views of all products
+# Redis hash with products views, which have not been flushed to DB yet
+PRODUCTS_VIEWS_BUFFER_KEY = 'products_views_buffer'
+
+MANUFACTURER_FACETS_ALL = 'all'  # category key of manufacturer facets for listings of all categories
+# version of all manufacturer facets, which is changed, when any manufacturer has been changed
+MANUFACTURER_FACETS_GENERATION_KEY = 'manufacturer_facets:generation'
+MANUFACTURER_FACETS_TIMEOUT = 60 * 60 * 24
+
+# member of Redis set with favorite products, which marks set of the profile without favorites as loaded
+FAVORITES_EMPTY_MEMBER = -1
+FAVORITES_TIMEOUT = 60 * 60 * 24 * 7
 
 
 def distribute_properties_from_request(properties: list) -> dict:
@@ -46,47 +63,197 @@ def get_page_obj(per_pages: int, page: int, queryset: Union[QuerySet, list]) ->
     return page_obj
 
 
-def get_collections_with_manufacturers_info(qs: QuerySet) -> Generator[Union[QuerySet, dict], None, None]:
+def get_keyset_page_obj(per_pages: int, cursor: Union[str, None], queryset: Union[QuerySet, list]) -> KeysetPage:
+    """
+    Returns page object of keyset pagination.
+    `per_pages` -> number of products per page;
+    `cursor` -> position of the current page, the first page is returned for empty or wrong cursor;
+    `queryset` -> ordered queryset of the products, which have to display on all pages
+    """
+    p = KeysetPaginator(queryset, per_pages)
+
+    try:
+        page_obj = p.page(cursor)
+    except InvalidCursor:
+        page_obj = p.page()
+
+    return page_obj
+
+
+def get_manufacturer_facets_version_key(category_key: Union[int, str]) -> str:
+    """
+    Returns cache key of the version of manufacturer facets for the category with `category_key`
+    (either category id or "all" for listings of all categories)
+    """
+    return f'manufacturer_facets:{category_key}:version'
+
+
+def invalidate_manufacturer_facets(*category_ids: int) -> None:
+    """
+    Makes cached manufacturer facets of the categories with `category_ids`
+    and of listings of all categories outdated by changing their versions
+    """
+    cache.set_many({get_manufacturer_facets_version_key(key): uuid4().hex
+                    for key in (*category_ids, MANUFACTURER_FACETS_ALL)}, None)
+
+
+def invalidate_all_manufacturer_facets() -> None:
+    """
+    Makes all cached manufacturer facets outdated, e.g. when manufacturer name has been changed
+    """
+    cache.set(MANUFACTURER_FACETS_GENERATION_KEY, uuid4().hex, None)
+
+
+def get_manufacturer_facets(qs: QuerySet, category_key: Union[int, str] = MANUFACTURER_FACETS_ALL
+                            ) -> Tuple[QuerySet, Dict[str, int]]:
     """
-    Function returns generator objects, which contains queryset with the manufacturers
-    for received queryset with products, and the dictionary with quantity of products for each manufacturer
+    Returns queryset with the manufacturers of the products from `qs`
+    and the dictionary with quantity of products for each manufacturer name.
+    Manufacturers and quantities are obtained with one GROUP BY query and are cached
+    per category with `category_key` and signature of the products filter, i.e. SQL of `qs`
     """
-    manufacturers = Manufacturer.objects.filter(
-        id__in=(item['manufacturer_id'] for item in qs.values('manufacturer_id'))
-    )
-    yield manufacturers
+    version_key = get_manufacturer_facets_version_key(category_key)
+    cache.add(version_key, uuid4().hex, None)
+    versions = cache.get_many([version_key, MANUFACTURER_FACETS_GENERATION_KEY])
+    signature = md5(str(qs.order_by().query).encode()).hexdigest()
+    key = (f'manufacturer_facets:{category_key}:{versions.get(version_key)}:'
+           f'{versions.get(MANUFACTURER_FACETS_GENERATION_KEY)}:{signature}')
+
+    facets = cache.get(key)
+    if facets is None:
+        facets = list(Manufacturer.objects.filter(
+            products__in=qs.order_by().values('pk'),
+        ).values_list('pk', 'name').annotate(products_count=Count('products', distinct=True)).order_by())
+        cache.set(key, facets, MANUFACTURER_FACETS_TIMEOUT)
 
-    manufacturers_prod_qnty = {}
-    for p in qs.select_related('manufacturer'):
-        manufacturers_prod_qnty[p.manufacturer.name] = manufacturers_prod_qnty.get(p.manufacturer.name, 0) + 1
+    manufacturers = Manufacturer.objects.filter(pk__in=[pk for pk, _name, _count in facets])
+    return manufacturers, {name: count for _pk, name, count in facets}
 
-    yield manufacturers_prod_qnty
+
+def get_favorites_key(profile_id: int) -> str:
+    """
+    Returns name of Redis set with ids of favorite products of the profile with `profile_id`
+    """
+    return f'profile_id:{profile_id}:favorites'
 
 
-def get_products_sorted_by_views(list_ids: list) -> Tuple[list, dict]:
+def get_favorite_products_ids(profile_id: int) -> Set[int]:
     """
-    Function returns tuple with list, that contains products ids,
-    which are sorted by amount views and contains dictionary with these products
+    Returns ids of favorite products of the profile with `profile_id` from Redis set,
+    which is filled from DB, if it hasn't been filled yet or has expired
     """
-    # getting all products, which linked with categories and then sort their by id
-    products = Product.available_objects.select_related('category').filter(id__in=list_ids).order_by('pk')
-    # dictionary with keys as product id and value as a dictionary with views quantity and product category
-    # {pk: {views: int, category: str}}
-    products_views = {}
-    for product in products:
-        products_views[product.pk] = {
-            'views': int(redis.hget(f'product_id:{product.pk}', 'views') or 0),
-            'category': product.category.slug
-        }
+    key = get_favorites_key(profile_id)
+    products_ids = {int(pk) for pk in redis.smembers(key)}
+    if not products_ids:
+        products_ids = set(Favorite.product.through.objects.filter(
+            favorite__profile_id=profile_id,
+        ).values_list('product_id', flat=True))
+        with redis.pipeline() as pipe:
+            pipe.sadd(key, FAVORITES_EMPTY_MEMBER, *products_ids)
+            pipe.expire(key, FAVORITES_TIMEOUT)
+            pipe.execute()
+        return products_ids
+
+    return products_ids - {FAVORITES_EMPTY_MEMBER}
+
+
+def update_favorites(profile_id: int, added_ids: Iterable[int] = (), removed_ids: Iterable[int] = ()) -> None:
+    """
+    Adds (removes) products with `added_ids` (`removed_ids`) to (from) Redis set with favorite products
+    of the profile with `profile_id`. Set, which hasn't been filled yet, is left to be filled from DB
+    """
+    key = get_favorites_key(profile_id)
+    added_ids, removed_ids = list(added_ids), list(removed_ids)
+    if added_ids and redis.exists(key):
+        redis.sadd(key, *added_ids)
+    if removed_ids:
+        redis.srem(key, *removed_ids)
+
+
+def invalidate_favorites(*profiles_ids: int) -> None:
+    """
+    Deletes Redis sets with favorite products of the profiles with `profiles_ids`
+    """
+    if profiles_ids:
+        redis.delete(*(get_favorites_key(profile_id) for profile_id in profiles_ids))
+
+
+def get_category_views_key(category_id: int) -> str:
+    """
+    Returns name of Redis sorted set with views of the products of the category with `category_id`
+    """
+    return f'category_id:{category_id}:products_views'
+
+
+def increase_product_views(product_id: int, category_id: int, profile_id: int) -> None:
+    """
+    Function increments number of views of the product with `product_id` from the category with `category_id`
+    in hash and sorted sets with products views,
+    buffers the view for flushing to DB and adds product to the set of products,
+    which profile with `profile_id` has watched.
+    All commands are sent to Redis within one transaction
+    """
+    with redis.pipeline() as pipe:
+        pipe.hincrby(f'product_id:{product_id}', 'views', 1)
+        pipe.zincrby(PRODUCTS_VIEWS_KEY, 1, product_id)
+        pipe.zincrby(get_category_views_key(category_id), 1, product_id)
+        pipe.hincrby(PRODUCTS_VIEWS_BUFFER_KEY, product_id, 1)
+        # set expire time for redis key i.e. deleting products ids from redis in 7 days, that user has watched
+        pipe.sadd(f'profile_id:{profile_id}', product_id)
+        pipe.expire(f'profile_id:{profile_id}', time=604800, nx=True)
+        pipe.execute()
+
+
+class PopularProducts:
+    """
+    Lazy sequence of the available products sorted by descending of views,
+    which are ranked by Redis sorted set either of all products or of products of the category.
+    Sequence can be passed to paginator, so that only ids of the products on the requested page
+    are obtained from Redis, and only these products are obtained from DB.
+    """
+
+    def __init__(self, category_id: int = None, limit: int = None):
+        self.category_id = category_id
+        self.key = get_category_views_key(category_id) if category_id else PRODUCTS_VIEWS_KEY
+        self.limit = limit  # maximum number of the most popular products in the sequence
+
+    def count(self) -> int:
+        amount = redis.zcard(self.key)
+        return min(amount, self.limit) if self.limit is not None else amount
+
+    def __len__(self) -> int:
+        return self.count()
+
+    def __iter__(self) -> Iterator[Product]:
+        return iter(self[:])
+
+    def __getitem__(self, item: Union[int, slice]) -> Union[Product, List[Product]]:
+        if isinstance(item, int):
+            products = self[item:item + 1]
+            if not products:
+                raise IndexError('Popular product index out of range')
+            return products[0]
+
+        start = item.start or 0
+        stop = self.limit if item.stop is None else item.stop
+        if self.limit is not None:
+            stop = min(stop, self.limit)
+        if stop is not None and stop <= start:
+            return []
 
-    # dict sort by descending of views numbers
-    products_views_sorted = {
-        pk: {'views': data['views'], 'category': data['category']}
-        for pk, data in sorted(products_views.items(), key=lambda x: x[1]['views'], reverse=True)
-    }
+        return self._get_products(start, -1 if stop is None else stop - 1)
 
-    products_ids_sorted = [pk for pk in products_views_sorted.keys()]  # the keys of sorted products
-    # dict with the sorted products by number of views
-    products = Product.available_objects.select_related('category').in_bulk(products_ids_sorted)
+    def get_ids(self) -> List[int]:
+        """
+        Returns ids of all products in the sequence sorted by descending of views
+        """
+        return [int(pk) for pk in redis.zrevrange(self.key, 0, -1 if self.limit is None else self.limit - 1)]
 
-    return products_ids_sorted, products
+    def _get_products(self, start: int, end: int) -> List[Product]:
+        """
+        Returns available products, which are located in sorted set from `start` to `end` positions inclusive
+        """
+        products_ids = [int(pk) for pk in redis.zrevrange(self.key, start, end)]
+        lookup = Q(category_id=self.category_id) if self.category_id else Q()
+        products = Product.available_objects.select_related('category').filter(lookup).in_bulk(products_ids)
+        return [products[pk] for pk in products_ids if pk in products]
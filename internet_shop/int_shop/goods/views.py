@@ -1,17 +1,16 @@
 from decimal import Decimal
 
-from django.contrib.postgres.search import TrigramSimilarity
-from django.db.models import Q, QuerySet, Case, When, Value
-from django.http.response import JsonResponse
+from django.db.models import Q, QuerySet
+from django.http.response import HttpResponse, JsonResponse
 from django.shortcuts import render
 from django.urls import reverse
 from django.utils import timezone
-from django.utils.translation import gettext_lazy as _
+from django.utils.translation import gettext_lazy as _, get_language
 from django.views.decorators.http import require_POST
 from django.views.generic import ListView, DetailView
 from django.views.generic.edit import FormMixin
 
-from account.models import Profile
+from account.utils import get_request_profile
 from cart.forms import CartQuantityForm
 from common.decorators import ajax_required, auth_profile_required
 from common.moduls_init import redis
@@ -24,18 +23,28 @@ from goods.forms import (
     FilterByManufacturerForm,
     FilterByPriceForm,
 )
-from goods.models import Product, Category, Favorite, Comment
-from .filters import get_max_min_price
+from goods.models import Product, Category, Comment, EFFECTIVE_PRICE
+from .comment_rating import get_profile_rated_comments, toggle_comment_rating
+from .filters import get_price_stats
+from .pagination import CURSOR_PARAM, KeysetPaginationMixin
+from .product_pages import PRODUCT_PAGE_OVERLAYS, fill_product_page, get_product_page, set_product_page
+from .product_photos import get_product_photos
+from .product_rating import add_product_vote, calculate_rating, get_star_counts
 from .property_filters import get_property_for_category
+from .search import search_products
 from .utils import (
     distribute_properties_from_request,
     get_page_obj,
-    get_collections_with_manufacturers_info,
-    get_products_sorted_by_views
+    get_keyset_page_obj,
+    get_favorite_products_ids,
+    get_manufacturer_facets,
+    MANUFACTURER_FACETS_ALL,
+    increase_product_views,
+    PopularProducts,
 )
 
 
-class ProductListView(ListView):
+class ProductListView(KeysetPaginationMixin, ListView):
     """
     List of all products
     """
@@ -58,28 +67,30 @@ class ProductListView(ListView):
             context['category'] = Category.objects.get(slug=self.kwargs.get('category_slug'))
             context['filter_manufacturers'] = FilterByManufacturerForm()
 
-            context['category_properties'] = get_property_for_category(context['category'].name,
+            context['category_properties'] = get_property_for_category(context['category'],
                                                                        language_code=self.request.LANGUAGE_CODE)
 
+            price_stats = get_price_stats(category_slug=self.kwargs.get('category_slug'))
             if 'filter_price' in self.kwargs:
                 min_price = Decimal(self.kwargs['filter_price'][0])
                 max_price = Decimal(self.kwargs['filter_price'][1])
             else:
-                max_price, min_price = get_max_min_price(category_slug=self.kwargs.get('category_slug'))
+                max_price, min_price = price_stats['max_price'], price_stats['min_price']
 
-            context['filter_price'] = FilterByPriceForm(initial={
+            context['filter_price'] = FilterByPriceForm(histogram=price_stats['histogram'], initial={
                 'price_min': min_price,
                 'price_max': max_price
             })
 
             category_products = self.get_queryset()
-            manufacturers_info = get_collections_with_manufacturers_info(qs=category_products)
+            manufacturers, manufacturers_prod_qnty = get_manufacturer_facets(qs=category_products,
+                                                                             category_key=context['category'].pk)
             # updating manufacturer's queryset
-            context['filter_manufacturers'].fields['manufacturer'].queryset = next(manufacturers_info)
-            context['manufacturers_prod_qnty'] = next(manufacturers_info)  # products quantity for each manufacturer
+            context['filter_manufacturers'].fields['manufacturer'].queryset = manufacturers
+            context['manufacturers_prod_qnty'] = manufacturers_prod_qnty  # products quantity for each manufacturer
 
         if self.request.user.is_authenticated:
-            context['favorites'] = self.profile.profile_favorite.product.prefetch_related()
+            context['favorites'] = get_favorite_products_ids(self.profile.pk)  # ids of favorite products
 
         context['sorting_by_price'] = SortByPriceForm()
         # show search request after receiving search results
@@ -98,10 +109,7 @@ class ProductListView(ListView):
         """
         Set either guest or authenticated user as `profile` attribute.
         """
-        if request.user.is_authenticated:
-            self.profile = Profile.objects.get(user=request.user)
-        else:
-            self.profile = Profile.objects.get(user__username='guest_user')
+        self.profile = get_request_profile(request)
         return super().dispatch(request, *args, **kwargs)
 
     def get(self, request, *args, **kwargs):
@@ -123,21 +131,11 @@ class ProductListView(ListView):
         """
         Obtain results of search request.
         """
+        products = Product.available_objects.all()
         if category_slug:
-            q = Q(category__slug=category_slug, similarity__gte=0.3)
-        else:
-            q = Q(similarity__gte=0.3)
+            products = products.filter(category__slug=category_slug)
 
-        products = Product.available_objects.annotate(
-            similarity=TrigramSimilarity('name', query), ).filter(q).order_by('-similarity')
-
-        product_ids = [product.pk for product in products]
-        # number of views of products found
-        # compose "order_by" condition for sorting products by descending of the views
-        product_views = [int(redis.hget(f'product_id:{pk}', 'views') or 0) for pk in product_ids]
-        order_condition = Case(*[When(pk=pk, then=Value(views)) for pk, views in zip(product_ids, product_views)])
-        result = Product.available_objects.filter(id__in=product_ids).order_by(-order_condition)
-        return result
+        return search_products(query, get_language(), products)
 
 
 class ProductDetailView(DetailView, FormMixin):
@@ -167,23 +165,25 @@ class ProductDetailView(DetailView, FormMixin):
         """
         Set either guest or authenticated user as `profile` attribute.
         """
-        if request.user.is_authenticated:
-            self.profile = Profile.objects.get(user=request.user)
-        else:
-            self.profile = Profile.objects.get(user__username='guest_user')
+        self.profile = get_request_profile(request)
 
         return super().dispatch(request, *args, **kwargs)
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
         language = self.request.LANGUAGE_CODE
-        context['captcha_image'] = create_captcha_image(self.request, width=135, font_size=30)
+        if 'captcha_image' not in context:  # captcha is not placed into the cached page
+            context['captcha_image'] = create_captcha_image(self.request, width=135, font_size=30)
         context['comment_form'] = CommentProductForm()
         context['quantity_form'] = CartQuantityForm()
-        # getting all Profile objects, that commented on the current product and rated product comment
-        context['comments'] = self.object.comments.prefetch_related('profile',
-                                                                    'profiles_likes',
-                                                                    'profiles_unlikes').order_by('-created')
+        context['product_photos'] = get_product_photos(self.object.pk)  # detail photos from the cached manifest
+        # rating is derived from numbers of votes including votes, which have not been flushed to DB yet
+        context['star_counts'] = get_star_counts(self.object.pk)
+        context['votes_count'] = sum(context['star_counts'].values())
+        self.object.rating = calculate_rating(context['star_counts'])
+        # getting all Profile objects, that commented on the current product,
+        # numbers of likes and dislikes are stored in the comments
+        context['comments'] = self.object.comments.select_related('profile').order_by('-created')
         # getting all Property objects, that belongs to the current product
         context['properties'] = self.object.properties.prefetch_related('category_property', 'translations').filter(
             translations__language_code=language)
@@ -199,17 +199,13 @@ class ProductDetailView(DetailView, FormMixin):
         """
         Returns whether current product is in the current profile's favorite.
         """
-        # getting Favorite instance that linked to current Profile
-        fav_obj = Favorite.objects.get(profile=self.profile)
-        return self.object in fav_obj.product.prefetch_related()
+        return self.object.pk in get_favorite_products_ids(self.profile.pk)
 
     def get_profile_rated_comments(self) -> dict:
         """
         Returns ids of comments, under which current profile had set like or dislike.
         """
-        liked_comments = self.profile.comments_liked.all()
-        unliked_comments = self.profile.comments_unliked.all()
-        return {'liked_comments': [c.pk for c in liked_comments], 'unliked_comments': [c.pk for c in unliked_comments]}
+        return get_profile_rated_comments(self.profile.pk, self.object.comments.all())
 
     def post(self, request, *args, **kwargs):
         # if it's AJAX request
@@ -242,28 +238,13 @@ class ProductDetailView(DetailView, FormMixin):
         """
         comment_id = request.POST.get('comment_id')
         action = request.POST.get('action')  # like/unlike
-        comment = Comment.objects.get(pk=comment_id)
-
-        liked_comments = self.profile.comments_liked.all()
-        unliked_comments = self.profile.comments_unliked.all()
-
-        # set like/dislike for the comment
-        if action == 'like':
-            if comment in liked_comments:
-                comment.profiles_likes.remove(self.profile)
-            else:
-                comment.profiles_likes.add(self.profile)
-                comment.profiles_unlikes.remove(self.profile)
-
-        elif action == 'unlike':
-            if comment in unliked_comments:
-                comment.profiles_unlikes.remove(self.profile)
-            else:
-                comment.profiles_unlikes.add(self.profile)
-                comment.profiles_likes.remove(self.profile)
+        if action not in ('like', 'unlike'):
+            comment = Comment.objects.get(pk=comment_id)
+            new_count_likes, new_count_unlikes = comment.likes_count, comment.unlikes_count
+        else:
+            # set like/dislike for the comment or cancel it
+            new_count_likes, new_count_unlikes = toggle_comment_rating(comment_id, self.profile.pk, action)
 
-        new_count_likes = comment.profiles_likes.count()
-        new_count_unlikes = comment.profiles_unlikes.count()
         return JsonResponse({'success': True,
                              'new_count_likes': new_count_likes,
                              'new_count_unlikes': new_count_unlikes})
@@ -280,15 +261,36 @@ class ProductDetailView(DetailView, FormMixin):
         """
         Increase number of views of the current product (object)
         while transition to product detail page.
+        Page of the guest is obtained from cache, only CSRF token, captcha and cart panel are rendered for the guest.
         """
-        object_pk = self.kwargs.get(self.pk_url_kwarg)  # getting product's id from URL kwargs
+        if request.user.is_authenticated:
+            response = super().get(request, *args, **kwargs)
+            product_id, category_id = self.object.pk, self.object.category_id
+        else:
+            page = self.get_cached_page()
+            response = HttpResponse(fill_product_page(page['html'], request))
+            product_id, category_id = self.kwargs['product_pk'], page['category_id']
         # increment number of views by 1 while it's watched
-        # add products to the set that profile has watched
-        # set expire time for redis key i.e. deleting products ids from redis in 7 days, that user has watched
-        redis.hincrby(f'product_id:{object_pk}', 'views', 1)
-        redis.sadd(f'profile_id:{self.profile.pk}', object_pk)
-        redis.expire(f'profile_id:{self.profile.pk}', time=604800, nx=True)
-        return super().get(request, *args, **kwargs)
+        # and add products to the set that profile has watched
+        increase_product_views(product_id, category_id, self.profile.pk)
+        return response
+
+    def get_cached_page(self) -> dict:
+        """
+        Returns detail page of the guest from cache.
+        Missing or outdated page is rendered with placeholders instead of visitor-specific parts and is cached
+        """
+        product_id, language = self.kwargs['product_pk'], self.request.LANGUAGE_CODE
+        page, version = get_product_page(product_id, language)
+        if page is None or page['slug'] != self.kwargs['product_slug']:
+            self.object = self.get_object()
+            context = self.get_context_data(object=self.object, **PRODUCT_PAGE_OVERLAYS)
+            page = {'version': version,
+                    'slug': self.object.slug,
+                    'category_id': self.object.category_id,
+                    'html': self.render_to_response(context).rendered_content}
+            set_product_page(product_id, language, page)
+        return page
 
 
 @auth_profile_required
@@ -302,7 +304,7 @@ def add_or_remove_product_favorite(request) -> JsonResponse:
     action = request.POST.get('action')
     product = Product.available_objects.get(pk=product_id)
 
-    profile = Profile.objects.get(user=request.user)
+    profile = get_request_profile(request)
 
     if action == 'add':
         profile.profile_favorite.product.add(product)
@@ -310,13 +312,13 @@ def add_or_remove_product_favorite(request) -> JsonResponse:
         profile.profile_favorite.product.remove(product)
 
     # products quantity in the favorite for current profile
-    amount_prods = profile.profile_favorite.product.all().count()
+    amount_prods = len(get_favorite_products_ids(profile.pk))
 
     return JsonResponse({'success': True,
                          'amount_prods': amount_prods})
 
 
-class FilterResultsView(ListView):
+class FilterResultsView(KeysetPaginationMixin, ListView):
     """
     Display sample results after filter has been applied.
     """
@@ -362,7 +364,8 @@ class FilterResultsView(ListView):
         if 'filter_price' in self.kwargs:
             min_price = self.kwargs.get('filter_price')[0]
             max_price = self.kwargs.get('filter_price')[1]
-            lookups &= Q(price__gte=min_price, price__lte=max_price)
+            # price filter bounds are effective prices as well as listings sorting
+            lookups &= Q(effective_price__gte=min_price, effective_price__lte=max_price)
         # selection of products by manufacturer
         if 'filter_manufacturers' in self.kwargs:
             manufacturers = self.kwargs.get('filter_manufacturers')
@@ -377,7 +380,7 @@ class FilterResultsView(ListView):
                          properties__numeric_value__in=props_dict['numeric_values'])
 
         # getting in the queryset only the unique results
-        result_queryset = Product.available_objects.distinct().filter(lookups)
+        result_queryset = Product.available_objects.annotate(effective_price=EFFECTIVE_PRICE).distinct().filter(lookups)
 
         self.queryset_filter = result_queryset  # save queryset to the class property
         return result_queryset
@@ -388,30 +391,32 @@ class FilterResultsView(ListView):
         if 'category_slug' in self.kwargs:
             context['category'] = Category.objects.get(slug=self.kwargs.get('category_slug'))
 
-            context['category_properties'] = get_property_for_category(context['category'].name,
+            context['category_properties'] = get_property_for_category(context['category'],
                                                                        prods_queryset=self.queryset_filter,
                                                                        language_code=self.request.LANGUAGE_CODE)
 
+            price_stats = get_price_stats(category_slug=self.kwargs.get('category_slug'))
             if 'filter_price' in self.kwargs:
                 min_price = Decimal(self.kwargs['filter_price'][0])
                 max_price = Decimal(self.kwargs['filter_price'][1])
             else:
-                max_price, min_price = get_max_min_price(category_slug=self.kwargs.get('category_slug'))
+                max_price, min_price = price_stats['max_price'], price_stats['min_price']
 
-            context['filter_price'] = FilterByPriceForm(initial={
+            context['filter_price'] = FilterByPriceForm(histogram=price_stats['histogram'], initial={
                 'price_min': min_price,
                 'price_max': max_price,
             })
 
             category_products = self.queryset_filter  # all products for the category, that were filtered
-            manufacturers_info = get_collections_with_manufacturers_info(qs=category_products)
+            manufacturers, manufacturers_prod_qnty = get_manufacturer_facets(qs=category_products,
+                                                                             category_key=context['category'].pk)
 
             # updating queryset and marking selected manufacturers
             context['filter_manufacturers'] = FilterByManufacturerForm(initial={
                 'manufacturer': self.kwargs.get('filter_manufacturers')
             })
-            context['filter_manufacturers'].fields['manufacturer'].queryset = next(manufacturers_info)
-            context['manufacturers_prod_qnty'] = next(manufacturers_info)  # products quantity of each manufacturer
+            context['filter_manufacturers'].fields['manufacturer'].queryset = manufacturers
+            context['manufacturers_prod_qnty'] = manufacturers_prod_qnty  # products quantity of each manufacturer
         context['sorting_by_price'] = SortByPriceForm()
 
         return context
@@ -425,9 +430,12 @@ def promotion_list(request, category_slug: str = None):
     category = Category.objects.get(slug=category_slug) if category_slug else ''
     lookup = Q(category__slug=category_slug, promotional=True) if category_slug else Q(promotional=True)
     products = Product.available_objects.filter(lookup)
-    page = request.GET.get('page')  # getting current page from the request
-    # list pagination
-    page_obj = get_page_obj(per_pages=1, page=page, queryset=products)
+    if CURSOR_PARAM in request.GET:  # list keyset pagination
+        page_obj = get_keyset_page_obj(per_pages=1, cursor=request.GET.get(CURSOR_PARAM), queryset=products)
+    else:
+        page = request.GET.get('page')  # getting current page from the request
+        # list pagination
+        page_obj = get_page_obj(per_pages=1, page=page, queryset=products)
     products = page_obj.object_list  # list of the products in the selected page
     sorting_by_price = SortByPriceForm()
 
@@ -453,8 +461,13 @@ def new_list(request, category_slug: str = None):
     products = Product.available_objects.filter(lookup)
     # saving ids of the new products to redis
     redis.hset('new_prods', 'ids', ','.join(str(prod.pk) for prod in products))
-    page = request.GET.get('page')  # getting current page from the request
-    page_obj = get_page_obj(per_pages=1, page=page, queryset=products)  # list pagination
+    if CURSOR_PARAM in request.GET:  # list keyset pagination, the newest products go first
+        page_obj = get_keyset_page_obj(per_pages=1,
+                                       cursor=request.GET.get(CURSOR_PARAM),
+                                       queryset=products.order_by('-created', '-pk'))
+    else:
+        page = request.GET.get('page')  # getting current page from the request
+        page_obj = get_page_obj(per_pages=1, page=page, queryset=products)  # list pagination
 
     products = page_obj.object_list  # list of the products in the selected page
     sorting_by_price = SortByPriceForm()
@@ -474,29 +487,17 @@ def popular_list(request, category_slug: str = None):
     Able to obtain all products or products which belongs to category with `category_slug`.
     """
     view_amount = 5  # displaying number of popular products
-    category = None
+    category = Category.objects.get(slug=category_slug) if category_slug else None
     page = request.GET.get('page')  # getting current page from the request
 
-    products_ids = [int(pk) for pk in redis.smembers('products_ids')]  # ids of all products
-    products_ids_sorted, products = get_products_sorted_by_views(products_ids)
-
-    if category_slug:  # products filter by category
-        product_list = [
-            products[pk] for pk in products_ids_sorted
-            if category_slug == products[pk].category.slug
-        ]
-        category = Category.objects.get(slug=category_slug)
-    else:
-        product_list = [products[pk] for pk in products_ids_sorted]
+    # products sorted by views in Redis, only products on the current page will be obtained
+    popular_products = PopularProducts(category_id=category.pk if category else None, limit=view_amount)
     # list pagintion
-    page_obj = get_page_obj(per_pages=2, page=page, queryset=product_list[:view_amount])
+    page_obj = get_page_obj(per_pages=2, page=page, queryset=popular_products)
     products = page_obj.object_list
 
     sorting_by_price = SortByPriceForm()
 
-    # saving popular products ids to redis
-    redis.hset('popular_prods', 'ids', ','.join(str(prod.pk) for prod in product_list))
-
     return render(request, 'goods/product/navs_categories_list.html', {'products': products,
                                                                        'page_obj': page_obj,
                                                                        'category': category,
@@ -524,8 +525,12 @@ def product_ordering(request, place: str, category_slug: str = 'all', page: int
     category_properties = None
     product_ids_promotion = []
 
+    if category_slug != 'all':  # if category has been received
+        category = Category.objects.get(slug=category_slug)
+
+    # ids of popular products are read from the sorted set of views of the category or of the whole catalog
     product_ids_popular = (
-        redis.hget('popular_prods', 'ids').decode('utf-8').split(',') if place == 'popular' else []
+        PopularProducts(category_id=category.pk if category else None).get_ids() if place == 'popular' else []
     )
     product_ids_new = (
         redis.hget('new_prods', 'ids').decode('utf-8').split(',') if place == 'new' else []
@@ -539,24 +544,20 @@ def product_ordering(request, place: str, category_slug: str = 'all', page: int
         # if sort is needed
         if sort in ('p_asc', 'p_desc'):
             if category_slug != 'all':  # if category has been received
-                category = Category.objects.get(slug=category_slug)
                 lookups = Q(category=category,
                             id__in=product_ids_popular or product_ids_new or product_ids_promotion or redis.smembers(
                                 'products_ids'))
-                products = Product.available_objects.filter(lookups).annotate(sort_order=Case(
-                    When(promotional=True, then='promotional_price'),
-                    default='price')
+                products = Product.available_objects.filter(lookups).annotate(
+                    sort_order=EFFECTIVE_PRICE
                 ).order_by('sort_order' if sort == 'p_asc' else '-sort_order')
             else:
                 lookups = Q(id__in=product_ids_popular or product_ids_new or product_ids_promotion or redis.smembers(
                     'products_ids'))
-                products = Product.available_objects.filter(lookups).annotate(sort_order=Case(
-                    When(promotional=True, then='promotional_price'),
-                    default='price')
+                products = Product.available_objects.filter(lookups).annotate(
+                    sort_order=EFFECTIVE_PRICE
                 ).order_by('sort_order' if sort == 'p_asc' else '-sort_order')
         else:
             if category_slug != 'all':
-                category = Category.objects.get(slug=category_slug)
                 lookups = Q(category=category,
                             id__in=product_ids_popular or product_ids_new or product_ids_promotion or redis.smembers(
                                 'products_ids'))
@@ -567,25 +568,29 @@ def product_ordering(request, place: str, category_slug: str = 'all', page: int
             products = Product.available_objects.filter(lookups)
 
     # list pagination
-    page_obj = get_page_obj(per_pages=2, page=page, queryset=products)
+    if CURSOR_PARAM in request.GET:
+        page_obj = get_keyset_page_obj(per_pages=2, cursor=request.GET.get(CURSOR_PARAM), queryset=products)
+    else:
+        page_obj = get_page_obj(per_pages=2, page=page, queryset=products)
     page_products = page_obj.object_list
 
     sorting_by_price = SortByPriceForm()  # add the form to the page after form has been submitted
 
-    max_price, min_price = get_max_min_price(category_slug=category_slug)
-    filter_price = FilterByPriceForm(initial={
-        'price_min': min_price,
-        'price_max': max_price
+    price_stats = get_price_stats(category_slug=category_slug)
+    filter_price = FilterByPriceForm(histogram=price_stats['histogram'], initial={
+        'price_min': price_stats['min_price'],
+        'price_max': price_stats['max_price']
     })
 
-    manufacturers_info = get_collections_with_manufacturers_info(qs=products)
+    manufacturers, manufacturers_prod_qnty = get_manufacturer_facets(
+        qs=products, category_key=category.pk if category_slug != 'all' else MANUFACTURER_FACETS_ALL,
+    )
     filter_manufacturers = FilterByManufacturerForm()
     # updating manufacturer's queryset
-    filter_manufacturers.fields['manufacturer'].queryset = next(manufacturers_info)
-    manufacturers_prod_qnty = next(manufacturers_info)  # products quantity for each manufacturer
+    filter_manufacturers.fields['manufacturer'].queryset = manufacturers
 
     if category_slug != 'all':
-        category_properties = get_property_for_category(category.name, language_code=request.LANGUAGE_CODE)
+        category_properties = get_property_for_category(category, language_code=request.LANGUAGE_CODE)
 
     return render(request, f'goods/product/{templates[place]}', {'products': page_products,
                                                                  'category': category,
@@ -606,17 +611,19 @@ def product_ordering(request, place: str, category_slug: str = 'all', page: int
 def set_product_rating(request) -> JsonResponse:
     """
     Set product's rating using AJAX request.
+    Vote is added to the numbers of votes for each star of the product,
+    and current rating is the mean derived from these numbers
     """
-    star = Decimal(request.POST.get('star'))  # rating, that user has installed (1 - 5)
-    product_id = request.POST.get('product_id')
-    product = Product.available_objects.get(pk=product_id)
-    current_rating = product.rating
-    if not current_rating:
-        product.rating = f'{star:.1f}'
-    else:  # evaluating average product rating
-        current_rating = round(((star + current_rating) / 2), 1)
-        product.rating = current_rating
-    product.save(update_fields=['rating'])  # save to DB
+    try:
+        star = int(request.POST.get('star'))  # rating, that user has installed (1 - 5)
+    except (TypeError, ValueError):
+        star = None
+    if star not in Product.Rating.values:
+        return JsonResponse({'success': False}, status=400)
+
+    product_id = Product.available_objects.values_list('pk', flat=True).get(pk=request.POST.get('product_id'))
+    add_product_vote(product_id, star)
+    current_rating = calculate_rating(get_star_counts(product_id))
 
     return JsonResponse({'success': True,
-                         'current_rating': product.rating})
+                         'current_rating': f'{current_rating:.1f}'})
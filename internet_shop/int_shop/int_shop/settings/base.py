@@ -54,6 +54,7 @@ MIDDLEWARE = [
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'account.middleware.ProfileMiddleware',  # lazily resolved profile of the current user
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
     'debug_toolbar.middleware.DebugToolbarMiddleware',
@@ -149,6 +150,7 @@ LOGIN_REDIRECT_URL = 'goods:product_list'
 LOGOUT_REDIRECT_URL = 'login'
 LOGIN_URL = 'login'
 CART_SESSION_ID = 'cart'
+CART_SUMMARY_SESSION_ID = 'cart_summary'
 
 STRIPE_PUBLISHABLE_KEY = env('STRIPE_PUBLISHABLE_KEY')
 STRIPE_SECRET_KEY = env('STRIPE_SECRET_KEY')
@@ -169,6 +171,26 @@ REDIS_PASSWORD = env('REDIS_PASSWORD')
 # celery config
 CELERY_BROKER_URL = env('CELERY_BROKER_URL')
 CELERY_RESULT_BACKEND = env('CELERY_RESULT_BACKEND')
+CELERY_BEAT_SCHEDULE = {
+    'flush-products-views': {
+        'task': 'goods.tasks.flush_products_views',
+        'schedule': 60.0,  # seconds
+    },
+    'flush-products-rating': {
+        'task': 'goods.tasks.flush_products_rating',
+        'schedule': 60.0,  # seconds
+    },
+    'refill-captcha-pools': {
+        'task': 'common.tasks.refill_captcha_pools',
+        'schedule': 10.0,  # seconds
+    },
+    'cleanup-media': {  # media, whose scheduled task has been lost
+        'task': 'common.tasks.cleanup_media',
+        'schedule': 60.0 * 10,  # seconds
+    },
+}
+# tasks of the modules, which are not installed apps
+CELERY_IMPORTS = ('common.tasks',)
 
 # Redis Cache configuration
 CACHES = {
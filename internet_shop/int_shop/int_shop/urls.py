@@ -10,6 +10,7 @@ from drf_yasg.generators import OpenAPISchemaGenerator
 from drf_yasg.views import get_schema_view
 from rest_framework.permissions import AllowAny
 
+from common.metrics import metrics
 from common.utils import create_captcha_image
 from .settings import env
 
@@ -42,6 +43,7 @@ swagger_schema_view = get_schema_view(
 # view sets a user’s language preference and redirects to a given URL
 urlpatterns = [
     path('i18n/', include('django.conf.urls.i18n')),
+    path('metrics/', metrics, name='metrics'),
 ]
 
 urlpatterns += i18n_patterns(
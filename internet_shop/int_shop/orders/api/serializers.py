@@ -2,7 +2,7 @@ from django.utils import timezone
 from rest_framework import serializers
 from rest_framework.serializers import ValidationError
 
-from account.models import Profile
+from account.utils import get_user_profile
 from common.moduls_init import redis
 from common.utils import check_phone_number
 from orders.models import Order, OrderItem, Delivery
@@ -109,7 +109,7 @@ class OrderSerializer(serializers.ModelSerializer):
             coupon = self.context['request'].session.get('coupon_id')
             present_card = self.context['request'].session.get('present_card')
 
-        profile = Profile.objects.get(user_id=current_user_pk)
+        profile = get_user_profile(self.context['request'].user)
 
         # delete cart content, coupon_id or present_card_id if they were existed
         if self.context['request'].headers.get('User-Agent') == 'coreapi':
@@ -1,3 +1,5 @@
+import csv
+import json
 import os
 import shutil
 from datetime import datetime
@@ -19,7 +21,7 @@ from cart.cart import Cart
 from goods.models import Product, Category, Manufacturer
 from orders.api.serializers import OrderSerializer, DeliverySerializer
 from orders.api.views import OrderViewSet
-from orders.models import Order, Delivery
+from orders.models import Order, Delivery, OrderItem
 
 
 class TestOrdersAPI(APITestCase):
@@ -315,6 +317,33 @@ class TestOrdersAPI(APITestCase):
         self.assertEqual(len(response.data), 1)
         self.assertEqual(dict(response.data[0]), serializer.data)
 
+    def test_export_orders(self):
+        """
+        Checking streaming export of the orders with their items and delivery only by staff users
+        """
+        OrderItem.objects.create(order=self.order, product=self.product1, price=self.product1.price, quantity=2)
+        OrderItem.objects.create(order=self.order, product=self.product2, price=self.product2.price)
+        url = reverse('orders_api:order-export', kwargs={'version': 'v1', 'file_format': 'csv'})
+
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {self.token.key}')
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+        self.user.is_staff = True
+        self.user.save()
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        rows = list(csv.DictReader(b''.join(response.streaming_content).decode().splitlines()))
+        self.assertEqual([(row['id'], row['delivery_service'], row['item_product'], row['item_quantity'])
+                          for row in rows],
+                         [(str(self.order.pk), 'New Post', self.product1.slug, '2'),
+                          (str(self.order.pk), 'New Post', self.product2.slug, '1')])
+
+        response = self.client.get(reverse('orders_api:order-export', kwargs={'version': 'v1', 'file_format': 'jsonl'}))
+        record = json.loads(b''.join(response.streaming_content))
+        self.assertEqual(record['delivery']['office_number'], 2)
+        self.assertEqual(record['items'][0]['price'], str(self.product1.price))
+
     def test_get_deliveries_list_only_by_staff_users(self):
         """
         Checking get all deliveries by only staff users
@@ -8,9 +8,11 @@ from rest_framework.exceptions import PermissionDenied
 from rest_framework.permissions import IsAdminUser, IsAuthenticated
 from rest_framework.response import Response
 
-from account.models import Profile
+from account.utils import get_user_profile, get_username_profile
 from cart.cart import Cart
+from common.exports import EXPORT_FORMATS, export_response
 from common.moduls_init import redis
+from orders.exports import ORDER_COLUMNS, flatten_order_record, get_orders_queryset, iter_orders_records
 from orders.models import Order, Delivery
 from . import serializers
 from .permissions import UserPermission
@@ -46,11 +48,12 @@ class OrderViewSet(viewsets.ModelViewSet):
         Override for add items of the cart to the serializer context
         """
         context = super().get_serializer_context()
+        cart = Cart(self.request)
         if self.request.headers.get('User-Agent') == 'coreapi':
-            self.request.session['cart'] = json.loads(
+            # items are replaced with the setter, so that the summary of the cart is recomputed
+            cart.cart = self.request.session['cart'] = json.loads(
                 redis.hget('session_cart', f'user_id:{self.request.user.pk}') or b'{}')
             self.request.session.save()
-        cart = Cart(self.request)
         context.update({'cart_items': list(cart)})
         return context
 
@@ -71,7 +74,7 @@ class OrderViewSet(viewsets.ModelViewSet):
         """
         Returns orders of current profile.
         """
-        current_profile = Profile.objects.get(user=request.user)
+        current_profile = get_user_profile(request.user)
         profile_orders = Order.objects.prefetch_related('items', 'items__product').filter(profile=current_profile)
         serializer = self.get_serializer(instance=profile_orders, many=True)
         return Response(serializer.data, status=status.HTTP_200_OK)
@@ -84,11 +87,27 @@ class OrderViewSet(viewsets.ModelViewSet):
             permission_classes=[IsAdminUser],
             schema=get_orders_by_user_schema)
     def get_orders_by_username(self, request, username: str, version: str = 'v1'):
-        profile = Profile.objects.get(user__username=username)
+        profile = get_username_profile(username)
         profile_orders = Order.objects.prefetch_related('items', 'items__product').filter(profile=profile)
         serializer = self.get_serializer(instance=profile_orders, many=True)
         return Response(serializer.data, status=status.HTTP_200_OK)
 
+    @swagger_auto_schema(method='get', operation_summary='Export all orders with their items and delivery '
+                                                         'to CSV or JSONL',
+                         responses={200: 'CSV or JSONL file'})
+    @action(methods=['GET'],
+            detail=False,
+            url_path=rf'export/(?P<file_format>{"|".join(EXPORT_FORMATS)})',
+            url_name='export',
+            permission_classes=[IsAdminUser])
+    def export(self, request, file_format: str, version: str = 'v1'):
+        """
+        Stream all orders with their items and delivery. Orders are read with server-side cursor by chunks,
+        so memory doesn't depend on the number of orders.
+        """
+        return export_response(iter_orders_records(get_orders_queryset()), file_format, ORDER_COLUMNS,
+                               flatten_order_record, 'orders')
+
 
 @method_decorator(name='list',
                   decorator=swagger_auto_schema(operation_summary='Get all deliveries'))
@@ -123,7 +142,7 @@ class DeliveryViewSet(viewsets.ModelViewSet):
         """
         Returns deliveries of current profile
         """
-        profile = Profile.objects.get(user__username=username)
+        profile = get_username_profile(username)
         profile_orders = Order.objects.select_related('delivery').filter(profile=profile)
         delivery_info = Delivery.objects.filter(order__id__in=[order.pk for order in profile_orders])
         serializer = self.get_serializer(instance=delivery_info, many=True)
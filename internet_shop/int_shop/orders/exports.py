@@ -0,0 +1,64 @@
+from typing import Iterator, Optional
+
+from django.db.models import Prefetch, QuerySet
+
+from common.exports import EXPORT_CHUNK_SIZE
+from orders.models import Order, OrderItem
+
+ORDER_FIELDS = ('id', 'created', 'updated', 'first_name', 'last_name', 'email', 'phone', 'address', 'comment',
+                'pay_method', 'call_confirm', 'is_paid', 'is_done', 'stripe_id')
+DELIVERY_FIELDS = ('first_name', 'last_name', 'service', 'method', 'office_number', 'delivery_date')
+ITEM_FIELDS = ('product', 'product_name', 'price', 'quantity')
+
+# CSV row is the order item, columns of the order and its delivery are repeated in the rows of each its item
+ORDER_COLUMNS = (*ORDER_FIELDS, 'profile', 'coupon', 'present_card',
+                 *(f'delivery_{field}' for field in DELIVERY_FIELDS),
+                 *(f'item_{field}' for field in ITEM_FIELDS))
+
+
+def get_orders_queryset(profile_id: Optional[int] = None) -> QuerySet:
+    """
+    Returns orders with their delivery, coupon, present card and items, which are exported
+    """
+    queryset = Order.objects.select_related('delivery', 'coupon', 'present_card').only(
+        *ORDER_FIELDS, 'profile', 'coupon__code', 'present_card__code',
+        *(f'delivery__{field}' for field in DELIVERY_FIELDS),
+    ).prefetch_related(
+        Prefetch('items', queryset=OrderItem.objects.select_related('product').only(
+            'order', 'price', 'quantity', 'product__slug', 'product__name',
+        ).order_by('pk')),
+    ).order_by('pk')
+    if profile_id is not None:
+        queryset = queryset.filter(profile_id=profile_id)
+    return queryset
+
+
+def iter_orders_records(queryset: Optional[QuerySet] = None) -> Iterator[dict]:
+    """
+    Yields orders of the `queryset` with their delivery and items. Orders are fetched with server-side cursor
+    by `EXPORT_CHUNK_SIZE` rows, items are prefetched for each chunk
+    """
+    queryset = get_orders_queryset() if queryset is None else queryset
+    for order in queryset.iterator(chunk_size=EXPORT_CHUNK_SIZE):
+        delivery = order.delivery
+        yield {
+            **{field: getattr(order, field) for field in ORDER_FIELDS},
+            'profile': order.profile_id,
+            'coupon': order.coupon.code if order.coupon else None,
+            'present_card': order.present_card.code if order.present_card else None,
+            'delivery': {field: getattr(delivery, field) for field in DELIVERY_FIELDS} if delivery else None,
+            'items': [{'product': item.product.slug, 'product_name': item.product.name,
+                       'price': item.price, 'quantity': item.quantity} for item in order.items.all()],
+        }
+
+
+def flatten_order_record(record: dict) -> Iterator[dict]:
+    """
+    Yields CSV rows of the order `record`: one row for each its item, or one row without item columns,
+    if order has no items
+    """
+    order = {**record, **{f'delivery_{field}': value for field, value in (record['delivery'] or {}).items()}}
+    if not record['items']:
+        yield order
+    for item in record['items']:
+        yield {**order, **{f'item_{field}': value for field, value in item.items()}}
@@ -0,0 +1,20 @@
+from common.exports import ExportCommand
+from orders.exports import ORDER_COLUMNS, flatten_order_record, get_orders_queryset, iter_orders_records
+
+
+class Command(ExportCommand):
+    """
+    Export orders with their items and delivery.
+    Orders are read with server-side cursor by chunks, so memory doesn't depend on the number of orders
+    """
+    help = 'Export orders with their items and delivery to CSV or JSONL file'
+    columns = ORDER_COLUMNS
+    name = 'orders'
+    flatten = staticmethod(flatten_order_record)
+
+    def add_arguments(self, parser):
+        super().add_arguments(parser)
+        parser.add_argument('--profile', type=int, help='Id of the profile, by default orders of all profiles')
+
+    def get_records(self, options: dict):
+        return iter_orders_records(get_orders_queryset(options['profile']))
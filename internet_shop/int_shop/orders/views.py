@@ -1,9 +1,11 @@
+from typing import Union
+
 from django.contrib.auth.mixins import LoginRequiredMixin
 from django.http.response import HttpResponseRedirect
 from django.urls import reverse_lazy
 from django.views.generic import FormView, TemplateView
 
-from account.models import Profile
+from account.utils import get_request_profile
 from cart.cart import Cart
 from orders.models import Order, OrderItem
 from orders.tasks import order_created
@@ -28,7 +30,7 @@ class OrderCreateView(LoginRequiredMixin, FormView):
 
     def post(self, request, *args, **kwargs):
         cart = Cart(request)  # creating cart instance
-        profile = Profile.objects.get(user=self.request.user)
+        profile = get_request_profile(request)
         # getting forms
         order_form = self.get_form()
         delivery_form = self.get_form(form_class=DeliveryCreateForm)
@@ -39,17 +41,18 @@ class OrderCreateView(LoginRequiredMixin, FormView):
         if all([order_valid, delivery_valid]):
             order = order_form.save(commit=False)
             # if there are valid coupon or valid present card in the cart, linking them to the order
-            if cart.coupon:
-                order.coupon = cart.coupon
-            elif cart.present_card:
-                order.present_card = cart.present_card
+            coupon, present_card = cart.coupon, cart.present_card
+            if coupon:
+                order.coupon = coupon
+            elif present_card:
+                order.present_card = present_card
 
             delivery = delivery_form.save()
             # linking delivery and profile to the order
             order.delivery = delivery
             order.profile = profile
             order.save()
-            self.create_order_items_from_cart(order)  # creating the order's items in DB
+            self.create_order_items_from_cart(order, cart)  # creating the order's items in DB
             self.request.session['order_id'] = order.pk
 
             domain = request.site.domain
@@ -65,16 +68,17 @@ class OrderCreateView(LoginRequiredMixin, FormView):
         return self.render_to_response(context={'form': order_form,
                                                 'delivery_form': delivery_form})
 
-    def create_order_items_from_cart(self, order: Order) -> None:
+    def create_order_items_from_cart(self, order: Order, cart: Union[Cart, None] = None) -> None:
         """
         Creating order's items in DB from cart items, linked with current order.
+        Items are inserted with one query.
         """
-        cart = Cart(self.request)
-        for item in cart:
-            OrderItem.objects.create(order=order,
-                                     product=item['product'],
-                                     price=item['price'],
-                                     quantity=item['quantity'])
+        if cart is None:
+            cart = Cart(self.request)
+        OrderItem.objects.bulk_create([OrderItem(order=order,
+                                                 product=item['product'],
+                                                 price=item['price'],
+                                                 quantity=item['quantity']) for item in cart])
         cart.clear()
 
 
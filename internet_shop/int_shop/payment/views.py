@@ -8,6 +8,7 @@ from django.shortcuts import redirect, get_object_or_404, reverse, render
 from django.views.decorators.csrf import csrf_exempt
 from django.views.decorators.http import require_POST
 
+from cart.pricing import get_cart_pricing, to_cents
 from common.moduls_init import redis
 from orders.models import Order
 from .tasks import order_paid
@@ -34,9 +35,8 @@ def create_discounts(discount_type: str = None, discount_value: int = None) -> U
                 duration='forever'
             )
         elif discount_type == 'present_card':
-            # multiply by 100, cause convert value to cents
             discount = stripe.Coupon.create(
-                amount_off=discount_value * 100,
+                amount_off=to_cents(discount_value),
                 duration='forever',
                 currency='usd'
             )
@@ -71,10 +71,13 @@ def create_checkout_session(request, *args, **kwargs) -> Union[redirect, str]:
 
     discount_type_value = tuple(None for _ in range(2))  # init tuple for discount parameters
 
-    if order.coupon:
-        discount_type_value = ('coupon', order.coupon.discount)
-    elif order.present_card:
-        discount_type_value = ('present_card', order.present_card.amount)
+    # discount objects are shared with the cart of the request by pricing engine
+    pricing = get_cart_pricing(request)
+    coupon, present_card = pricing.get_coupon(order.coupon_id), pricing.get_present_card(order.present_card_id)
+    if coupon:
+        discount_type_value = ('coupon', coupon.discount)
+    elif present_card:
+        discount_type_value = ('present_card', present_card.amount)
 
     discount_instance = create_discounts(*discount_type_value)  # creating coupon instance
 
@@ -96,7 +99,7 @@ def create_session_line_items(order: Order) -> list:
     """
     result = []
 
-    for item in order.items.all():
+    for item in order.items.select_related('product'):
         result.append({
             'price_data': {
                 'currency': 'usd',
@@ -104,7 +107,7 @@ def create_session_line_items(order: Order) -> list:
                     'name': item.product.name,
                     'metadata': {'promotional': item.product.promotional, 'active': item.product.available},
                 },
-                'unit_amount': int(item.price * Decimal('100'))
+                'unit_amount': to_cents(item.price)
             },
             'quantity': item.quantity,
         })
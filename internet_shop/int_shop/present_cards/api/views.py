@@ -6,7 +6,7 @@ from rest_framework import viewsets, permissions, status
 from rest_framework.decorators import action
 from rest_framework.response import Response
 
-from account.models import Profile
+from account.utils import get_user_profile
 from common.moduls_init import redis
 from common.filters import ExtraSearchTerms
 from present_cards.models import PresentCard, Category
@@ -68,7 +68,7 @@ class PresentCardViewSet(viewsets.ModelViewSet):
                             status=status.HTTP_404_NOT_FOUND)
 
         session = request.session
-        profile = Profile.objects.get(user=request.user)
+        profile = get_user_profile(request.user)
         if ('cart' in session and session['cart']) or redis.hget('session_cart', f'user_id:{request.user.pk}'):
             if act == 'apply':
                 session.update({'present_card_id': present_card.pk}) if request.headers.get(
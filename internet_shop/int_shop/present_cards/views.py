@@ -1,7 +1,7 @@
 from django.http.response import JsonResponse
 from django.views.decorators.http import require_POST
 
-from account.models import Profile
+from account.utils import get_request_profile
 from common.decorators import ajax_required
 from common.decorators import auth_profile_required
 from present_cards.forms import PresentCardApplyForm
@@ -20,7 +20,7 @@ def apply_present_card(request):
         code = card_form.cleaned_data.get('code')
         present_card = PresentCard.objects.get(code=code)
         request.session['present_card_id'] = present_card.pk
-        Profile.objects.get(user=request.user).profile_cards.add(present_card)
+        get_request_profile(request).profile_cards.add(present_card)
 
         return JsonResponse({'success': True,
                              'card_amount': present_card.amount})
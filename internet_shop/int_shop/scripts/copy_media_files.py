@@ -1,7 +1,11 @@
 import hashlib
+import json
+import mmap
 import os
 import shutil
-from typing import Callable
+from concurrent.futures import ThreadPoolExecutor
+from time import perf_counter
+from typing import Dict, Iterable, Tuple
 
 import environ
 from django.conf import settings
@@ -10,64 +14,111 @@ os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'int_shop.settings')
 env = environ.Env()
 environ.Env.read_env(env_file=os.path.join(settings.BASE_DIR, 'settings', '.env'))  # env file location
 
+BLOCK_SIZE = 2 ** 20  # block size equal 1 Mb, files, which are not larger, are read at once
+WORKERS = min(32, (os.cpu_count() or 1) + 4)  # hashing and copying are waiting for disk mostly
 
-def update_sha(filepath, sha):
+
+def scan_files(dir_path: str) -> Dict[str, Tuple[int, int]]:
+    """
+    Returns stats of all files, which are located in directories, started from `dir_path` ->
+    {path relative to `dir_path`: (size, modification time in nanoseconds)}
+    """
+    files = {}
+    for path, _dirs, names in os.walk(dir_path):
+        for name in names:
+            stat = os.stat(os.path.join(path, name))
+            files[os.path.relpath(os.path.join(path, name), dir_path)] = (stat.st_size, stat.st_mtime_ns)
+    return files
+
+
+def hash_file(filepath: str) -> str:
     """
-    Update hash after each read file.
+    Returns SHA-1 of the file, large files are mapped to memory instead of reading them by blocks
     """
+    sha = hashlib.sha1()
     with open(filepath, 'rb') as f:
-        while True:
-            block = f.read(2 ** 10)  # block size equal 1 Mb
-            if not block:
-                break
-            sha.update(block)
-
-
-def make_hash() -> Callable:
-    sha = hashlib.sha1()  # guarantee, that only one instance will be updating
-    files_amount = 0
-
-    def wrap(dir_path, *args, **kwargs) -> tuple:
-        """
-        Calculates hash of all available files and their quantity,
-        which are located in directories, started from `dir_path`.
-        Returns result as tuple (hash, quantity).
-        """
-        nonlocal sha, files_amount
-        for path, dirs, files in os.walk(dir_path):
-            for file in sorted(files):  # guarantee, that files will always be in the same order
-                update_sha(os.path.join(path, file), sha)
-                files_amount += 1
-            for directory in sorted(dirs):  # guarantee, that directories will always be in the same order
-                wrap(os.path.join(path, directory))
-            break  # necessary only one iteration for getting all files in the current directory
-        return sha.hexdigest(), files_amount
-
-    return wrap
+        if os.fstat(f.fileno()).st_size <= BLOCK_SIZE:
+            sha.update(f.read())
+        else:
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                sha.update(mapped)
+    return sha.hexdigest()
+
+
+def load_manifest(file) -> Dict[str, list]:
+    """
+    Returns manifest of the previous sync from the `file` -> {relative path: [size, modification time, hash]}.
+    Manifest is empty, if there was no sync yet or the file has another format (then all files are synced)
+    """
+    try:
+        with open(file, 'r', encoding='utf-8') as f:
+            manifest = json.load(f)
+    except (FileNotFoundError, ValueError):
+        return {}
+    return manifest if isinstance(manifest, dict) else {}
+
+
+def copy_files(src_dir: str, dst_dir: str, paths: Iterable[str]) -> None:
+    """
+    Copies files with relative `paths` from `src_dir` to `dst_dir` in parallel
+    """
+    def copy(path):
+        os.makedirs(os.path.dirname(os.path.join(dst_dir, path)), exist_ok=True)
+        shutil.copy2(os.path.join(src_dir, path), os.path.join(dst_dir, path))
+
+    with ThreadPoolExecutor(WORKERS) as executor:
+        list(executor.map(copy, paths))
+
+
+def delete_files(dir_path: str, paths: Iterable[str]) -> None:
+    """
+    Deletes files with relative `paths` from `dir_path`
+    """
+    for path in paths:
+        try:
+            os.remove(os.path.join(dir_path, path))
+        except FileNotFoundError:
+            pass
 
 
 def run(file) -> None:
     """
-    If hash doesn't match (i.e. there were updated files or directories in old location),
-    function copies files and directories into new location.
+    Copies files, which have been added or changed in old location since previous sync, into new location
+    and deletes files, which have been deleted from old location.
+    Files are re-hashed only, if their size or modification time has been changed.
+    Manifest of the synced files is saved to the `file`
     """
     # action starts only in production server
     if env('DEV_OR_PROD') == 'prod':
         old_folder_path = os.path.join(settings.BASE_DIR, 'media/')
         new_folder_path = os.path.join(settings.BASE_DIR, settings.MEDIA_ROOT)
 
-        sha, amount_files = make_hash()(old_folder_path)
-        with open(file, 'r', encoding='utf-8') as f:
-            current_sha = f.readline().strip()
-            current_amount_files = f.readline().strip()
-            current_amount_files = int(current_amount_files) if current_amount_files else 0
-            if sha == current_sha:
-                print('Hashes are the same and the files have not been updated')
-                return
+        start = perf_counter()
+        manifest = load_manifest(file)
+        files = scan_files(old_folder_path)
+        scanned = perf_counter()
+
+        changed = [path for path, stat in files.items() if list(stat) != manifest.get(path, [None, None])[:2]]
+        with ThreadPoolExecutor(WORKERS) as executor:
+            hashes = dict(zip(changed, executor.map(hash_file, [os.path.join(old_folder_path, path)
+                                                                for path in changed])))
+        hashed = perf_counter()
 
+        to_copy = [path for path, sha in hashes.items() if path not in manifest or manifest[path][2] != sha]
+        # files, which are missing in new location, are copied, even if they have not been changed
+        to_copy.extend(path for path in files.keys() - hashes.keys()
+                       if not os.path.exists(os.path.join(new_folder_path, path)))
+        to_delete = manifest.keys() - files.keys()
+        copy_files(old_folder_path, new_folder_path, to_copy)
+        delete_files(new_folder_path, to_delete)
+        synced = perf_counter()
+
+        new_manifest = {path: [*stat, hashes[path] if path in hashes else manifest[path][2]]
+                        for path, stat in files.items()}
         with open(file, 'w', encoding='utf-8') as f:
-            f.write(f'{sha}\n')
-            f.write(f'{amount_files}\n')
-            shutil.copytree(old_folder_path, new_folder_path, dirs_exist_ok=True)
-            print(f'{abs(amount_files - current_amount_files)} file(s) have been deleted or added')
-            return
+            json.dump(new_manifest, f)
+
+        print(f'{len(files)} file(s) have been scanned in {scanned - start:.2f}s, '
+              f'{len(changed)} file(s) have been hashed in {hashed - scanned:.2f}s, '
+              f'{len(to_copy)} file(s) have been copied and {len(to_delete)} file(s) have been deleted '
+              f'in {synced - hashed:.2f}s')